@@ -39,6 +39,14 @@ CHART_TEMPLATE = {
 }
 
 
+def chart_layout(title=None, **overrides):
+    """CHART_TEMPLATE's layout with a chart's title text and other settings merged in"""
+    layout = dict(CHART_TEMPLATE['layout'], **overrides)
+    if title:
+        layout['title'] = dict(CHART_TEMPLATE['layout']['title'], text=title)
+    return layout
+
+
 # ============================================================================
 # DATA EXTRACTION FROM TEXT
 # ============================================================================
@@ -101,6 +109,32 @@ def extract_stats_from_text(text):
     return stats
 
 
+# Box-score stat names (minutes and games alone don't make a stat line)
+STAT_KEYWORDS = (
+    r'(?:points?|pts|rebounds?|rebs?|boards|assists?|asts?|steals?|stl|blocks?|blks?|turnovers?|tov|'
+    r'fg%?|fga|fgm|3pt%?|3pa|3pm|ft%?|fta|ftm|field goals?|free throws?|threes|3-pointers?|three-pointers?|'
+    r'from three|from deep|from the line|'
+    r'נקודות|נק|ריבאונדים|ריבאונד|אסיסטים|אסיסט|חטיפות|בלוקים|איבודים|עונשין)'
+)
+STAT_MENTION_PATTERNS = [
+    # "22 points", "7/15 fg", "40% from three"
+    re.compile(r'\d+(?:\.\d+)?%?\s*(?:[/\-]\s*\d+\s*)?' + STAT_KEYWORDS + r'(?![^\W\d_])',
+               re.IGNORECASE | re.UNICODE),
+    # "FG% 45", "points: 22"
+    re.compile(r'(?<![^\W\d_])' + STAT_KEYWORDS + r'\s*[:=]?\s*\d+', re.IGNORECASE | re.UNICODE),
+]
+
+def text_has_stats(text):
+    """True if text carries stats: a stat name next to a number, or a box-score table
+    (two or more lines of three or more numbers)"""
+    if not text:
+        return False
+    if any(pattern.search(text) for pattern in STAT_MENTION_PATTERNS):
+        return True
+    rows = [line for line in text.splitlines() if len(re.findall(r'\d+', line)) >= 3]
+    return len(rows) >= 2
+
+
 def extract_player_comparison(text):
     """Extract data for player comparison from text"""
     # Look for patterns like "Player A: 20 pts, Player B: 15 pts"
@@ -186,14 +220,13 @@ def create_player_stats_bar(stats, player_name="Player"):
         )
     ])
     
-    fig.update_layout(
+    fig.update_layout(**chart_layout(
         title=f"📊 {player_name} - Game Stats",
         xaxis_title="",
         yaxis_title="",
-        **CHART_TEMPLATE['layout'],
         height=400,
         showlegend=False
-    )
+    ))
     
     return fig
 
@@ -257,12 +290,11 @@ def create_shooting_chart(stats, player_name="Player"):
             row=1, col=i+1
         )
     
-    fig.update_layout(
+    fig.update_layout(**chart_layout(
         title=f"🎯 {player_name} - Shooting Breakdown",
-        **CHART_TEMPLATE['layout'],
         height=350,
         annotations=[dict(font_size=12, font_color=COLORS['text']) for _ in shooting_stats]
-    )
+    ))
     
     return fig
 
@@ -301,7 +333,7 @@ def create_player_comparison(players_data):
             name=player_name
         ))
     
-    fig.update_layout(
+    fig.update_layout(**chart_layout(
         title="⚔️ Player Comparison",
         polar=dict(
             radialaxis=dict(
@@ -315,10 +347,9 @@ def create_player_comparison(players_data):
             ),
             bgcolor='rgba(0,0,0,0)'
         ),
-        **CHART_TEMPLATE['layout'],
         height=450,
         showlegend=True
-    )
+    ))
     
     return fig
 
@@ -382,13 +413,12 @@ def create_trend_chart(games_data, metric_name="Points"):
             line=dict(color=COLORS['secondary'], width=2, dash='dash')
         ))
         
-        fig.update_layout(
+        fig.update_layout(**chart_layout(
             title=f"📈 Performance Trend - {metric_name}",
             xaxis_title="Game",
             yaxis_title=metric_name,
-            **CHART_TEMPLATE['layout'],
             height=400
-        )
+        ))
         
         return fig
     except Exception as e:
@@ -431,10 +461,9 @@ def create_efficiency_gauge(value, title="Efficiency", min_val=0, max_val=100):
         }
     ))
     
-    fig.update_layout(
-        **CHART_TEMPLATE['layout'],
+    fig.update_layout(**chart_layout(
         height=300
-    )
+    ))
     
     return fig
 
@@ -477,11 +506,10 @@ def create_shot_distribution_pie(stats):
         hole=0.4
     )])
     
-    fig.update_layout(
+    fig.update_layout(**chart_layout(
         title="🏀 Shot Distribution",
-        **CHART_TEMPLATE['layout'],
         height=350
-    )
+    ))
     
     return fig
 
@@ -511,21 +539,9 @@ def analyze_and_visualize(text, context=""):
         
         # 1. Single player stats
         if stats and not players_data:
-            try:
-                bar_chart = create_player_stats_bar(stats)
-                if bar_chart:
-                    charts.append(('stats_bar', bar_chart))
-                    insights.append(generate_stats_insight(stats))
-            except Exception as e:
-                pass  # Skip this chart if error
-            
-            try:
-                shooting_chart = create_shooting_chart(stats)
-                if shooting_chart:
-                    charts.append(('shooting', shooting_chart))
-                    insights.append(generate_shooting_insight(stats))
-            except Exception as e:
-                pass  # Skip this chart if error
+            player_charts, player_insights = build_player_charts(stats)
+            charts.extend(player_charts)
+            insights.extend(player_insights)
         
         # 2. Player comparison
         if players_data and len(players_data) >= 2:
@@ -547,25 +563,9 @@ def analyze_and_visualize(text, context=""):
         #     except Exception as e:
         #         pass
         
-        # 4. Efficiency metrics
-        if stats:
-            try:
-                # Calculate True Shooting % if possible
-                if 'points' in stats and 'fg_made' in stats:
-                    fg = stats['fg_made']
-                    fta = stats.get('ft_made', {}).get('attempted', 0)
-                    if fg.get('attempted', 0) > 0:
-                        ts_pct = (stats['points'] / (2 * (fg['attempted'] + 0.44 * fta))) * 100
-                        
-                        if ts_pct > 0:
-                            gauge = create_efficiency_gauge(ts_pct, "True Shooting %")
-                            charts.append(('efficiency', gauge))
-                            insights.append(f"**True Shooting: {ts_pct:.1f}%** - " + 
-                                          ("Elite efficiency! 🔥" if ts_pct >= 60 else 
-                                           "Good efficiency 👍" if ts_pct >= 55 else 
-                                           "Below average - work on shot selection 📊"))
-            except Exception as e:
-                pass  # Skip this chart if error
+        # 4. Efficiency metrics (part of the single player charts above)
+        if stats and players_data:
+            add_true_shooting_chart(stats, charts, insights)
     
     except Exception as e:
         print(f"Error in analyze_and_visualize: {e}")
@@ -573,6 +573,53 @@ def analyze_and_visualize(text, context=""):
     return charts, insights
 
 
+def build_player_charts(stats, player_name="Player"):
+    """Charts and insights for one player's stat line: stats bar, shooting and True Shooting gauge"""
+    charts = []
+    insights = []
+    
+    try:
+        bar_chart = create_player_stats_bar(stats, player_name)
+        if bar_chart:
+            charts.append(('stats_bar', bar_chart))
+            insights.append(generate_stats_insight(stats))
+    except Exception as e:
+        pass  # Skip this chart if error
+    
+    try:
+        shooting_chart = create_shooting_chart(stats, player_name)
+        if shooting_chart:
+            charts.append(('shooting', shooting_chart))
+            insights.append(generate_shooting_insight(stats))
+    except Exception as e:
+        pass  # Skip this chart if error
+    
+    add_true_shooting_chart(stats, charts, insights)
+    
+    return charts, insights
+
+
+def add_true_shooting_chart(stats, charts, insights):
+    """Append the True Shooting % gauge and its insight when points and FG attempts are known"""
+    try:
+        # Calculate True Shooting % if possible
+        if 'points' in stats and 'fg_made' in stats:
+            fg = stats['fg_made']
+            fta = stats.get('ft_made', {}).get('attempted', 0)
+            if fg.get('attempted', 0) > 0:
+                ts_pct = (stats['points'] / (2 * (fg['attempted'] + 0.44 * fta))) * 100
+                
+                if ts_pct > 0:
+                    gauge = create_efficiency_gauge(ts_pct, "True Shooting %")
+                    charts.append(('efficiency', gauge))
+                    insights.append(f"**True Shooting: {ts_pct:.1f}%** - " + 
+                                  ("Elite efficiency! 🔥" if ts_pct >= 60 else 
+                                   "Good efficiency 👍" if ts_pct >= 55 else 
+                                   "Below average - work on shot selection 📊"))
+    except Exception as e:
+        pass  # Skip this chart if error
+
+
 def generate_stats_insight(stats):
     """Generate textual insight from stats"""
     insights = []
@@ -664,30 +711,149 @@ def generate_trend_insight(time_data):
 
 
 # ============================================================================
-# STREAMLIT DISPLAY FUNCTION
+# STRUCTURED STATS PAYLOAD (from THE ANALYST's stats extraction)
 # ============================================================================
-def display_analytics(text, context=""):
-    """Display analytics charts in Streamlit"""
+PAYLOAD_COUNT_STATS = ['points', 'rebounds', 'assists', 'steals', 'blocks', 'turnovers', 'minutes']
+PAYLOAD_SHOOTING_STATS = ['fg', 'three', 'ft']
+
+
+def payload_line_to_stats(line):
+    """Convert one payload stat line to the stats dict used by the chart builders"""
+    stats = {}
+    
+    for key in PAYLOAD_COUNT_STATS:
+        if line.get(key) is not None:
+            stats[key] = line[key]
+    
+    for prefix in PAYLOAD_SHOOTING_STATS:
+        made = line.get(f'{prefix}_made')
+        attempted = line.get(f'{prefix}_attempted')
+        if made is not None and attempted is not None:
+            stats[f'{prefix}_made'] = {'made': made, 'attempted': attempted}
+    
+    return stats
+
+
+def average_stat_lines(lines):
+    """Per-game averages of several stats dicts, over the stats recorded in every game"""
+    averages = {}
+    
+    for key in lines[0]:
+        values = [stats.get(key) for stats in lines]
+        if any(value is None for value in values):
+            continue  # Averaging over different games would skew ratios like True Shooting
+        if isinstance(values[0], dict):
+            averages[key] = {
+                part: _per_game(sum(value[part] for value in values), len(values))
+                for part in ('made', 'attempted')
+            }
+        else:
+            averages[key] = _per_game(sum(values), len(values))
+    
+    return averages
+
+
+def _per_game(total, games):
+    value = round(total / games, 1)
+    return int(value) if value == int(value) else value
+
+
+def analyze_stats_payload(payload):
+    """
+    Build charts from a structured stats payload: {"players": [{"name", "games": [line]}]}
+    Returns: (charts_list, insights)
+    """
+    charts = []
+    insights = []
     
     try:
-        charts, insights = analyze_and_visualize(text, context)
+        players = {}
+        games = {}
+        for player in (payload or {}).get('players', []):
+            lines = [payload_line_to_stats(line) for line in player.get('games', [])]
+            lines = [line for line in lines if line]
+            if lines:
+                name = player.get('name') or "Player"
+                players[name] = lines[0] if len(lines) == 1 else average_stat_lines(lines)
+                games[name] = [
+                    {'game': line.get('label') or f"Game {i + 1}", 'points': line.get('points')}
+                    for i, line in enumerate(player.get('games', []))
+                    if line.get('points') is not None
+                ]
         
-        if not charts:
-            return False
+        # 1. Single player: stat line, shooting and efficiency, plus a trend over several games
+        if len(players) == 1:
+            name, stats = next(iter(players.items()))
+            player_charts, player_insights = build_player_charts(stats, name)
+            charts.extend(player_charts)
+            insights.extend(player_insights)
+            
+            if len(games[name]) >= 2:
+                try:
+                    trend_chart = create_trend_chart(games[name], "Points")
+                    if trend_chart:
+                        charts.append(('trend', trend_chart))
+                        insights.append(generate_trend_insight(games[name]))
+                except Exception as e:
+                    pass  # Skip this chart if error
         
-        for chart_type, chart in charts:
+        # 2. Player comparison
+        if len(players) >= 2:
             try:
-                st.plotly_chart(chart, use_container_width=True)
+                comparison_chart = create_player_comparison(players)
+                if comparison_chart:
+                    charts.append(('comparison', comparison_chart))
+                    insights.append(generate_comparison_insight(players))
             except Exception as e:
-                st.warning(f"Could not display {chart_type} chart")
-        
-        if insights:
-            st.markdown("#### 💡 Key Insights")
-            for insight in insights:
-                if insight:
-                    st.markdown(f"• {insight}")
-        
-        return True
+                pass  # Skip this chart if error
+    
+    except Exception as e:
+        print(f"Error in analyze_stats_payload: {e}")
+    
+    return charts, insights
+
+
+# ============================================================================
+# STREAMLIT DISPLAY FUNCTION
+# ============================================================================
+def display_analytics(text, context=""):
+    """Display analytics charts in Streamlit"""
+    
+    try:
+        charts, insights = analyze_and_visualize(text, context)
+        return render_analytics(charts, insights)
     except Exception as e:
         st.error(f"Error displaying analytics: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+
+def display_analytics_payload(payload, key=None):
+    """Display analytics charts for a structured stats payload in Streamlit (key: unique per message)"""
+    
+    try:
+        charts, insights = analyze_stats_payload(payload)
+        return render_analytics(charts, insights, key)
+    except Exception as e:
+        st.error(f"Error displaying analytics: {str(e)}")
+        return False
+
+
+def render_analytics(charts, insights, key=None):
+    """Plot charts followed by their insights; returns False if there is nothing to show"""
+    
+    if not charts:
+        return False
+    
+    for chart_type, chart in charts:
+        try:
+            st.plotly_chart(chart, use_container_width=True, key=f"{key}_{chart_type}" if key else None)
+        except Exception as e:
+            st.warning(f"Could not display {chart_type} chart")
+    
+    if insights:
+        st.markdown("#### 💡 Key Insights")
+        for insight in insights:
+            if insight:
+                st.markdown(f"• {insight}")
+    
+    return True
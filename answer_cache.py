@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Answer Cache
+Caches answers to generic (non-personalized) questions with TTL and LRU eviction
+"""
+
+import hashlib
+import itertools
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from config import (
+    Agent,
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_BACKEND, ANSWER_CACHE_PATH,
+    ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES,
+    SIMILARITY_CACHE_ENABLED, SIMILARITY_CACHE_THRESHOLD, SIMILARITY_CACHE_MAX_ENTRIES,
+    SIMILARITY_CACHE_BANDS, SIMILARITY_CACHE_ROWS
+)
+from prompts import PROMPT_TEMPLATE_VERSION, DEGRADED_RESPONSE
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, ttl_seconds, max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class SQLiteCacheBackend:
+    """On-disk cache shared by every worker process on the host"""
+
+    def __init__(self, path, ttl_seconds, max_entries):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM answers WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl_seconds, now)
+            )
+            self._conn.execute("DELETE FROM answers WHERE expires <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                "SELECT key FROM answers ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {"backend": "sqlite", "hits": self.hits, "misses": self.misses, "size": size}
+
+
+CACHE_BACKENDS = {
+    "memory": lambda: MemoryCacheBackend(ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES),
+    "sqlite": lambda: SQLiteCacheBackend(ANSWER_CACHE_PATH, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES),
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_answer_cache():
+    """Get the process-wide cache backend configured by ANSWER_CACHE_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = CACHE_BACKENDS[ANSWER_CACHE_BACKEND]()
+        return _backend
+
+def set_answer_cache(backend):
+    """Replace the cache backend (any object with get/set/stats)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+# ============================================================================
+# NEAR-DUPLICATE (MinHash + LSH) CACHE
+# ============================================================================
+# Filler words that don't change what is being asked
+SIMILARITY_STOPWORDS = {
+    "a", "an", "the", "to", "do", "i", "how", "what", "is", "are", "of", "for", "my",
+    "we", "our", "should", "and", "or", "with", "in", "on", "me", "can", "you", "please", "give",
+    "best", "good", "way", "ways", "some", "tips", "ideas", "need", "want", "help",
+    "איך", "מה", "של", "את", "על", "עם", "לי", "אני", "אנחנו", "הכי", "טוב", "דרך",
+}
+# Words that flip what is being asked when only one of two similar questions
+# has them: negations and the opposite ends of common pairs
+SIMILARITY_GUARD_WORDS = {
+    "not", "no", "never", "without", "don't", "dont", "avoid", "stop",
+    "offense", "offensive", "defense", "defensive", "attack", "defend", "break", "beat", "against",
+    "before", "after", "pre", "post", "warm", "cool",
+    "beginner", "intermediate", "advanced", "elite", "kids", "children", "youth", "adult",
+    "gain", "lose", "increase", "decrease", "more", "less", "left", "right", "home", "away",
+    "man", "zone", "full", "half", "high", "low", "boys", "girls",
+    "לא", "בלי", "אין", "התקפה", "הגנה", "לפני", "אחרי", "מתחילים", "מתקדמים", "ילדים", "נוער",
+}
+SIMILARITY_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+", re.UNICODE)
+_MERSENNE_PRIME = (1 << 61) - 1
+SIMILARITY_MAX_CANDIDATES = 32
+
+SIMILARITY_SUFFIXES = ("ing", "ers", "er", "es", "ed", "s")
+
+def stem_word(word):
+    """Strip a common English inflection so "drills"/"drill" and "passing"/"pass" compare equal"""
+    for suffix in SIMILARITY_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == "es" and not word[:-2].endswith(("ss", "x", "z", "ch", "sh")):
+                continue  # "games" is "game" + "s", "passes" is "pass" + "es"
+            return word[:-len(suffix)]
+    return word
+
+def content_words(text):
+    """Stemmed content words of a question, in order; numbers are kept whole"""
+    return [
+        "#" + word if word.isdigit() else stem_word(word)
+        for word in SIMILARITY_TOKEN_PATTERN.findall(text.lower())
+        if word not in SIMILARITY_STOPWORDS
+    ]
+
+def guard_words():
+    """SIMILARITY_GUARD_WORDS as content_words spells them"""
+    return {stem_word(word) for word in SIMILARITY_GUARD_WORDS}
+
+def changes_meaning(words, other_words):
+    """True if one question has a guard word the other lacks ("offense" vs "defense")"""
+    return bool((words ^ other_words) & _GUARD_STEMS)
+
+def question_shingles(text):
+    """Word-level shingles: the content words and each adjacent pair of them"""
+    words = content_words(text)
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+_GUARD_STEMS = guard_words()
+
+
+class SimilarityCache:
+    """In-process near-duplicate answer cache.
+
+    Each question gets a MinHash signature over its shingles; signatures are
+    split into LSH bands so a lookup only compares against entries sharing at
+    least one band, keeping lookups O(1) in the number of entries. Entries
+    are partitioned by bucket (agent, profile, template version and the exact
+    numbers in the question, so "2-3 zone" never matches "1-3-1 zone").
+
+    The closest candidate is served when its estimated similarity reaches the
+    threshold, unless changes_meaning finds a guard word in only one of the
+    two questions ("offense"/"defense", "before"/"after", a negation).
+    """
+
+    def __init__(self, threshold, max_entries, ttl_seconds, bands, rows, seed=1009):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bands = bands
+        self.rows = rows
+        self.hits = 0
+        self.misses = 0
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(bands * rows)
+        ]
+        self._ids = itertools.count()
+        self._entries = OrderedDict()  # id -> (bucket, signature, words, answer, expires)
+        self._index = defaultdict(set)  # (bucket, band, band values) -> ids
+        self._lock = threading.Lock()
+
+    def signature(self, text):
+        """MinHash signature of a question, or None if it has no content words"""
+        shingles = question_shingles(text)
+        if not shingles:
+            return None
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+            for s in shingles
+        ]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._permutations
+        )
+
+    def _band_keys(self, bucket, signature):
+        for band in range(self.bands):
+            yield (bucket, band, signature[band * self.rows:(band + 1) * self.rows])
+
+    def _remove(self, entry_id):
+        bucket, signature, _, _, _ = self._entries.pop(entry_id)
+        for key in self._band_keys(bucket, signature):
+            ids = self._index.get(key)
+            if ids:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._index[key]
+
+    def get(self, bucket, text):
+        """Return (answer, similarity) of the closest entry above threshold, or (None, 0.0)"""
+        signature = self.signature(text)
+        if signature is None:
+            return None, 0.0
+        words = frozenset(content_words(text))
+        now = time.time()
+        with self._lock:
+            # Entries sharing the most bands are the likeliest matches; only
+            # those are scored so crowded buckets can't slow the lookup down
+            band_matches = Counter()
+            for key in self._band_keys(bucket, signature):
+                band_matches.update(self._index.get(key, ()))
+
+            best_id, best_similarity = None, 0.0
+            for entry_id, _ in band_matches.most_common(SIMILARITY_MAX_CANDIDATES):
+                _, other, other_words, _, expires = self._entries[entry_id]
+                if expires < now or changes_meaning(words, other_words):
+                    continue
+                similarity = sum(x == y for x, y in zip(signature, other)) / len(signature)
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None, best_similarity
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][3], best_similarity
+
+    def set(self, bucket, text, answer):
+        signature = self.signature(text)
+        if signature is None:
+            return
+        with self._lock:
+            entry_id = next(self._ids)
+            words = frozenset(content_words(text))
+            self._entries[entry_id] = (bucket, signature, words, answer, time.time() + self.ttl_seconds)
+            for key in self._band_keys(bucket, signature):
+                self._index[key].add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "index_keys": len(self._index)}
+
+
+_similarity_cache = SimilarityCache(
+    SIMILARITY_CACHE_THRESHOLD, SIMILARITY_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS,
+    SIMILARITY_CACHE_BANDS, SIMILARITY_CACHE_ROWS
+)
+
+def get_similarity_cache():
+    """Get the process-wide near-duplicate cache"""
+    return _similarity_cache
+
+def similarity_bucket(question, agent, coach_profile=None):
+    """Partition key for near-duplicate matching"""
+    numbers = tuple(re.findall(r"\d+", question))
+    return (agent.value, *profile_bucket(coach_profile), PROMPT_TEMPLATE_VERSION, numbers)
+
+# ============================================================================
+# KEYS & POLICY
+# ============================================================================
+# Openings of error, apology and refusal answers, which must not be replayed
+UNCACHEABLE_ANSWER_PATTERN = re.compile(
+    r"(error:|i'?m sorry|i am sorry|sorry,|i apologi[sz]e|apologies|unfortunately|"
+    r"i can'?t|i cannot|i'?m (not able|unable)|i am (not able|unable)|as an ai|"
+    r"מצטער|מצטערת|סליחה|לצערי|אני לא יכול|אינני יכול)",
+    re.IGNORECASE
+)
+def normalize_prompt(text):
+    """Normalize a question for exact-match lookup"""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("?!. ")
+
+def profile_bucket(coach_profile=None):
+    """Profile fields a cacheable answer depends on (its prompt leaves out the coach's name and team)"""
+    profile = coach_profile or {}
+    return tuple(str(profile.get(field) or '') for field in ('age_group', 'level'))
+
+def make_cache_key(question, agent, coach_profile=None):
+    """Build the cache key from prompt, agent, profile bucket and template version"""
+    raw = "\x1f".join([
+        normalize_prompt(question),
+        agent.value,
+        *profile_bucket(coach_profile),
+        str(PROMPT_TEMPLATE_VERSION),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def is_cacheable_turn(agent, chat_history, image_data=None, context=None):
+    """Only generic first questions are cacheable: no history, image, memories or logistics.
+
+    Cacheable turns are answered with context["omit_identity"] set, so the
+    answer can be shared by every coach in the same profile bucket.
+    """
+    if not ANSWER_CACHE_ENABLED or agent is None:
+        return False
+    if chat_history or image_data:
+        return False
+    if agent == Agent.TEAM_MANAGER:
+        return False
+    if context and (context.get("memories") or context.get("logistics")):
+        return False
+    return True
+
+def get_cached_answer(question, agent, coach_profile=None):
+    """Look up a cached answer (exact match first, then near-duplicate), or None"""
+    try:
+        answer = get_answer_cache().get(make_cache_key(question, agent, coach_profile))
+        if answer is None and SIMILARITY_CACHE_ENABLED:
+            answer, _ = get_similarity_cache().get(similarity_bucket(question, agent, coach_profile), question)
+        return answer
+    except Exception as e:
+        print(f"Error reading answer cache: {e}")
+        return None
+
+def is_cacheable_answer(answer):
+    """An answer worth serving again: not empty, an error, the degraded-mode notice, an apology or a refusal"""
+    if not answer or not answer.strip() or answer == DEGRADED_RESPONSE:
+        return False
+    return not UNCACHEABLE_ANSWER_PATTERN.match(answer.strip())
+
+def store_cached_answer(question, agent, coach_profile, answer):
+    """Cache an answer unless is_cacheable_answer rejects it"""
+    if not is_cacheable_answer(answer):
+        return
+    try:
+        get_answer_cache().set(make_cache_key(question, agent, coach_profile), answer)
+        if SIMILARITY_CACHE_ENABLED:
+            get_similarity_cache().set(similarity_bucket(question, agent, coach_profile), question, answer)
+    except Exception as e:
+        print(f"Error writing answer cache: {e}")
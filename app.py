@@ -5,26 +5,36 @@ Main Application File (Optimized)
 """
 
 import streamlit as st
-import re
+import uuid
 
 from config import (
     APP_TITLE, APP_ICON, LOGO_URL,
     AGE_GROUPS, LEVELS, ALLOWED_FILE_TYPES, ANALYSIS_TYPES,
-    Agent, AGENT_INFO
+    STREAM_RESPONSES, SINGLE_SHOT_ROUTING, CONSULT_MODE_ENABLED, CASSETTE_MODE, Agent, AGENT_INFO
 )
 from styles import CUSTOM_CSS
 from utils import (
     get_supabase_client, get_openai_client,
     get_coach_by_email, create_coach,
-    get_coach_conversations, create_conversation,
-    save_message, get_conversation_messages,
-    route_question, get_agent_response,
+    get_coach_conversations, get_conversation, create_conversation,
+    save_message,
+    get_agent_response, stream_agent_response,
     format_response, get_agent_from_value,
-    read_uploaded_file, build_analysis_prompt,
-    process_memory_save
+    read_uploaded_file, build_analysis_prompt
 )
+from pipeline import (
+    prepare_turn, open_single_shot_stream, run_consult, merge_consult_answers, start_stats_extraction,
+    resolve_analyst_stats
+)
+from cassette import Cassette, record_clients
+from jobs import enqueue, start_job_workers
+from write_behind import start_write_behind
+from single_flight import start_flight
+from message_history import open_history
+from summarizer import get_conversation_summary, schedule_summary_update
+from answer_cache import is_cacheable_turn, get_cached_answer, store_cached_answer
 from logistics import render_logistics_page
-from analytics_viz import display_analytics, extract_stats_from_text
+from analytics_viz import display_analytics_payload
 
 # Page config must be first
 st.set_page_config(
@@ -185,6 +195,7 @@ def render_sidebar(supabase):
                 for label, prompt in qi_options[selected]:
                     if st.button(f"▸ {label}", key=f"qi_{label}", use_container_width=True):
                         st.session_state.pending_prompt = prompt
+                        st.session_state.pending_generic = True
                         st.rerun()
             
             st.divider()
@@ -196,14 +207,8 @@ def render_sidebar(supabase):
                 for conv in conversations[:3]:
                     title = conv.get('title', 'Chat')[:22] + "..." if len(conv.get('title', '')) > 22 else conv.get('title', 'Chat')
                     if st.button(f"💬 {title}", key=f"conv_{conv['id']}", use_container_width=True):
-                        st.session_state.current_conversation = conv
-                        msgs = get_conversation_messages(supabase, conv['id'])
-                        st.session_state.messages = [
-                            {"role": m['role'], "content": m['content'],
-                             "raw_content": m['content'].split('\n\n', 1)[-1] if '\n\n' in m['content'] else m['content'],
-                             "agent": m.get('agent')}
-                            for m in msgs
-                        ]
+                        st.session_state.current_conversation = get_conversation(supabase, conv['id']) or conv
+                        st.session_state.messages = open_history(supabase, conv['id'])
                         st.rerun()
             else:
                 st.markdown('<div style="font-size: 12px; color: #666;">No chats yet</div>', unsafe_allow_html=True)
@@ -308,7 +313,11 @@ def render_file_upload():
                 try:
                     file_result = read_uploaded_file(uploaded_file)
                     if file_result["type"] == "image":
-                        st.session_state.pending_image = {"data": file_result["data"], "mime_type": file_result["mime_type"]}
+                        st.session_state.pending_image = {
+                            "data": file_result["data"],
+                            "mime_type": file_result["mime_type"],
+                            "detail": file_result.get("detail", "auto")
+                        }
                     st.session_state.pending_prompt = build_analysis_prompt(file_result, analysis_type)
                     st.session_state.show_file_upload = False
                     st.rerun()
@@ -334,8 +343,13 @@ def render_chat(client, supabase):
             st.session_state.show_file_upload = True
             st.rerun()
     
-    # Display chat history
-    for msg in st.session_state.messages:
+    # Display chat history (older pages load on demand)
+    offset = getattr(st.session_state.messages, "offset", 0)
+    if getattr(st.session_state.messages, "has_more", False):
+        if st.button(f"⬆️ Load older messages ({offset})", key="load_older_messages"):
+            st.session_state.messages.load_older(supabase)
+            st.rerun()
+    for index, msg in enumerate(st.session_state.messages, offset):
         if msg["role"] == "user":
             with st.chat_message("user", avatar="👤"):
                 st.markdown(msg["content"])
@@ -343,80 +357,186 @@ def render_chat(client, supabase):
             agent = get_agent_from_value(msg.get("agent", Agent.ASSISTANT_COACH))
             with st.chat_message("assistant", avatar=AGENT_INFO[agent]["icon"]):
                 st.markdown(msg["content"], unsafe_allow_html=True)
+            # THE ANALYST's stats are charted OUTSIDE the chat message, from the stored payload
+            if msg.get("stats"):
+                st.markdown("---")
+                st.markdown("### 📊 Visual Analysis")
+                display_analytics_payload(msg["stats"], key=f"stats_{index}")
     
     # Handle input
     prompt = st.session_state.pop("pending_prompt", None)
+    generic = st.session_state.pop("pending_generic", False)  # Quick Ideas skip personal memories
     if not prompt:
         prompt = st.chat_input("Ask your coaching question... | שאל את שאלתך...")
     
     if prompt:
-        # Create conversation if needed
-        if not st.session_state.get('current_conversation'):
-            conv = create_conversation(supabase, coach.get('id'), prompt[:50])
-            st.session_state.current_conversation = conv
-        
-        # Show user message
-        with st.chat_message("user", avatar="👤"):
-            st.markdown(prompt)
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        
-        # Save user message
-        if st.session_state.current_conversation:
-            save_message(supabase, st.session_state.current_conversation['id'], "user", prompt)
-        
-        # Route question
-        with st.spinner("🏀 Analyzing..."):
-            agent = route_question(prompt, client, st.session_state.messages[:-1])
-        
-        # Check for pending image
+        # Duplicate submissions (double clicks, reruns) attach to the turn already in flight
+        conversation = st.session_state.get('current_conversation')
         image_data = st.session_state.pop("pending_image", None)
-        
-        # Get response
-        info = AGENT_INFO[agent]
-        with st.chat_message("assistant", avatar=info["icon"]):
-            with st.spinner(f"Consulting {info['name']}..."):
-                raw_response = get_agent_response(
-                    prompt, agent, st.session_state.messages[:-1],
-                    client, coach, supabase, image_data
-                )
-                formatted = format_response(raw_response, agent)
-            st.markdown(formatted, unsafe_allow_html=True)
-        
-        # If ANALYST and user provided stats, show visualizations OUTSIDE chat message
-        if agent == Agent.ANALYST:
-            stats = extract_stats_from_text(prompt)
-            # Check if there are numbers that look like stats
-            numbers_in_prompt = re.findall(r'\b(\d+)\b', prompt)
-            
-            if stats:
-                st.markdown("---")
-                st.markdown("### 📊 Visual Analysis")
-                display_analytics(prompt)
-            elif len(numbers_in_prompt) >= 2:
-                # Try to display even with fewer detected stats
-                st.markdown("---")
-                st.markdown("### 📊 Visual Analysis")
-                display_analytics(prompt)
-        
-        # Save response
-        if st.session_state.current_conversation:
-            save_message(supabase, st.session_state.current_conversation['id'], "assistant", formatted, agent.value)
-        
-        # Save to memory if relevant (auto-detect)
-        if coach.get('id') and supabase:
-            message_count = len([m for m in st.session_state.messages if m['role'] == 'user'])
-            conv_id = st.session_state.current_conversation['id'] if st.session_state.current_conversation else None
-            process_memory_save(supabase, coach['id'], prompt, raw_response, conv_id, message_count)
-        
-        st.session_state.messages.append({
+        flight, _ = start_flight(
+            get_turn_scope(), prompt, run_turn,
+            st.session_state.messages.copy(), client, coach, supabase, image_data, generic,
+            conversation, st.session_state.get("cassette")
+        )
+        if flight.id not in st.session_state.committed_flights and flight not in st.session_state.active_flights:
+            st.session_state.active_flights.append(flight)
+    
+    # Follow turns still in flight (they survive reruns of this session), then commit each once
+    if st.session_state.active_flights:
+        for flight in list(st.session_state.active_flights):
+            follow_flight(flight)
+            commit_flight(flight)
+        st.rerun()
+
+
+def get_turn_scope():
+    """Scope of a chat turn for coalescing: the conversation, or this session before one exists"""
+    conversation = st.session_state.get('current_conversation')
+    return conversation['id'] if conversation else f"session:{st.session_state.session_id}"
+
+
+def run_turn(flight, prompt, history, client, coach, supabase, image_data, generic, conversation, cassette):
+    """Run one chat turn in its flight's worker: route, answer, save, schedule background jobs"""
+    if cassette:
+        cassette.start_turn(prompt, coach, STREAM_RESPONSES)
+    
+    # Create conversation if needed (prompt[:50] until the title job replaces it)
+    new_conversation = not conversation
+    if new_conversation:
+        conversation = create_conversation(supabase, coach.get('id'), prompt[:50])
+    
+    # Save user message
+    if conversation:
+        save_message(supabase, conversation['id'], "user", prompt)
+    
+    # Route question while fetching its context
+    deltas = None
+    cached = None
+    agent, context = prepare_turn(
+        prompt, client, history, coach, supabase,
+        allow_llm=CONSULT_MODE_ENABLED or not SINGLE_SHOT_ROUTING, include_memories=not generic,
+        multi=CONSULT_MODE_ENABLED
+    )
+    context["summary"] = get_conversation_summary(conversation)
+    consult_agents = [get_agent_from_value(value) for value in context["routing"].get("agents", [])]
+    consult = len(consult_agents) > 1
+    cacheable = not consult and is_cacheable_turn(agent, history, image_data, context)
+    if cacheable:
+        context["omit_identity"] = True
+        cached = get_cached_answer(prompt, agent, coach)
+        if cached is not None:
+            deltas = iter([cached])
+    if agent is None:
+        agent, deltas = open_single_shot_stream(prompt, history, client, coach, supabase, image_data, context)
+    flight.route(agent, consult_agents if consult else None)
+    
+    # Structured stats for THE ANALYST's charts are extracted while the answer is written
+    stats_future = start_stats_extraction(prompt, consult_agents or [agent], client, coach, image_data)
+    
+    # Get response
+    if consult:
+        answers = run_consult(prompt, consult_agents, history, client, coach, supabase, image_data, context)
+        raw_response, formatted = merge_consult_answers(answers)
+    else:
+        if deltas is None and STREAM_RESPONSES:
+            deltas = stream_agent_response(prompt, agent, history, client, coach, supabase, image_data, context)
+        elif deltas is None:
+            deltas = iter([get_agent_response(prompt, agent, history, client, coach, supabase, image_data, context)])
+        raw_response = ""
+        for delta in deltas:
+            raw_response += delta
+            flight.publish(delta)
+        formatted = format_response(raw_response, agent)
+    
+    if cacheable and cached is None:
+        store_cached_answer(prompt, agent, coach, raw_response)
+    
+    # Charts are drawn from the stored payload when the history is rendered
+    stats = resolve_analyst_stats(stats_future)
+    
+    # Save response
+    if conversation:
+        save_message(supabase, conversation['id'], "assistant", formatted, agent.value, stats)
+    
+    # Deferred work: memory extraction, conversation title
+    conv_id = conversation['id'] if conversation else None
+    if coach.get('id') and supabase:
+        # Unloaded older messages count as alternating turns
+        message_count = getattr(history, "offset", 0) // 2 + len([m for m in history if m['role'] == 'user']) + 1
+        enqueue("memory", {
+            "coach_id": coach['id'],
+            "user_message": prompt,
+            "ai_response": raw_response,
+            "conversation_id": conv_id,
+            "message_count": message_count
+        })
+    if new_conversation and conv_id:
+        enqueue("title", {"conversation_id": conv_id, "question": prompt, "answer": raw_response}, f"title:{conv_id}")
+    
+    messages = [
+        {"role": "user", "content": prompt},
+        {
             "role": "assistant",
             "content": formatted,
             "raw_content": raw_response,
-            "agent": agent.value
-        })
-        st.rerun()
+            "agent": agent.value,
+            "stats": stats,
+            "routing": context.get("routing"),
+            "prompt_report": context.get("prompt_report")
+        }
+    ]
+    schedule_summary_update(conversation, history + messages, coach.get('id'))
+    if cassette:
+        cassette.end_turn(agent.value)
+    flight.finish({"conversation": conversation, "messages": messages})
 
 
+def follow_flight(flight):
+    """Show a turn in flight: the question, then the answer as it arrives"""
+    with st.chat_message("user", avatar="👤"):
+        st.markdown(flight.prompt)
+    
+    with st.spinner("🏀 Analyzing..."):
+        flight.routed.wait()
+    if flight.agent is None:
+        return
+    
+    info = AGENT_INFO[flight.agent]
+    with st.chat_message("assistant", avatar=info["icon"]):
+        if len(flight.agents) > 1:
+            names = ", ".join(AGENT_INFO[a]["name"] for a in flight.agents)
+            with st.spinner(f"Consulting {names}..."):
+                flight.done.wait()
+        elif STREAM_RESPONSES:
+            # Render the shared answer live in the bubble until the turn is done
+            placeholder = st.empty()
+            placeholder.markdown(format_response(f"*Consulting {info['name']}...*", flight.agent), unsafe_allow_html=True)
+            for text in flight.follow():
+                if text:
+                    placeholder.markdown(format_response(text + " ▌", flight.agent), unsafe_allow_html=True)
+        else:
+            with st.spinner(f"Consulting {info['name']}..."):
+                flight.done.wait()
+
+
+def commit_flight(flight):
+    """Add a finished turn to this session's messages, once per session"""
+    flight.done.wait()
+    st.session_state.active_flights.remove(flight)
+    st.session_state.committed_flights.add(flight.id)
+    
+    # The coach may have switched conversations while the turn ran; it is saved either way
+    if flight.key[0] != get_turn_scope():
+        return
+    if flight.error is not None:
+        st.session_state.messages.extend([
+            {"role": "user", "content": flight.prompt},
+            {"role": "assistant", "content": f"Error: {flight.error}", "agent": Agent.ASSISTANT_COACH.value}
+        ])
+        return
+    st.session_state.current_conversation = flight.result["conversation"]
+    st.session_state.messages.extend(flight.result["messages"])
+
 def render_mobile_nav(supabase):
     """Mobile navigation - disabled since all buttons exist in sidebar"""
     # All navigation buttons (NEW, HISTORY, LOGOUT) are already in the sidebar
@@ -433,7 +553,10 @@ def main():
         "current_conversation": None,
         "show_mobile_history": False,
         "show_file_upload": False,
-        "current_page": "chat"
+        "current_page": "chat",
+        "session_id": uuid.uuid4().hex,
+        "active_flights": [],
+        "committed_flights": set()
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -451,6 +574,15 @@ def main():
         st.error("⚠️ OpenAI connection failed. Check OPENAI_API_KEY in secrets.")
         st.stop()
     
+    start_job_workers(openai_client, supabase)
+    start_write_behind(supabase)
+    
+    # Record this session's model and database calls for offline replay
+    if CASSETTE_MODE == "record":
+        if "cassette" not in st.session_state:
+            st.session_state.cassette = Cassette.for_new_session()
+        openai_client, supabase = record_clients(openai_client, supabase, st.session_state.cassette)
+    
     # Render app
     if not st.session_state.logged_in:
         render_login_page(supabase)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Benchmark
+Load-tests routing and agent answers against the offline fake model to measure our own overhead
+
+    python benchmark.py --turns 200 --concurrency 16 --stream
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import llm
+import telemetry
+import utils
+from config import LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_QUEUE_DEPTH, LLM_MAX_QUEUE_WAIT_SECONDS
+from fake_llm import FakeOpenAI
+from router_corpus import ROUTER_CORPUS
+from telemetry import percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the chat pipeline against the fake model")
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="Stream agent answers")
+    parser.add_argument("--ttft", type=float, default=0.4, help="Simulated time to first token (s)")
+    parser.add_argument("--tps", type=float, default=80, help="Simulated tokens per second (0 = instant)")
+    parser.add_argument("--fault-429", type=float, default=0.0)
+    parser.add_argument("--fault-500", type=float, default=0.0)
+    parser.add_argument("--fault-timeout", type=float, default=0.0)
+    parser.add_argument("--no-local-router", action="store_true", help="Always call the LLM router")
+    parser.add_argument("--rpm", type=int, default=LLM_REQUESTS_PER_MINUTE)
+    parser.add_argument("--tpm", type=int, default=LLM_TOKENS_PER_MINUTE)
+    parser.add_argument("--telemetry", action="store_true", help="Keep writing telemetry records")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+def build_workload(turns, seed):
+    """Pick questions from the router corpus, each with the coach asking it"""
+    questions = [q for qs in ROUTER_CORPUS.values() for q in qs]
+    rng = random.Random(seed)
+    return [(rng.choice(questions), {"id": f"bench-coach-{i % 20}"}) for i in range(turns)]
+
+def run_turn(client, question, coach, stream):
+    """Route and answer one question; returns (latency, model_seconds, route_path, failed)"""
+    client.start_meter()
+    started = time.monotonic()
+    agent, info = utils.route_question_with_info(question, client, coach_id=coach["id"])
+    context = {"memories": [], "documents": [], "logistics": None}
+    if stream:
+        answer = "".join(utils.stream_agent_response(question, agent, [], client, coach, None, None, context))
+    else:
+        answer = utils.get_agent_response(question, agent, [], client, coach, None, None, context)
+    latency = time.monotonic() - started
+    failed = answer.startswith("Error:") or answer == utils.DEGRADED_RESPONSE
+    return latency, client.model_seconds(), info["path"], failed
+
+def main():
+    args = parse_args()
+    if not args.telemetry:
+        telemetry.TELEMETRY_ENABLED = False
+    if args.no_local_router:
+        utils.ROUTER_LOCAL_ENABLED = False
+    llm._governor = llm.ConcurrencyGovernor(args.rpm, args.tpm, LLM_MAX_QUEUE_DEPTH, LLM_MAX_QUEUE_WAIT_SECONDS)
+
+    client = FakeOpenAI(
+        ttft=args.ttft,
+        tokens_per_second=args.tps,
+        fault_rates={"429": args.fault_429, "500": args.fault_500, "timeout": args.fault_timeout},
+        seed=args.seed,
+    )
+    workload = build_workload(args.turns, args.seed)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda item: run_turn(client, item[0], item[1], args.stream), workload))
+    wall = time.monotonic() - started
+
+    latencies = [r[0] for r in results]
+    overheads = [r[0] - r[1] for r in results]
+    print(f"turns: {len(results)}  concurrency: {args.concurrency}  stream: {args.stream}  wall: {wall:.2f}s  "
+          f"throughput: {len(results) / wall:.1f} turns/s  model calls: {client.calls}")
+    print(f"turn latency  p50 {percentile(latencies, 50) * 1000:.0f} ms  p95 {percentile(latencies, 95) * 1000:.0f} ms")
+    print(f"our overhead  p50 {percentile(overheads, 50) * 1000:.1f} ms  p95 {percentile(overheads, 95) * 1000:.1f} ms")
+    print(f"failed turns: {sum(1 for r in results if r[3])}  routing: {dict(Counter(r[2] for r in results))}")
+    print(f"governor: {llm.get_governor().metrics()}")
+    print(f"circuit: {llm.get_circuit_breaker().state}")
+
+
+if __name__ == "__main__":
+    main()
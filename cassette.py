@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Cassettes
+Records model and database calls per session with timings, and replays them offline
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from types import SimpleNamespace
+
+from config import CASSETTE_DIR, CASSETTE_LATENCY_SCALE
+
+COMPACT_CONTENT_CHARS = 2000  # Longer message contents are stored as hash + head
+
+
+class CassetteMissError(Exception):
+    """Raised in replay when no recorded model call matches a request"""
+
+
+# ============================================================================
+# SERIALIZATION
+# ============================================================================
+def to_plain(obj):
+    """Convert SDK response objects (pydantic models or namespaces) to JSON-able data"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, SimpleNamespace):
+        return {key: to_plain(value) for key, value in vars(obj).items()}
+    if isinstance(obj, dict):
+        return {key: to_plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_plain(value) for value in obj]
+    return obj
+
+def to_namespace(data):
+    """Convert recorded data back to attribute-accessible objects"""
+    if isinstance(data, dict):
+        return SimpleNamespace(**{key: to_namespace(value) for key, value in data.items()})
+    if isinstance(data, list):
+        return [to_namespace(value) for value in data]
+    return data
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def normalize_model_request(kwargs):
+    """Canonical form of a chat completion request (no timeout, images as hashes)"""
+    messages = []
+    for message in kwargs.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if part.get("type") == "image_url":
+                    parts.append({"type": "image_url", "sha256": _digest(part["image_url"]["url"])})
+                else:
+                    parts.append({"type": part.get("type"), "text": (part.get("text") or "").strip()})
+            content = parts
+        elif isinstance(content, str):
+            content = content.strip()
+        messages.append({"role": message.get("role"), "content": content})
+    return {
+        "model": kwargs.get("model"),
+        "messages": messages,
+        "max_tokens": kwargs.get("max_tokens"),
+        "temperature": kwargs.get("temperature"),
+        "stream": bool(kwargs.get("stream")),
+    }
+
+def compact_model_request(request):
+    """Shrink long message contents for storage (the fingerprint uses the full request)"""
+    messages = []
+    for message in request["messages"]:
+        content = message["content"]
+        if isinstance(content, str) and len(content) > COMPACT_CONTENT_CHARS:
+            content = {"sha256": _digest(content), "chars": len(content), "head": content[:200]}
+        messages.append({"role": message["role"], "content": content})
+    return dict(request, messages=messages)
+
+def fingerprint(kind, request):
+    """Stable key for a normalized request"""
+    return _digest(kind + "\n" + json.dumps(request, sort_keys=True, ensure_ascii=False, default=str))
+
+# ============================================================================
+# CASSETTE
+# ============================================================================
+class Cassette:
+    """One session's recorded calls: an append-only gzip JSONL file.
+
+    Entries are {"kind": "openai" | "supabase", "fingerprint", "group",
+    "turn", "request", "response" | "chunks" | "error", "elapsed", "ttfb"} plus
+    {"kind": "turn", ...} markers written by start_turn/end_turn.
+    """
+
+    def __init__(self, path, mode="record"):
+        self.path = path
+        self.mode = mode
+        self.turn = None
+        self.entries = []
+        self.stats = {"exact": 0, "loose": 0, "miss": 0}
+        self._turn_started = None
+        self._turn_info = None
+        self._consumed = set()
+        self._lock = threading.Lock()
+        self._file = None
+        if mode == "replay":
+            self.entries = read_entries(path)
+
+    @classmethod
+    def for_new_session(cls, directory=CASSETTE_DIR):
+        """Create a recording cassette with a fresh file for a browser session"""
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8] + ".jsonl.gz"
+        return cls(os.path.join(directory, name), "record")
+
+    # Recording
+    def write(self, entry):
+        """Append an entry (thread-safe)"""
+        with self._lock:
+            entry.setdefault("turn", self.turn)
+            if self._file is None:
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+            self._file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def flush(self):
+        """Make everything written so far readable (sync-flushes the gzip stream)"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._file.buffer.flush(zlib.Z_SYNC_FLUSH)
+
+    def start_turn(self, question, coach_profile=None, streamed=False):
+        """Mark the start of a chat turn; calls until end_turn are tagged with it"""
+        self.turn = 0 if self.turn is None else self.turn + 1
+        self._turn_started = time.monotonic()
+        self._turn_info = {
+            "question": question,
+            "coach": coach_profile or {},
+            "streamed": streamed,
+        }
+
+    def end_turn(self, agent=None):
+        """Record the turn's question, agent and wall time"""
+        if self._turn_started is None:
+            return
+        entry = dict(self._turn_info, kind="turn", turn=self.turn, agent=agent,
+                     elapsed=time.monotonic() - self._turn_started)
+        self._turn_started = None
+        if self.mode == "record":
+            self.write(entry)
+            self.flush()
+
+    # Replay
+    def find(self, kind, group, key):
+        """Pick the recorded entry for a request.
+
+        Prefers an exact fingerprint match in the current turn, then anywhere,
+        then the next unused call of the same kind and group (model calls /
+        table) in the current turn, so changed prompts still replay.
+        """
+        with self._lock:
+            candidates = [
+                (index, entry) for index, entry in enumerate(self.entries)
+                if entry.get("kind") == kind and index not in self._consumed
+            ]
+            passes = (
+                ("exact", lambda e: e.get("fingerprint") == key and e.get("turn") == self.turn),
+                ("exact", lambda e: e.get("fingerprint") == key),
+                ("loose", lambda e: e.get("group") == group and e.get("turn") == self.turn),
+            )
+            for outcome, matches in passes:
+                for index, entry in candidates:
+                    if matches(entry):
+                        self._consumed.add(index)
+                        self.stats[outcome] += 1
+                        return entry
+            # Repeated identical calls reuse the last exact match
+            for entry in reversed(self.entries):
+                if entry.get("kind") == kind and entry.get("fingerprint") == key:
+                    self.stats["exact"] += 1
+                    return entry
+            self.stats["miss"] += 1
+            return None
+
+    def recorded_turns(self):
+        """The turn markers of a loaded recording, in order"""
+        return [entry for entry in self.entries if entry.get("kind") == "turn"]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def read_entries(path):
+    """Read all entries from a cassette file (tolerates an unterminated gzip stream)"""
+    entries = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+        except (EOFError, ValueError):
+            pass
+    return entries
+
+# ============================================================================
+# OPENAI PROXIES
+# ============================================================================
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+
+class RecordingOpenAI:
+    """Wraps an OpenAI client; every chat.completions.create is written to the cassette"""
+
+    def __init__(self, client, cassette):
+        self._client = client
+        self._cassette = cassette
+        self.chat = SimpleNamespace(completions=_Completions(self._create))
+
+    def _create(self, **kwargs):
+        request = normalize_model_request(kwargs)
+        entry = {
+            "kind": "openai",
+            "group": "chat",
+            "fingerprint": fingerprint("openai", request),
+            "request": compact_model_request(request),
+        }
+        started = time.monotonic()
+        try:
+            response = self._client.chat.completions.create(**kwargs)
+        except Exception as e:
+            entry.update(error=str(e), status_code=getattr(e, "status_code", None), elapsed=time.monotonic() - started)
+            self._cassette.write(entry)
+            raise
+        if kwargs.get("stream"):
+            return self._record_stream(response, entry, started)
+        entry.update(response=to_plain(response), elapsed=time.monotonic() - started)
+        entry["ttfb"] = entry["elapsed"]
+        self._cassette.write(entry)
+        return response
+
+    def _record_stream(self, stream, entry, started):
+        chunks = []
+        try:
+            for chunk in stream:
+                chunks.append([time.monotonic() - started, to_plain(chunk)])
+                yield chunk
+        finally:
+            entry.update(
+                chunks=chunks,
+                ttfb=chunks[0][0] if chunks else None,
+                elapsed=time.monotonic() - started,
+            )
+            self._cassette.write(entry)
+
+
+class ReplayOpenAI:
+    """Serves chat.completions.create from a cassette with recorded (scaled) latency"""
+
+    def __init__(self, cassette, scale=CASSETTE_LATENCY_SCALE):
+        self._cassette = cassette
+        self.scale = scale
+        self.chat = SimpleNamespace(completions=_Completions(self._create))
+
+    def _create(self, **kwargs):
+        request = normalize_model_request(kwargs)
+        entry = self._cassette.find("openai", "chat", fingerprint("openai", request))
+        if entry is None:
+            raise CassetteMissError(f"No recorded model call for {request['model']}")
+        if "error" in entry:
+            time.sleep(entry.get("elapsed", 0) * self.scale)
+            error = CassetteMissError(entry["error"])
+            error.status_code = entry.get("status_code")
+            raise error
+
+        if kwargs.get("stream"):
+            return self._replay_stream(entry)
+        time.sleep(entry.get("elapsed", 0) * self.scale)
+        if "chunks" in entry:
+            return self._join_chunks(entry)
+        return to_namespace(entry["response"])
+
+    def _replay_stream(self, entry):
+        if "chunks" in entry:
+            offset = 0.0
+            for at, chunk in entry["chunks"]:
+                time.sleep(max(0.0, at - offset) * self.scale)
+                offset = at
+                yield to_namespace(chunk)
+            return
+        # Recorded without streaming: one content chunk, then usage
+        time.sleep(entry.get("elapsed", 0) * self.scale)
+        response = entry["response"]
+        content = response["choices"][0]["message"]["content"]
+        delta = {"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        yield to_namespace({"choices": [delta], "usage": None})
+        yield to_namespace({"choices": [], "usage": response.get("usage")})
+
+    @staticmethod
+    def _join_chunks(entry):
+        content = ""
+        usage = None
+        for _, chunk in entry["chunks"]:
+            for choice in chunk.get("choices") or []:
+                content += (choice.get("delta") or {}).get("content") or ""
+            usage = chunk.get("usage") or usage
+        message = {"role": "assistant", "content": content}
+        return to_namespace({"choices": [{"index": 0, "message": message, "finish_reason": "stop"}], "usage": usage})
+
+# ============================================================================
+# SUPABASE PROXIES
+# ============================================================================
+class _Query:
+    """Captures a PostgREST builder chain (table(...).select(...).eq(...)...) until execute()"""
+
+    def __init__(self, owner, table, steps=()):
+        self._owner = owner
+        self._table = table
+        self._steps = list(steps)
+
+    def __getattr__(self, name):
+        if name == "execute":
+            return lambda: self._owner._execute(self._table, self._steps)
+        return _Step(self, name)
+
+
+class _Step:
+    """An attribute of a query: called like a method, or chained on like not_"""
+
+    def __init__(self, query, name):
+        self._query = query
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        q = self._query
+        return _Query(q._owner, q._table, q._steps + [[self._name, list(args), kwargs]])
+
+    def __getattr__(self, name):
+        q = self._query
+        return getattr(_Query(q._owner, q._table, q._steps + [[self._name, None, None]]), name)
+
+
+def _apply_steps(builder, steps):
+    for name, args, kwargs in steps:
+        builder = getattr(builder, name)
+        if args is not None:
+            builder = builder(*args, **kwargs)
+    return builder
+
+
+class RecordingSupabase:
+    """Wraps a Supabase client; every table query is executed and written to the cassette"""
+
+    def __init__(self, client, cassette):
+        self._client = client
+        self._cassette = cassette
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)  # storage, auth, rpc... pass through unrecorded
+
+    def _entry(self, table, steps):
+        request = {"table": table, "steps": steps}
+        return {
+            "kind": "supabase",
+            "group": table,
+            "fingerprint": fingerprint("supabase", request),
+            "request": request,
+        }
+
+    def record_insert(self, table, row):
+        """Record an insert that is written later by the write-behind buffer, not through this client"""
+        entry = self._entry(table, [["insert", [row], {}]])
+        entry.update(response={"data": [row], "count": None}, elapsed=0.0, deferred=True)
+        self._cassette.write(entry)
+
+    def _execute(self, table, steps):
+        entry = self._entry(table, steps)
+        started = time.monotonic()
+        try:
+            result = _apply_steps(self._client.table(table), steps).execute()
+        except Exception as e:
+            entry.update(error=str(e), elapsed=time.monotonic() - started)
+            self._cassette.write(entry)
+            raise
+        entry.update(
+            response={"data": result.data, "count": getattr(result, "count", None)},
+            elapsed=time.monotonic() - started,
+        )
+        self._cassette.write(entry)
+        return result
+
+
+class ReplaySupabase:
+    """Serves table queries from a cassette; unmatched queries return no rows"""
+
+    def __init__(self, cassette, scale=CASSETTE_LATENCY_SCALE):
+        self._cassette = cassette
+        self.scale = scale
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def _execute(self, table, steps):
+        request = json.loads(json.dumps({"table": table, "steps": steps}, default=str))
+        entry = self._cassette.find("supabase", table, fingerprint("supabase", request))
+        if entry is None:
+            return SimpleNamespace(data=[], count=None)
+        time.sleep(entry.get("elapsed", 0) * self.scale)
+        if "error" in entry:
+            raise Exception(entry["error"])
+        return SimpleNamespace(**entry["response"])
+
+
+def record_clients(openai_client, supabase, cassette):
+    """Wrap the app's clients so their calls are recorded into cassette"""
+    return RecordingOpenAI(openai_client, cassette), RecordingSupabase(supabase, cassette)
+
+# ============================================================================
+# REPLAY HARNESS
+# ============================================================================
+def replay_session(path, scale=CASSETTE_LATENCY_SCALE):
+    """Re-run a recorded session's turns through the current pipeline against the cassette.
+
+    Returns [(turn, question, recorded_seconds, replayed_seconds)] and the
+    cassette's match stats.
+    """
+    from answer_cache import is_cacheable_turn
+    from pipeline import prepare_turn
+    from utils import get_agent_response, stream_agent_response
+
+    cassette = Cassette(path, "replay")
+    client = ReplayOpenAI(cassette, scale)
+    supabase = ReplaySupabase(cassette, scale)
+
+    history = []
+    report = []
+    for turn in cassette.recorded_turns():
+        cassette.turn = turn["turn"]
+        question, coach = turn["question"], turn.get("coach") or {}
+        started = time.monotonic()
+        agent, context = prepare_turn(question, client, history, coach, supabase)
+        if agent is None:
+            from config import Agent
+            agent = Agent.ASSISTANT_COACH
+        if is_cacheable_turn(agent, history, None, context):
+            context["omit_identity"] = True  # As recorded: cacheable turns leave out the coach identity
+        if turn.get("streamed"):
+            answer = "".join(stream_agent_response(question, agent, history, client, coach, supabase, None, context))
+        else:
+            answer = get_agent_response(question, agent, history, client, coach, supabase, None, context)
+        elapsed = time.monotonic() - started
+        history = history + [
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": answer, "raw_content": answer, "agent": agent.value},
+        ]
+        report.append((turn["turn"], question, turn.get("elapsed"), elapsed))
+    return report, cassette.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded session against the current code")
+    parser.add_argument("command", choices=["replay"])
+    parser.add_argument("path")
+    parser.add_argument("--scale", type=float, default=CASSETTE_LATENCY_SCALE)
+    args = parser.parse_args()
+
+    report, stats = replay_session(args.path, args.scale)
+    print("turn\trecorded_ms\treplayed_ms\tdelta_ms\tquestion")
+    for turn, question, recorded, replayed in report:
+        recorded_ms = round(recorded * 1000) if recorded is not None else None
+        delta = round(replayed * 1000 - recorded_ms) if recorded_ms is not None else None
+        print(f"{turn}\t{recorded_ms}\t{round(replayed * 1000)}\t{delta}\t{question[:60]}")
+    print(f"matches: {stats}")
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Local Router Classifier
+Naive-Bayes question classifier used as a fast path in front of the LLM router
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from config import Agent, ROUTER_MODEL_PATH, ROUTER_LOCAL_MAX_MISROUTE
+
+MODEL_VERSION = 2
+
+# Common one-letter Hebrew prefixes (ו, ה, ב, ל, מ, ש, כ) glued onto words
+HEBREW_PREFIXES = "והבלמשכ"
+TOKEN_PATTERN = re.compile(r"[\w']+", re.UNICODE)
+
+# Function words carry no routing signal on their own; as unigrams they only
+# let "how do I ... my players" phrasing outvote the words that matter
+STOP_WORDS = frozenset("""
+a an the and or but of to in on at for with from by about into after before
+is are was were be been am do does did can could should would will shall may
+how what which who whom why i me my we our us you your he his she
+her they their them it its this that these those there here some any all
+so if not no yes please give tell show help need want get make best good
+איך מה מי איזה איזו כמה של על עם את זה זו לי לנו שלי שלנו יש אני אנחנו הוא היא
+לפני אחרי ליד כל גם או אם לא כן עד בין
+""".split())
+
+_model_cache = {}
+
+# ============================================================================
+# FEATURES
+# ============================================================================
+def content_words(text):
+    """Lowercase words of a question with stop words dropped"""
+    words = [w.strip("'") for w in TOKEN_PATTERN.findall(text.lower())]
+    return [w for w in words if w and w not in STOP_WORDS]
+
+def strip_prefix(word):
+    """The word without a glued-on Hebrew prefix, or None"""
+    if len(word) > 3 and word[0] in HEBREW_PREFIXES:
+        return word[1:]
+    return None
+
+def tokenize(text):
+    """Split a question into lowercase content-word, prefix-stripped and bigram features"""
+    words = content_words(text)
+
+    features = list(words)
+    features.extend(stripped for stripped in map(strip_prefix, words) if stripped)
+    features.extend(f"{a}_{b}" for a, b in zip(words, words[1:]))
+    return features
+
+# ============================================================================
+# TRAINING & SERIALIZATION
+# ============================================================================
+def train_router_model(corpus):
+    """Train a multinomial naive-Bayes model from {Agent: [questions]}"""
+    class_counts = {}
+    token_counts = {}
+    for agent, questions in corpus.items():
+        class_counts[agent.value] = len(questions)
+        counter = Counter()
+        for question in questions:
+            counter.update(tokenize(question))
+        token_counts[agent.value] = dict(counter)
+
+    return {
+        "version": MODEL_VERSION,
+        "class_counts": class_counts,
+        "token_counts": token_counts,
+    }
+
+def save_router_model(model, path=ROUTER_MODEL_PATH):
+    """Write a trained model as compact JSON"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+def _compile(model):
+    """Precompute log priors and smoothed log likelihoods"""
+    labels = list(model["class_counts"])
+    total_docs = sum(model["class_counts"].values())
+    vocab = set()
+    for counts in model["token_counts"].values():
+        vocab.update(counts)
+
+    log_priors = {label: math.log(model["class_counts"][label] / total_docs) for label in labels}
+    log_likelihoods = {}
+    for label in labels:
+        counts = model["token_counts"][label]
+        denominator = sum(counts.values()) + len(vocab)
+        log_likelihoods[label] = {
+            token: math.log((counts.get(token, 0) + 1) / denominator) for token in vocab
+        }
+    return {"labels": labels, "vocab": vocab, "log_priors": log_priors, "log_likelihoods": log_likelihoods}
+
+def load_router_model(path=ROUTER_MODEL_PATH):
+    """Load the serialized model, training from the bundled corpus if the file is missing"""
+    if path in _model_cache:
+        return _model_cache[path]
+
+    model = None
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                model = json.load(f)
+            if model.get("version") != MODEL_VERSION:
+                model = None
+        except (OSError, ValueError):
+            model = None
+
+    if model is None:
+        from router_corpus import ROUTER_CORPUS
+        model = train_router_model(ROUTER_CORPUS)
+
+    _model_cache[path] = _compile(model)
+    return _model_cache[path]
+
+# ============================================================================
+# PREDICTION
+# ============================================================================
+def predict_scores(question, path=ROUTER_MODEL_PATH):
+    """Return {Agent: posterior probability}, or {} if no feature is known"""
+    compiled = load_router_model(path)
+    tokens = [t for t in tokenize(question) if t in compiled["vocab"]]
+    if not tokens:
+        return {}
+
+    scores = {}
+    for label in compiled["labels"]:
+        likelihoods = compiled["log_likelihoods"][label]
+        scores[label] = compiled["log_priors"][label] + sum(likelihoods[t] for t in tokens)
+
+    best = max(scores.values())
+    exp_scores = {label: math.exp(score - best) for label, score in scores.items()}
+    total = sum(exp_scores.values())
+    return {Agent(label): value / total for label, value in exp_scores.items()}
+
+def classify_question(question, path=ROUTER_MODEL_PATH):
+    """Return (agent, confidence) for the most likely agent, or (None, 0.0)"""
+    agent, confidence, _, _ = classify_with_evidence(question, path)
+    return agent, confidence
+
+def classify_with_evidence(question, path=ROUTER_MODEL_PATH):
+    """Return (agent, confidence, margin over the runner-up, known word count)
+
+    Known words are the distinct single-word features the model has seen; a
+    question with one or two of them gets a posterior that looks certain but
+    rests on almost nothing, so the fast path checks all three.
+    """
+    scores = predict_scores(question, path)
+    if not scores:
+        return None, 0.0, 0.0, 0
+    ranked = sorted(scores.values(), reverse=True)
+    agent = max(scores, key=scores.get)
+    vocab = load_router_model(path)["vocab"]
+    known = sum(1 for w in set(content_words(question)) if w in vocab or strip_prefix(w) in vocab)
+    return agent, ranked[0], ranked[0] - (ranked[1] if len(ranked) > 1 else 0.0), known
+
+def is_confident(evidence, threshold, min_margin, min_tokens):
+    """True if classify_with_evidence output clears every fast-path gate"""
+    agent, confidence, margin, known = evidence
+    return agent is not None and confidence >= threshold and margin >= min_margin and known >= min_tokens
+
+# ============================================================================
+# CALIBRATION
+# ============================================================================
+def held_out_split(corpus, fold=0, folds=4):
+    """Split {Agent: [questions]} into (train, held_out), holding out every folds-th question"""
+    train, held_out = {}, {}
+    for agent, questions in corpus.items():
+        train[agent] = [q for i, q in enumerate(questions) if i % folds != fold]
+        held_out[agent] = [q for i, q in enumerate(questions) if i % folds == fold]
+    return train, held_out
+
+def cross_validate(corpus, folds=4):
+    """Return [(true agent, classify_with_evidence output)] with every question scored by a model that never saw it"""
+    results = []
+    for fold in range(folds):
+        train, held_out = held_out_split(corpus, fold, folds)
+        key = f"<held-out fold {fold}>"
+        _model_cache[key] = _compile(train_router_model(train))
+        try:
+            for agent, questions in held_out.items():
+                results.extend((agent, classify_with_evidence(q, key)) for q in questions)
+        finally:
+            _model_cache.pop(key, None)
+    return results
+
+def evaluate_router(results, threshold, min_margin, min_tokens):
+    """Return (accuracy, fast-path share, confident-misroute rate) over cross_validate results"""
+    if not results:
+        return 0.0, 0.0, 0.0
+    correct = sum(evidence[0] == agent for agent, evidence in results)
+    confident = [(agent, evidence) for agent, evidence in results
+                 if is_confident(evidence, threshold, min_margin, min_tokens)]
+    misrouted = sum(evidence[0] != agent for agent, evidence in confident)
+    return correct / len(results), len(confident) / len(results), misrouted / len(confident) if confident else 0.0
+
+def calibrate_threshold(results, min_margin, min_tokens, max_misroute=ROUTER_LOCAL_MAX_MISROUTE):
+    """Lowest threshold (in 0.05 steps) whose held-out confident-misroute rate stays within max_misroute"""
+    for step in range(10, 20):
+        threshold = step / 20
+        if evaluate_router(results, threshold, min_margin, min_tokens)[2] <= max_misroute:
+            return threshold
+    return 1.0
+
+
+if __name__ == "__main__":
+    from config import ROUTER_LOCAL_MIN_MARGIN, ROUTER_LOCAL_MIN_TOKENS
+    from router_corpus import ROUTER_CORPUS
+
+    results = cross_validate(ROUTER_CORPUS)
+    threshold = calibrate_threshold(results, ROUTER_LOCAL_MIN_MARGIN, ROUTER_LOCAL_MIN_TOKENS)
+    accuracy, coverage, misroute = evaluate_router(results, threshold, ROUTER_LOCAL_MIN_MARGIN, ROUTER_LOCAL_MIN_TOKENS)
+    print(f"Held-out accuracy {accuracy:.0%}, fast path {coverage:.0%}, "
+          f"confident misroutes {misroute:.1%} at ROUTER_LOCAL_THRESHOLD = {threshold}")
+    save_router_model(train_router_model(ROUTER_CORPUS))
+    print(f"Saved router model to {ROUTER_MODEL_PATH}")
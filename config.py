@@ -4,6 +4,7 @@ HOOPS AI - Configuration
 Constants, Agent definitions, and settings
 """
 
+import os
 from enum import Enum
 
 # ============================================================================
@@ -36,6 +37,218 @@ ANALYSIS_TYPES = [
     "Compare players"
 ]
 
+# Vision pre-processing. The vision model itself scales images to fit 2048x2048
+# and then to a 768px short side, so anything larger is wasted upload
+IMAGE_MAX_LONG_EDGE = 2048
+IMAGE_MAX_SHORT_EDGE = 768
+IMAGE_LOW_DETAIL_MAX_EDGE = 512  # Images this small fit one tile: send with detail "low"
+IMAGE_OUTPUT_FORMAT = "WEBP"  # Falls back to JPEG if Pillow lacks WebP support
+IMAGE_OUTPUT_QUALITY = 80
+IMAGE_CACHE_MAX_ENTRIES = 64
+
+# ============================================================================
+# CHAT SETTINGS
+# ============================================================================
+STREAM_RESPONSES = True  # Render agent answers token-by-token as they arrive
+TURN_PIPELINE_WORKERS = 16  # Threads shared by all sessions for routing/context fetches
+SINGLE_FLIGHT_POLL_SECONDS = 0.05  # How often a following script run redraws the shared answer
+HISTORY_PAGE_SIZE = 30  # Messages loaded when a conversation opens, and per "load older" click
+
+# System prompt token budgets per model (knowledge, then oldest memories, then
+# furthest events are trimmed to fit)
+PROMPT_TOKEN_BUDGETS = {
+    "gpt-4o-mini": 6000,
+    "gpt-4o": 6000,
+}
+DEFAULT_PROMPT_TOKEN_BUDGET = 6000
+PROMPT_PREFIX_CACHE_SIZE = 256  # Memoized static prompt prefixes (agent x profile x knowledge)
+
+# ============================================================================
+# MODEL BACKEND
+# ============================================================================
+# "openai" (needs OPENAI_API_KEY in st.secrets) or "fake" for the offline,
+# deterministic stand-in in fake_llm.py (load tests, benchmarks, demos)
+LLM_BACKEND = os.environ.get("HOOPS_LLM_BACKEND", "openai")
+FAKE_LLM_TTFT_SECONDS = 0.4  # Simulated time to first token
+FAKE_LLM_TOKENS_PER_SECOND = 80  # Simulated output speed (0 = instant)
+FAKE_LLM_ANSWER_TOKENS = 300  # Length of templated agent answers
+FAKE_LLM_FAULT_RATES = {"429": 0.0, "timeout": 0.0, "500": 0.0}  # Probability per request
+FAKE_LLM_SEED = 0
+
+# ============================================================================
+# MODEL CALL GOVERNOR (process-wide, shared by all sessions)
+# ============================================================================
+LLM_REQUESTS_PER_MINUTE = 500
+LLM_TOKENS_PER_MINUTE = 200000
+LLM_MAX_QUEUE_DEPTH = 200  # Requests waiting beyond this are rejected
+LLM_MAX_QUEUE_WAIT_SECONDS = 60
+
+# Resilience: deadlines, retries on 429/5xx, hedging, circuit breaker
+LLM_DEFAULT_DEADLINE_SECONDS = 60  # Whole call budget including queueing and retries
+LLM_ROUTER_DEADLINE_SECONDS = 8
+LLM_MAX_ATTEMPTS = 3
+LLM_BACKOFF_BASE_SECONDS = 0.5
+LLM_BACKOFF_MAX_SECONDS = 8
+LLM_HEDGING_ENABLED = True  # Non-streaming calls made with hedge=True
+LLM_HEDGE_MIN_SAMPLES = 20  # Latency samples before the p95 replaces the default delay
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = 2.0
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failed calls that open the circuit
+LLM_CIRCUIT_COOLDOWN_SECONDS = 30
+
+# ============================================================================
+# CONVERSATION SUMMARY (rolling summary replaces replaying old turns)
+# ============================================================================
+SUMMARY_ENABLED = True
+SUMMARY_MAX_TOKENS = 400  # Length cap of the running summary
+SUMMARY_RECENT_MESSAGES = 2  # Latest exchange kept verbatim; older turns are folded
+HISTORY_TOKEN_CEILING = 2500  # Hard cap on summary + replayed history per prompt
+HISTORY_RECENT_MESSAGES = 4  # Messages replayed verbatim while a conversation has no summary yet
+
+# ============================================================================
+# MODEL POLICY (model, max_tokens and temperature per agent and request shape)
+# ============================================================================
+# Rules are tried in order and the first whose "when" conditions all match wins.
+# Conditions: purpose (answer, single_shot, router, consult_router, summary, title, stats),
+# agents, attachment (image, data, none), answer_length (short, medium, long),
+# min_prompt_tokens, max_prompt_tokens. "fallbacks" are models tried in order
+# when the chosen one fails. A JSON file with the same list at MODEL_POLICY_PATH
+# replaces these rules and is reloaded when it changes.
+MODEL_POLICY_PATH = os.environ.get(
+    "HOOPS_MODEL_POLICY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_policy.json")
+)
+MODEL_POLICY = [
+    {"name": "router", "when": {"purpose": ["router"]},
+     "model": "gpt-3.5-turbo", "max_tokens": 20, "temperature": 0, "fallbacks": ["gpt-4o-mini"]},
+    {"name": "consult_router", "when": {"purpose": ["consult_router"]},
+     "model": "gpt-3.5-turbo", "max_tokens": 40, "temperature": 0, "fallbacks": ["gpt-4o-mini"]},
+    {"name": "summary", "when": {"purpose": ["summary"]},
+     "model": "gpt-4o-mini", "max_tokens": SUMMARY_MAX_TOKENS, "temperature": 0},
+    {"name": "title", "when": {"purpose": ["title"]},
+     "model": "gpt-4o-mini", "max_tokens": 400, "temperature": 0.3},
+    {"name": "stats_vision", "when": {"purpose": ["stats"], "attachment": ["image"]},
+     "model": "gpt-4o", "max_tokens": 1200, "temperature": 0, "fallbacks": ["gpt-4o-mini"]},
+    {"name": "stats", "when": {"purpose": ["stats"]},
+     "model": "gpt-4o-mini", "max_tokens": 1200, "temperature": 0},
+    {"name": "vision", "when": {"attachment": ["image"]},
+     "model": "gpt-4o", "max_tokens": 1500, "temperature": 0.7, "fallbacks": ["gpt-4o-mini"]},
+    {"name": "logistics_lookup", "when": {"agents": ["team_manager"], "answer_length": ["short"]},
+     "model": "gpt-4o-mini", "max_tokens": 500, "temperature": 0.3},
+    {"name": "deep_breakdown", "when": {"purpose": ["answer"], "agents": ["tactician", "analyst"], "answer_length": ["long"]},
+     "model": "gpt-4o", "max_tokens": 2000, "temperature": 0.7, "fallbacks": ["gpt-4o-mini"]},
+    {"name": "default", "when": {},
+     "model": "gpt-4o-mini", "max_tokens": 1500, "temperature": 0.7},
+]
+
+# ============================================================================
+# ANSWER CACHE (generic questions such as Quick Ideas)
+# ============================================================================
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_BACKEND = "memory"  # "memory" (per process) or "sqlite" (shared by all workers on the host)
+ANSWER_CACHE_PATH = os.path.join(CACHE_DIR, "answers.sqlite3")
+ANSWER_CACHE_TTL_SECONDS = 24 * 60 * 60
+ANSWER_CACHE_MAX_ENTRIES = 5000
+
+# Near-duplicate matching (MinHash/LSH, fully in-process)
+SIMILARITY_CACHE_ENABLED = True
+SIMILARITY_CACHE_THRESHOLD = 0.7  # Estimated Jaccard similarity of question word shingles
+SIMILARITY_CACHE_MAX_ENTRIES = 200000
+SIMILARITY_CACHE_BANDS = 16  # bands x rows = signature length
+SIMILARITY_CACHE_ROWS = 4
+
+# ============================================================================
+# DATABASE READ CACHE (Supabase reads reused across reruns until a write or TTL)
+# ============================================================================
+DB_CACHE_ENABLED = True
+DB_CACHE_TTL_SECONDS = {  # Per table; writes through the utils helpers invalidate sooner
+    "conversations": 120,
+    "messages": 300,
+    "coach_memories": 120,
+    "documents": 600,
+    "facilities": 300,
+    "events": 120,
+    "players": 300,
+}
+DB_CACHE_MAX_ENTRIES = 2000
+
+# ============================================================================
+# COLUMN PROJECTIONS (what each view selects instead of select("*"))
+# ============================================================================
+PROJECTIONS = {
+    "conversation_list": "id, title",  # Sidebar
+    "conversation_state": "id, title, summary, summary_covered",  # Opened conversation
+    "chat_history": "id, client_id, role, content, agent, stats, created_at",
+    "memory_context": "title, content, category, created_at",
+    "month_grid": "id, event_date, type, time_start",  # Calendar month
+    "day_events": "id, type, title, event_date, time_start, time_end, opponent, home_away, facilities(name)",
+    "event_context": "event_date, time_start, type, title, opponent, facilities(name)",  # Team Manager prompt
+    "facility_list": "id, name, address, contact_name, contact_phone",
+    "facility_options": "id, name",  # Event form select
+    "facility_context": "name, address, contact_name, contact_phone",
+    "player_roster": "id, first_name, last_name, jersey_number, position, parent1_name, parent1_phone",
+    "player_context": "first_name, last_name, jersey_number, position, parent1_name, parent1_phone",
+}
+PROJECTION_GUARD_ENABLED = True  # Report code reading a column its view did not select
+# Columns added by later features (conversations.summary text and summary_covered
+# integer for the rolling summary, messages.stats jsonb for the Analyst's charts,
+# messages.client_id text for matching queued rows with saved ones).
+# Where the database doesn't have them yet, their views are selected without them.
+PROJECTION_OPTIONAL_COLUMNS = {
+    "conversation_state": ["summary", "summary_covered"],
+    "chat_history": ["stats", "client_id"],
+}
+
+# ============================================================================
+# WRITE-BEHIND (message and memory inserts leave the chat critical path)
+# ============================================================================
+WRITE_BEHIND_ENABLED = True
+WRITE_BEHIND_FLUSH_SECONDS = 0.5  # Queued rows are inserted at least this often
+WRITE_BEHIND_BATCH_SIZE = 50  # ...or as soon as this many are queued
+WRITE_BEHIND_MAX_ATTEMPTS = 5  # Then the batch is retried row by row and rejected rows set aside
+WRITE_BEHIND_RETRY_BASE_SECONDS = 0.5  # Doubles per failed attempt
+WRITE_BEHIND_RETRY_MAX_SECONDS = 30
+WRITE_BEHIND_OPTIONAL_COLUMNS = {"messages": ["stats", "client_id"]}  # Dropped where the database lacks them
+WRITE_BEHIND_CLIENT_ID_COLUMNS = {"messages": "client_id"}  # Id given to each queued row, to match it once saved
+# Journal of queued rows, replayed on the next start if the process dies before
+# they are written (one per process: give each worker process its own path)
+WRITE_BEHIND_SPILL_PATH = os.path.join(CACHE_DIR, "write_behind.jsonl")
+WRITE_BEHIND_FAILED_PATH = os.path.join(CACHE_DIR, "write_behind_failed.jsonl")
+
+# ============================================================================
+# BACKGROUND JOBS (titles, memory extraction, summaries)
+# ============================================================================
+JOBS_ENABLED = True  # False runs every job inline when it is enqueued
+JOBS_DB_PATH = os.path.join(CACHE_DIR, "jobs.sqlite3")
+JOBS_WORKERS = 2
+JOBS_MAX_ATTEMPTS = 4
+JOBS_RETRY_BASE_SECONDS = 2  # Doubles per attempt
+JOBS_POLL_SECONDS = 1.0
+JOBS_STALE_SECONDS = 300  # "running" jobs older than this (crashed worker) are requeued
+JOBS_RETENTION_SECONDS = 24 * 60 * 60  # Finished jobs are purged after this
+TITLE_BATCH_SIZE = 8  # Conversation titles generated per model call
+
+# ============================================================================
+# TELEMETRY (one JSONL record per model call, rotated by size)
+# ============================================================================
+TELEMETRY_ENABLED = True
+TELEMETRY_PATH = os.path.join(CACHE_DIR, "telemetry", "llm_calls.jsonl")
+TELEMETRY_MAX_BYTES = 10 * 1024 * 1024
+TELEMETRY_BACKUP_COUNT = 5
+
+# Record/replay of model and database calls (see cassette.py). "record" writes
+# one gzip JSONL file per browser session; replay runs offline with
+# python cassette.py replay <file> [--scale 1.0]
+CASSETTE_MODE = os.environ.get("HOOPS_CASSETTE", "off")  # "off" or "record"
+CASSETTE_DIR = os.path.join(CACHE_DIR, "cassettes")
+CASSETTE_LATENCY_SCALE = 1.0  # Replay speed: 1.0 = recorded latency, 0 = instant
+
+# USD per 1M tokens: (input, cached input, output)
+LLM_PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+
 # ============================================================================
 # AGENTS
 # ============================================================================
@@ -111,17 +324,25 @@ AGENT_INFO = {
 # ============================================================================
 # ROUTER PROMPTS
 # ============================================================================
-ROUTER_PROMPT_WITH_CONTEXT = """You are a routing assistant for a basketball coaching app.
+# One line per agent in every routing prompt, most specific first
+ROUTER_AGENT_DESCRIPTIONS = {
+    Agent.TACTICIAN: "ONLY for X's & O's, plays, offensive/defensive schemes, zones, ATOs, pick & roll, spacing, game strategy during play",
+    Agent.SKILLS_COACH: "basketball drills, shooting technique, dribbling, footwork (ages 13+)",
+    Agent.NUTRITIONIST: "food, diet, meals, nutrition, eating, supplements, meal plans",
+    Agent.STRENGTH_COACH: "gym, strength, weights, jumping, speed, agility, workout programs",
+    Agent.ANALYST: "statistics, data, numbers, turnovers, assists, percentages, efficiency, analytics",
+    Agent.YOUTH_COACH: "kids, children, young players, ages 5-12, mini basketball, youth development",
+    Agent.TEAM_MANAGER: "schedule, calendar, events, practices, games, facilities, venues, halls, players roster, parent contacts, phone numbers, logistics, transportation",
+    Agent.ASSISTANT_COACH: "team management, practice planning, communication, leadership, motivation, player relationships, parent communication, team culture, administrative tasks, season planning, tryouts, roster management, team rules, handling conflicts",
+}
+ROUTER_AGENT_LIST = "\n".join(f"- {agent.name}: {description}" for agent, description in ROUTER_AGENT_DESCRIPTIONS.items())
+_router_agent_names = [agent.name for agent in ROUTER_AGENT_DESCRIPTIONS]
+ROUTER_AGENT_NAMES = ", ".join(_router_agent_names[:-1]) + ", or " + _router_agent_names[-1]
+
+ROUTER_PROMPT_WITH_CONTEXT = f"""You are a routing assistant for a basketball coaching app.
 
 AGENTS AVAILABLE:
-- TACTICIAN: ONLY for X's & O's, plays, offensive/defensive schemes, zones, ATOs, pick & roll, spacing, game strategy during play
-- SKILLS_COACH: basketball drills, shooting technique, dribbling, footwork (ages 13+)
-- NUTRITIONIST: food, diet, meals, nutrition, eating, supplements, meal plans
-- STRENGTH_COACH: gym, strength, weights, jumping, speed, agility, workout programs
-- ANALYST: statistics, data, numbers, turnovers, assists, percentages, efficiency, analytics
-- YOUTH_COACH: kids, children, young players, ages 5-12, mini basketball, youth development
-- TEAM_MANAGER: schedule, calendar, events, practices, games, facilities, venues, halls, players roster, parent contacts, phone numbers, logistics, transportation
-- ASSISTANT_COACH: team management, practice planning, communication, leadership, motivation, player relationships, parent communication, team culture, administrative tasks, season planning, tryouts, roster management, team rules, handling conflicts
+{ROUTER_AGENT_LIST}
 
 IMPORTANT DISTINCTIONS:
 - "When is the next practice?" → TEAM_MANAGER
@@ -136,9 +357,9 @@ IMPORTANT DISTINCTIONS:
 - "Offensive sets" → TACTICIAN
 
 CURRENT SITUATION:
-Previous agent: {previous_agent}
-Agent's last message: {previous_message}
-User's response: {question}
+Previous agent: {{previous_agent}}
+Agent's last message: {{previous_message}}
+User's response: {{question}}
 
 ROUTING RULES:
 1. If the previous agent ASKED FOR INFORMATION and the user is PROVIDING that information → STAY with the SAME agent
@@ -149,20 +370,13 @@ ROUTING RULES:
 6. Numbers, measurements, statistics responses are ALWAYS continuations → STAY with same agent
 7. When in doubt → STAY with the same agent
 
-Which agent should handle this? Answer with ONE word: TACTICIAN, SKILLS_COACH, NUTRITIONIST, STRENGTH_COACH, ANALYST, YOUTH_COACH, TEAM_MANAGER, or ASSISTANT_COACH"""
+Which agent should handle this? Answer with ONE word: {ROUTER_AGENT_NAMES}"""
 
 
-ROUTER_PROMPT_NO_CONTEXT = """Determine which coach should answer this basketball question.
+ROUTER_PROMPT_NO_CONTEXT = f"""Determine which coach should answer this basketball question.
 
 AGENTS:
-- TACTICIAN: ONLY for X's & O's, plays, offensive/defensive schemes, zones, ATOs, pick & roll, spacing, game strategy during play
-- SKILLS_COACH: basketball drills, shooting technique, dribbling, footwork (ages 13+)
-- NUTRITIONIST: food, diet, meals, nutrition, eating, supplements, meal plans
-- STRENGTH_COACH: gym, strength, weights, jumping, speed, agility, workout programs
-- ANALYST: statistics, data, numbers, turnovers, assists, percentages, efficiency, analytics
-- YOUTH_COACH: kids, children, young players, ages 5-12, mini basketball, youth development
-- TEAM_MANAGER: schedule, calendar, events, practices, games, facilities, venues, halls, players roster, parent contacts, phone numbers, logistics, transportation
-- ASSISTANT_COACH: team management, practice planning, communication, leadership, motivation, player relationships, parent communication, team culture, administrative tasks, season planning, tryouts, roster management, team rules, handling conflicts
+{ROUTER_AGENT_LIST}
 
 IMPORTANT DISTINCTIONS:
 - "When is the next practice?" → TEAM_MANAGER
@@ -177,13 +391,61 @@ IMPORTANT DISTINCTIONS:
 - "Pick and roll coverage" → TACTICIAN
 - "Offensive sets" → TACTICIAN
 
-Question: {question}
+Question: {{question}}
+
+Answer with ONE word: {ROUTER_AGENT_NAMES}"""
+
+ROUTER_MULTI_CONTEXT = """
+PREVIOUS: The {previous_agent} just answered: "{previous_message}"
+If this is a follow-up to that answer, answer {previous_agent} alone.
+"""
+
+ROUTER_PROMPT_MULTI = f"""Determine which coaches should answer this basketball question. Most questions need ONE coach; list more only when the question clearly asks for several different specialties.
 
-Answer with ONE word: TACTICIAN, SKILLS_COACH, NUTRITIONIST, STRENGTH_COACH, ANALYST, YOUTH_COACH, TEAM_MANAGER, or ASSISTANT_COACH"""
+AGENTS:
+{ROUTER_AGENT_LIST}
+
+EXAMPLES:
+- "How to beat zone defense" → TACTICIAN
+- "Plan a game day for my U14 team: warmup, meals, and what defense to run" → STRENGTH_COACH, NUTRITIONIST, TACTICIAN
+- "When is the next practice and what should we work on?" → TEAM_MANAGER, ASSISTANT_COACH
+{{context}}
+Question: {{question}}
+
+Answer with the coach names only, most relevant first, comma-separated, at most {{max_agents}}."""
+
+# ============================================================================
+# LOCAL ROUTER (fast path in front of the LLM router)
+# ============================================================================
+ROUTER_LOCAL_ENABLED = True
+ROUTER_LOCAL_THRESHOLD = 0.8  # Minimum classifier confidence to skip the LLM router (recalibrate: python classifier.py)
+ROUTER_LOCAL_MIN_MARGIN = 0.5  # Minimum lead of the top agent over the runner-up
+ROUTER_LOCAL_MIN_TOKENS = 2  # Minimum distinct known content words in the question
+ROUTER_LOCAL_MAX_MISROUTE = 0.06  # Highest held-out misroute rate among fast-path answers the threshold may allow
+ROUTER_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_model.json")
+
+# ============================================================================
+# SINGLE-SHOT ROUTING (one completion picks the agent and answers)
+# ============================================================================
+SINGLE_SHOT_ROUTING = False  # Replaces the LLM router call for questions the local router can't place
+SINGLE_SHOT_REDIRECT_AGENTS = [Agent.TEAM_MANAGER]  # Need live data, so they get a regular agent call
+
+# ============================================================================
+# CONSULT MODE (several specialists answer one question in parallel)
+# ============================================================================
+CONSULT_MODE_ENABLED = False  # Opt-in; when on, it takes precedence over SINGLE_SHOT_ROUTING for the LLM router path
+CONSULT_MAX_AGENTS = 3
+CONSULT_MAX_CONCURRENCY = 3  # Parallel agent calls per consult turn
+
+# ============================================================================
+# ANALYST STATS (structured stats extracted alongside THE ANALYST's answer)
+# ============================================================================
+ANALYST_STATS_ENABLED = True  # Stored with the message and charted without regex parsing
 
 # ============================================================================
 # LOGISTICS SETTINGS
 # ============================================================================
 EVENT_TYPES = ["practice", "game", "tournament", "meeting", "other"]
+EVENTS_BULK_CHUNK_SIZE = 100  # Events per insert request when creating a recurring series
 FACILITY_TYPES = ["gym", "outdoor", "fitness_room", "other"]
 PLAYER_POSITIONS = ["Guard", "Forward", "Center"]
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Database Cache
+Read-through cache for Supabase reads with per-table TTLs and invalidation by the write helpers
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from config import DB_CACHE_ENABLED, DB_CACHE_TTL_SECONDS, DB_CACHE_MAX_ENTRIES, CASSETTE_MODE
+
+# ============================================================================
+# CACHE
+# ============================================================================
+class ReadThroughCache:
+    """Query results keyed by (table, scope, filters).
+
+    scope is the coach (or conversation) the rows belong to, so one coach's
+    reads never serve another's. Each table and each (table, scope) has a
+    generation counter that writes bump; an entry is only served while both
+    still match the ones it was loaded under and its TTL has not passed.
+    """
+
+    def __init__(self, ttls, max_entries):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, generations, rows)
+        self._generations = defaultdict(int)
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0, "invalidations": 0})
+        self._lock = threading.Lock()
+
+    def _current(self, table, scope):
+        return self._generations[table], self._generations[(table, scope)]
+
+    def read(self, table, scope, filters, loader):
+        """Return loader()'s rows for this key, from cache when still valid.
+
+        Exceptions from loader propagate and nothing is cached, so callers
+        keep their own error handling.
+        """
+        key = (table, scope, filters)
+        with self._lock:
+            generations = self._current(table, scope)
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic() and entry[1] == generations:
+                self._entries.move_to_end(key)
+                self._stats[table]["hits"] += 1
+                return copy.deepcopy(entry[2])
+            self._stats[table]["misses"] += 1
+
+        rows = loader()
+
+        with self._lock:
+            # A write that landed while loading makes these rows stale already
+            if self._current(table, scope) == generations:
+                expires = time.monotonic() + self.ttls.get(table, 60)
+                self._entries[key] = (expires, generations, copy.deepcopy(rows))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return rows
+
+    def invalidate(self, table, scope=None):
+        """Drop a scope's cached reads of a table, or the whole table's when scope is None"""
+        with self._lock:
+            self._generations[table if scope is None else (table, scope)] += 1
+            self._stats[table]["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hits, misses and invalidations per table, plus totals"""
+        with self._lock:
+            tables = {table: dict(counts) for table, counts in self._stats.items()}
+            entries = len(self._entries)
+        hits = sum(t["hits"] for t in tables.values())
+        misses = sum(t["misses"] for t in tables.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "tables": tables,
+        }
+
+
+_cache = ReadThroughCache(DB_CACHE_TTL_SECONDS, DB_CACHE_MAX_ENTRIES)
+
+# ============================================================================
+# MODULE API
+# ============================================================================
+def cached_read(table, scope, filters, loader):
+    """Read rows through the process-wide cache (loader runs directly when disabled).
+
+    While sessions are being recorded every read runs its loader, so each
+    query reaches the cassette instead of being answered from memory.
+    """
+    if not DB_CACHE_ENABLED or CASSETTE_MODE == "record":
+        return loader()
+    return _cache.read(table, scope, filters, loader)
+
+def invalidate(table, scope=None):
+    """Invalidate cached reads after a write to table (for one scope, or all)"""
+    _cache.invalidate(table, scope)
+
+def get_db_cache_stats():
+    """Get hit/miss counts of the database read cache"""
+    return _cache.stats()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Fake LLM
+Offline, deterministic stand-in for the OpenAI client with a latency model and fault injection
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from config import (
+    Agent,
+    FAKE_LLM_TTFT_SECONDS, FAKE_LLM_TOKENS_PER_SECOND, FAKE_LLM_ANSWER_TOKENS,
+    FAKE_LLM_FAULT_RATES, FAKE_LLM_SEED
+)
+from prompt_budget import count_tokens
+
+ROUTER_QUESTION_PATTERN = re.compile(r"^(?:Question|User's response):\s*(.+)$", re.MULTILINE)
+FILLER_WORDS = (
+    "spacing", "closeout", "rebound", "transition", "footwork", "conditioning", "hydration",
+    "screen", "rotation", "tempo", "defense", "communication", "drill", "recovery", "ball",
+    "movement", "shooting", "protein", "tryouts", "practice",
+)
+ANSWER_TEMPLATE = "[offline {model}] Answer to: {question}\n\n"
+STAT_PATTERN = re.compile(r"(\d+)\s*(points|pts|rebounds|reb|assists|ast)\b", re.IGNORECASE)
+STAT_NAMES = {"pts": "points", "reb": "rebounds", "ast": "assists"}
+MIN_CACHED_PREFIX_TOKENS = 1024  # Provider prompt caching starts at this many prefix tokens
+
+# Model-time intervals of the current turn; shared with worker threads that run in a copy of its context
+_meter = contextvars.ContextVar("fake_llm_meter", default=None)
+
+
+class FakeStatusError(Exception):
+    """Injected HTTP error carrying a status_code like openai.APIStatusError"""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# ============================================================================
+# ANSWERS
+# ============================================================================
+def _last_user_text(messages):
+    """Get the text of the last user message (text parts of multimodal content)"""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+            return content or ""
+    return ""
+
+def _route(text):
+    """Answer a router prompt with the local classifier's choice"""
+    from classifier import classify_question
+    match = ROUTER_QUESTION_PATTERN.search(text)
+    agent, _ = classify_question(match.group(1) if match else text[-300:])
+    return (agent or Agent.ASSISTANT_COACH).value.upper()
+
+def _filler(seed_text, tokens):
+    """Deterministic pseudo-text of roughly the given number of tokens"""
+    digest = int(hashlib.sha256(seed_text.encode("utf-8")).hexdigest(), 16)
+    words = [FILLER_WORDS[(digest >> (i % 200)) % len(FILLER_WORDS)] for i in range(tokens)]
+    return " ".join(words) + "."
+
+def _stats_payload(text):
+    """Answer a stats extraction request with the counting stats written as "<n> points" etc."""
+    line = {"label": "Game 1"}
+    for value, name in STAT_PATTERN.findall(text):
+        line[STAT_NAMES.get(name.lower(), name.lower())] = int(value)
+    if len(line) == 1:
+        return json.dumps({"players": []})
+    return json.dumps({"players": [{"name": "Player", "games": [line]}]})
+
+def default_responder(kwargs, answer_tokens=FAKE_LLM_ANSWER_TOKENS):
+    """Canned answers per request kind: router, titles, stats, summary, single-shot, then a templated agent answer"""
+    messages = kwargs.get("messages", [])
+    text = _last_user_text(messages)
+    system = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else ""
+
+    if "AGENTS" in text and ("Answer with" in text or "comma-separated" in text):
+        return _route(text)
+    if kwargs.get("response_format") and "conversation titles" in text:
+        count = len(re.findall(r"^\d+\. Q:", text, re.MULTILINE))
+        return json.dumps({"titles": [f"Offline chat {i + 1}" for i in range(count)]})
+    if (kwargs.get("response_format") or {}).get("type") == "json_schema":
+        return _stats_payload(text)
+    if "running summary" in text:
+        return "Summary: " + _filler(text, min(60, kwargs.get("max_tokens", 60)))
+    answer = ANSWER_TEMPLATE.format(model=kwargs.get("model"), question=text[:200])
+    answer += _filler(text, min(answer_tokens, kwargs.get("max_tokens", answer_tokens)))
+    if 'The FIRST line must be exactly "AGENT: <NAME>"' in system:
+        answer = f"AGENT: {_route(text)}\n\n" + answer
+    return answer
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+class FakeCompletions:
+    """chat.completions with create(**kwargs), streaming and stream_options included"""
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        return self._owner._create(kwargs)
+
+
+class FakeOpenAI:
+    """Drop-in for openai.OpenAI in chat completion calls, without network access.
+
+    responder(kwargs) -> str produces the answer (default_responder unless
+    given). Latency is ttft + completion_tokens / tokens_per_second, scaled by
+    up to +/- jitter. fault_rates maps "429", "500" and "timeout" to the
+    probability of raising that fault instead of answering. Simulated model
+    time of a turn is metered from start_meter() to model_seconds(), including
+    calls made on threads that copy the turn's context (like hedged requests).
+    """
+
+    def __init__(self, responder=None, ttft=FAKE_LLM_TTFT_SECONDS, tokens_per_second=FAKE_LLM_TOKENS_PER_SECOND,
+                 fault_rates=None, jitter=0.1, seed=FAKE_LLM_SEED, sleep=time.sleep):
+        self.responder = responder or default_responder
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.fault_rates = dict(FAKE_LLM_FAULT_RATES if fault_rates is None else fault_rates)
+        self.jitter = jitter
+        self.chat = SimpleNamespace(completions=FakeCompletions(self))
+        self.calls = 0
+        self._sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._seen_prefixes = set()
+
+    # Latency & faults
+    def start_meter(self):
+        """Start metering simulated model time for the current context (one benchmark turn)"""
+        _meter.set([])
+
+    def model_seconds(self):
+        """Wall time the metered turn had at least one model call in progress.
+
+        Overlapping calls (an original request and its hedge) count once.
+        """
+        intervals = _meter.get()
+        if not intervals:
+            return 0.0
+        with self._lock:
+            intervals = sorted(intervals)
+        total, current_start, current_end = 0.0, intervals[0][0], intervals[0][1]
+        for start, end in intervals[1:]:
+            if start > current_end:
+                total += current_end - current_start
+                current_start = start
+            current_end = max(current_end, end)
+        return total + current_end - current_start
+
+    def _wait(self, seconds):
+        if seconds > 0:
+            intervals = _meter.get()
+            if intervals is not None:
+                started = time.monotonic()
+                with self._lock:
+                    intervals.append((started, started + seconds))
+            self._sleep(seconds)
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self._random.random(), self._random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _maybe_fail(self, roll, timeout):
+        threshold = 0.0
+        for fault in ("429", "500", "timeout"):
+            threshold += self.fault_rates.get(fault, 0.0)
+            if roll < threshold:
+                if fault == "timeout":
+                    self._wait(timeout if timeout else self.ttft)
+                    raise TimeoutError("Injected timeout")
+                self._wait(self.ttft / 4)
+                raise FakeStatusError(int(fault), f"Injected {fault} error")
+
+    # Usage
+    def _usage(self, kwargs, completion_tokens):
+        messages = kwargs.get("messages", [])
+        model = kwargs.get("model", "gpt-4o-mini")
+        prompt_tokens = 0
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, list):
+                content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+            prompt_tokens += count_tokens(content or "", model) + 4
+
+        # Repeated system prompts are served from the provider's prefix cache
+        cached = 0
+        if messages and messages[0].get("role") == "system":
+            prefix = hashlib.sha256(f"{model}\n{messages[0]['content']}".encode("utf-8")).hexdigest()
+            prefix_tokens = count_tokens(messages[0]["content"], model)
+            with self._lock:
+                if prefix in self._seen_prefixes and prefix_tokens >= MIN_CACHED_PREFIX_TOKENS:
+                    cached = prefix_tokens // 128 * 128
+                self._seen_prefixes.add(prefix)
+
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached),
+        )
+
+    # Requests
+    def _create(self, kwargs):
+        roll, scale = self._draw()
+        timeout = kwargs.pop("timeout", None)
+        self._maybe_fail(roll, timeout)
+
+        text = self.responder(kwargs)
+        pieces = re.findall(r"\S+\s*|\s+", text)
+        ttft = self.ttft * scale
+        per_token = scale / self.tokens_per_second if self.tokens_per_second else 0.0
+        if timeout and ttft > timeout:
+            self._wait(timeout)
+            raise TimeoutError("Simulated model latency exceeded the request timeout")
+
+        usage = self._usage(kwargs, len(pieces))
+        if kwargs.get("stream"):
+            include_usage = (kwargs.get("stream_options") or {}).get("include_usage")
+            return self._stream(kwargs.get("model"), pieces, ttft, per_token, usage if include_usage else None)
+
+        self._wait(ttft + per_token * len(pieces))
+        message = SimpleNamespace(role="assistant", content=text)
+        return SimpleNamespace(
+            id=f"fake-{self.calls}",
+            model=kwargs.get("model"),
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+            usage=usage,
+        )
+
+    def _stream(self, model, pieces, ttft, per_token, usage):
+        self._wait(ttft)
+        for index, piece in enumerate(pieces):
+            if index:
+                self._wait(per_token)
+            delta = SimpleNamespace(role="assistant" if index == 0 else None, content=piece)
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)], usage=None)
+        if usage is not None:
+            yield SimpleNamespace(model=model, choices=[], usage=usage)
+
+
+class FakeAsyncCompletions:
+    """Async chat.completions.create (non-streaming) backed by a FakeOpenAI"""
+
+    def __init__(self, fake):
+        self._fake = fake
+
+    async def create(self, **kwargs):
+        return await asyncio.to_thread(self._fake._create, kwargs)
+
+
+class FakeAsyncOpenAI:
+    """Drop-in for openai.AsyncOpenAI in non-streaming chat completion calls.
+
+    Pass sync to share an existing FakeOpenAI (its call count, faults and meter).
+    """
+
+    def __init__(self, sync=None, **options):
+        self.sync = sync or FakeOpenAI(**options)
+        self.chat = SimpleNamespace(completions=FakeAsyncCompletions(self.sync))
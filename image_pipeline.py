@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Image Pipeline
+Shrinks uploaded images before vision calls and picks the vision detail level
+"""
+
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from config import (
+    IMAGE_MAX_LONG_EDGE, IMAGE_MAX_SHORT_EDGE, IMAGE_LOW_DETAIL_MAX_EDGE,
+    IMAGE_OUTPUT_FORMAT, IMAGE_OUTPUT_QUALITY, IMAGE_CACHE_MAX_ENTRIES
+)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional - images are sent as uploaded
+    Image = None
+
+OUTPUT_MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+# ============================================================================
+# PROCESSING
+# ============================================================================
+def target_size(width, height):
+    """Scale (width, height) down to fit the long and short edge limits"""
+    long_edge, short_edge = max(width, height), min(width, height)
+    scale = min(1.0, IMAGE_MAX_LONG_EDGE / long_edge, IMAGE_MAX_SHORT_EDGE / short_edge)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def select_detail(width, height):
+    """Pick the vision detail level: "low" when the image fits a single tile"""
+    return "low" if max(width, height) <= IMAGE_LOW_DETAIL_MAX_EDGE else "high"
+
+def _encode(image):
+    """Encode a PIL image in the configured format, falling back to JPEG"""
+    for fmt in (IMAGE_OUTPUT_FORMAT, "JPEG"):
+        out = image
+        if fmt == "JPEG" and out.mode not in ("RGB", "L"):
+            out = out.convert("RGB")
+        options = {"method": 4} if fmt == "WEBP" else {"optimize": True}
+        buffer = io.BytesIO()
+        try:
+            out.save(buffer, format=fmt, quality=IMAGE_OUTPUT_QUALITY, **options)
+        except (KeyError, OSError, ValueError):
+            continue
+        return buffer.getvalue(), OUTPUT_MIME_TYPES[fmt]
+    raise OSError("No usable image encoder")
+
+def _process(file_bytes, mime_type):
+    """Decode, auto-orient, downscale and re-encode one image"""
+    image = Image.open(io.BytesIO(file_bytes))
+    rotated = image.getexif().get(0x0112, 1) != 1  # EXIF Orientation tag
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    size = target_size(*image.size)
+    resized = size != image.size
+    if resized:
+        image = image.resize(size, Image.LANCZOS)
+
+    data, out_mime = _encode(image)
+    if len(data) >= len(file_bytes) and not rotated and not resized:
+        # Already small and upright enough: keep the original bytes
+        data, out_mime = file_bytes, mime_type
+
+    width, height = size
+    return {
+        "type": "image",
+        "data": base64.b64encode(data).decode('utf-8'),
+        "mime_type": out_mime,
+        "detail": select_detail(width, height),
+        "width": width,
+        "height": height,
+        "original_bytes": len(file_bytes),
+        "processed_bytes": len(data),
+    }
+
+def prepare_image(file_bytes, mime_type):
+    """Return the image dict for a vision call, cached by content hash.
+
+    Without Pillow (or for undecodable files) the original bytes are sent with
+    detail "auto".
+    """
+    key = hashlib.sha256(file_bytes).hexdigest()
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return dict(_cache[key])
+
+    result = None
+    if Image is not None:
+        try:
+            result = _process(file_bytes, mime_type)
+        except Exception as e:
+            print(f"Error processing image: {e}")
+    if result is None:
+        result = {
+            "type": "image",
+            "data": base64.b64encode(file_bytes).decode('utf-8'),
+            "mime_type": mime_type,
+            "detail": "auto",
+        }
+
+    with _lock:
+        _cache[key] = result
+        while len(_cache) > IMAGE_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return dict(result)
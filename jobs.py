@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Background Jobs
+SQLite-backed job queue with worker threads, retries, dedup keys and batching
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import (
+    JOBS_ENABLED, JOBS_DB_PATH, JOBS_WORKERS, JOBS_MAX_ATTEMPTS, JOBS_RETRY_BASE_SECONDS,
+    JOBS_POLL_SECONDS, JOBS_STALE_SECONDS, JOBS_RETENTION_SECONDS, TITLE_BATCH_SIZE
+)
+from prompts import TITLE_BATCH_PROMPT
+
+# ============================================================================
+# QUEUE
+# ============================================================================
+class JobQueue:
+    """Persistent queue of {kind, payload} jobs.
+
+    A job with a dedup key replaces the payload of a still-queued job with the
+    same key instead of adding another. Failed jobs are retried with
+    exponential backoff up to max_attempts. Handlers registered with
+    batch_size > 1 receive a list of payloads claimed together.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._handlers = {}
+        self._resources = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._workers = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, dedup_key TEXT, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+            "run_after REAL NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, last_error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_dedup ON jobs (dedup_key) "
+            "WHERE dedup_key IS NOT NULL AND status = 'queued'"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after)")
+
+    # Registration
+    def register(self, kind, handler, batch_size=1):
+        """Register handler(payload, resources) or, with batch_size > 1, handler(payloads, resources)"""
+        self._handlers[kind] = (handler, batch_size)
+
+    def start(self, workers=JOBS_WORKERS, **resources):
+        """Start worker threads (once per process); resources (clients) are passed to handlers"""
+        with self._lock:
+            self._resources.update(resources)
+            if self._workers or not JOBS_ENABLED:
+                return
+            for i in range(workers):
+                thread = threading.Thread(target=self._run, name=f"hoops-jobs-{i}", daemon=True)
+                thread.start()
+                self._workers.append(thread)
+
+    # Producing
+    def enqueue(self, kind, payload, dedup_key=None, delay=0, max_attempts=JOBS_MAX_ATTEMPTS):
+        """Add a job; returns False if it only refreshed an already-queued duplicate"""
+        if not JOBS_ENABLED:
+            return self._run_inline(kind, payload)
+
+        now = time.time()
+        encoded = json.dumps(payload, ensure_ascii=False, default=str)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (kind, dedup_key, payload, status, max_attempts, run_after, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                    (kind, dedup_key, encoded, max_attempts, now + delay, now, now)
+                )
+                added = True
+            except sqlite3.IntegrityError:
+                self._conn.execute(
+                    "UPDATE jobs SET payload = ?, updated_at = ? WHERE dedup_key = ? AND status = 'queued'",
+                    (encoded, now, dedup_key)
+                )
+                added = False
+        self._wakeup.set()
+        return added
+
+    def _run_inline(self, kind, payload):
+        handler, batch_size = self._handlers[kind]
+        try:
+            handler([payload] if batch_size > 1 else payload, self._resources)
+        except Exception as e:
+            print(f"Error running {kind} job: {e}")
+        return True
+
+    # Consuming
+    def claim(self, now=None):
+        """Atomically mark the next ready job(s) running: (kind, [(id, payload, attempts, max_attempts)])"""
+        now = now or time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Requeue jobs of crashed workers; ones superseded by a newer duplicate are dropped
+                self._conn.execute(
+                    "UPDATE OR IGNORE jobs SET status = 'queued' WHERE status = 'running' AND updated_at < ?",
+                    (now - JOBS_STALE_SECONDS,)
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', last_error = 'superseded' "
+                    "WHERE status = 'running' AND updated_at < ?",
+                    (now - JOBS_STALE_SECONDS,)
+                )
+                first = self._conn.execute(
+                    "SELECT kind FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY run_after, id LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if first is None or first[0] not in self._handlers:
+                    self._conn.execute("COMMIT")
+                    return None, []
+                kind = first[0]
+                rows = self._conn.execute(
+                    "SELECT id, payload, attempts, max_attempts FROM jobs "
+                    "WHERE status = 'queued' AND run_after <= ? AND kind = ? ORDER BY run_after, id LIMIT ?",
+                    (now, kind, self._handlers[kind][1])
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(now, row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return kind, [(row[0], json.loads(row[1]), row[2] + 1, row[3]) for row in rows]
+
+    def complete(self, job_ids):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'done', updated_at = ?, last_error = NULL WHERE id = ?",
+                [(time.time(), job_id) for job_id in job_ids]
+            )
+
+    def fail(self, jobs, error):
+        """Requeue with backoff, or mark failed after the last attempt"""
+        now = time.time()
+        with self._lock:
+            for job_id, _, attempts, max_attempts in jobs:
+                if attempts < max_attempts:
+                    try:
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'queued', run_after = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                            (now + JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1), now, str(error), job_id)
+                        )
+                    except sqlite3.IntegrityError:
+                        # A newer job with the same dedup key is queued and will do the work
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'failed', updated_at = ?, last_error = 'superseded' WHERE id = ?",
+                            (now, job_id)
+                        )
+                else:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', updated_at = ?, last_error = ? WHERE id = ?",
+                        (now, str(error), job_id)
+                    )
+
+    def purge(self):
+        """Delete finished jobs past the retention period"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - JOBS_RETENTION_SECONDS,)
+            )
+
+    def run_once(self):
+        """Claim and run one job (or batch); returns True if there was work"""
+        kind, jobs = self.claim()
+        if not jobs:
+            return False
+        handler, batch_size = self._handlers[kind]
+        payloads = [payload for _, payload, _, _ in jobs]
+        try:
+            handler(payloads if batch_size > 1 else payloads[0], self._resources)
+        except Exception as e:
+            print(f"Error running {kind} job: {e}")
+            self.fail(jobs, e)
+        else:
+            self.complete([job_id for job_id, _, _, _ in jobs])
+        return True
+
+    def _run(self):
+        last_purge = 0.0
+        while True:
+            try:
+                if not self.run_once():
+                    self._wakeup.wait(JOBS_POLL_SECONDS)
+                    self._wakeup.clear()
+                if time.time() - last_purge > 3600:
+                    self.purge()
+                    last_purge = time.time()
+            except Exception as e:
+                print(f"Error in job worker: {e}")
+                time.sleep(JOBS_POLL_SECONDS)
+
+    def counts(self):
+        """Jobs per (kind, status)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status").fetchall()
+        return {(kind, status): count for kind, status, count in rows}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Get the process-wide job queue with the app's handlers registered"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(JOBS_DB_PATH)
+            _queue.register("title", generate_titles, batch_size=TITLE_BATCH_SIZE)
+            _queue.register("memory", extract_memory)
+            _queue.register("summary", fold_summary)
+        return _queue
+
+def enqueue(kind, payload, dedup_key=None, delay=0):
+    """Add a job to the process-wide queue"""
+    return get_job_queue().enqueue(kind, payload, dedup_key, delay)
+
+def start_job_workers(client, supabase):
+    """Start the background workers with the process-wide clients"""
+    get_job_queue().start(client=client, supabase=supabase)
+
+# ============================================================================
+# JOB HANDLERS
+# ============================================================================
+def generate_titles(payloads, resources):
+    """Title several new conversations with one model call"""
+    from model_policy import select_model_settings, policy_completion
+    from utils import update_conversation_title
+
+    items = "\n".join(
+        f"{i + 1}. Q: {p['question'][:300]}\n   A: {(p.get('answer') or '')[:200]}"
+        for i, p in enumerate(payloads)
+    )
+    response = policy_completion(
+        resources["client"], None, select_model_settings("title"),
+        telemetry={"purpose": "title"},
+        response_format={"type": "json_object"},
+        messages=[{"role": "user", "content": TITLE_BATCH_PROMPT.format(items=items, count=len(payloads))}]
+    )
+    titles = json.loads(response.choices[0].message.content).get("titles") or []
+    if len(titles) != len(payloads):
+        raise ValueError(f"Expected {len(payloads)} titles, got {len(titles)}")
+    for payload, title in zip(payloads, titles):
+        title = str(title).strip().strip('"')[:50]
+        if title:
+            update_conversation_title(resources["supabase"], payload["conversation_id"], title)
+
+def extract_memory(payload, resources):
+    """Save a coach memory from a finished turn if it qualifies"""
+    from utils import process_memory_save
+    process_memory_save(
+        resources["supabase"], payload["coach_id"], payload["user_message"], payload["ai_response"],
+        payload.get("conversation_id"), payload.get("message_count", 1)
+    )
+
+def fold_summary(payload, resources):
+    """Fold a conversation's older turns into its rolling summary"""
+    from summarizer import fold_conversation
+    summary = fold_conversation(
+        resources["client"], resources["supabase"], payload["conversation"], payload["messages"], payload.get("coach_id"),
+        payload.get("offset", 0)
+    )
+    if summary is None:
+        raise RuntimeError("Summary update failed")
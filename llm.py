@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Model Calls
+Process-wide concurrency governor, resilient call layer (deadlines, retries,
+hedging, circuit breaker) and the sync/async chat completion entry points
+"""
+
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+from types import SimpleNamespace
+
+import openai
+
+from config import (
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_QUEUE_DEPTH, LLM_MAX_QUEUE_WAIT_SECONDS,
+    LLM_DEFAULT_DEADLINE_SECONDS, LLM_MAX_ATTEMPTS, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS,
+    LLM_HEDGING_ENABLED, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_DEFAULT_DELAY_SECONDS,
+    LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_COOLDOWN_SECONDS
+)
+from prompt_budget import count_tokens
+from telemetry import record_llm_call
+
+
+class GovernorBusyError(Exception):
+    """Raised when a request can't be queued or waited too long for capacity"""
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the model API is considered unhealthy"""
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+# ============================================================================
+# CONCURRENCY GOVERNOR
+# ============================================================================
+class ConcurrencyGovernor:
+    """Token-bucket limiter for requests/minute and tokens/minute with per-coach fair queuing.
+
+    Waiting requests are grouped per coach and served round-robin across
+    coaches, so one coach firing many requests can't starve the others.
+    The queue is bounded; requests beyond LLM_MAX_QUEUE_DEPTH, or waiting
+    longer than the timeout, raise GovernorBusyError.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_queue_depth, max_wait_seconds):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.max_queue_depth = max_queue_depth
+        self.max_wait_seconds = max_wait_seconds
+
+        self._cond = threading.Condition()
+        self._request_tokens = float(requests_per_minute)
+        self._token_tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._queues = OrderedDict()  # coach key -> deque of tickets, in round-robin order
+        self._depth = 0
+
+        self._admitted = 0
+        self._rejected = 0
+        self._max_depth_seen = 0
+        self._waits = deque(maxlen=1000)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._request_tokens = min(self.rpm, self._request_tokens + elapsed * self.rpm / 60.0)
+        self._token_tokens = min(self.tpm, self._token_tokens + elapsed * self.tpm / 60.0)
+
+    def _seconds_until_capacity(self, tokens):
+        missing_requests = max(0.0, 1 - self._request_tokens)
+        missing_tokens = max(0.0, tokens - self._token_tokens)
+        return max(missing_requests * 60.0 / self.rpm, missing_tokens * 60.0 / self.tpm)
+
+    def _head_ticket(self):
+        if not self._queues:
+            return None
+        return self._queues[next(iter(self._queues))][0]
+
+    def _dequeue(self, coach_key, ticket):
+        queue = self._queues[coach_key]
+        queue.remove(ticket)
+        del self._queues[coach_key]
+        if queue:
+            # Coach goes to the back of the round-robin
+            self._queues[coach_key] = queue
+        self._depth -= 1
+
+    def acquire(self, coach_id=None, tokens=1, timeout=None):
+        """Block until the request may be sent; returns the tokens reserved"""
+        timeout = self.max_wait_seconds if timeout is None else timeout
+        tokens = max(1, min(int(tokens), self.tpm))
+        coach_key = coach_id or "_anonymous"
+        ticket = object()
+        started = time.monotonic()
+
+        with self._cond:
+            if self._depth >= self.max_queue_depth:
+                self._rejected += 1
+                raise GovernorBusyError("The coaching staff is very busy right now. Please try again in a minute.")
+            self._queues.setdefault(coach_key, deque()).append(ticket)
+            self._depth += 1
+            self._max_depth_seen = max(self._max_depth_seen, self._depth)
+
+            try:
+                while True:
+                    self._refill()
+                    if self._head_ticket() is ticket:
+                        wait = self._seconds_until_capacity(tokens)
+                        if wait <= 0:
+                            self._request_tokens -= 1
+                            self._token_tokens -= tokens
+                            self._dequeue(coach_key, ticket)
+                            self._admitted += 1
+                            self._waits.append(time.monotonic() - started)
+                            self._cond.notify_all()
+                            return tokens
+                    else:
+                        wait = 0.25
+
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._dequeue(coach_key, ticket)
+                        self._rejected += 1
+                        self._cond.notify_all()
+                        raise GovernorBusyError("Waited too long for the coaching staff. Please try again.")
+                    self._cond.wait(min(wait, remaining))
+            except GovernorBusyError:
+                raise
+            except BaseException:
+                if ticket in self._queues.get(coach_key, ()):
+                    self._dequeue(coach_key, ticket)
+                    self._cond.notify_all()
+                raise
+
+    def settle(self, reserved, actual):
+        """Return unused reserved tokens once the real usage is known"""
+        if actual is None or actual >= reserved:
+            return
+        with self._cond:
+            self._token_tokens = min(self.tpm, self._token_tokens + reserved - actual)
+            self._cond.notify_all()
+
+    def metrics(self):
+        """Queue depth, admission counts and wait-time statistics"""
+        with self._cond:
+            waits = sorted(self._waits)
+            waiting_per_coach = {coach: len(queue) for coach, queue in self._queues.items()}
+            return {
+                "queue_depth": self._depth,
+                "max_queue_depth_seen": self._max_depth_seen,
+                "waiting_coaches": len(waiting_per_coach),
+                "waiting_per_coach": waiting_per_coach,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "wait_avg_seconds": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p95_seconds": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "wait_max_seconds": waits[-1] if waits else 0.0,
+                "request_tokens_available": self._request_tokens,
+                "tokens_available": self._token_tokens,
+            }
+
+
+_governor = ConcurrencyGovernor(
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_QUEUE_DEPTH, LLM_MAX_QUEUE_WAIT_SECONDS
+)
+
+def get_governor():
+    """Get the process-wide governor shared by every session"""
+    return _governor
+
+def estimate_request_tokens(kwargs):
+    """Estimate the tokens a completion request will consume (prompt + max output)"""
+    model = kwargs.get("model", "gpt-4o-mini")
+    prompt_tokens = 0
+    for message in kwargs.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            prompt_tokens += count_tokens(content, model)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    prompt_tokens += count_tokens(part.get("text", ""), model)
+                else:
+                    prompt_tokens += 1000  # Image parts; refunded on settle
+    return prompt_tokens + kwargs.get("max_tokens", 1000)
+
+def _usage_total(usage):
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+# ============================================================================
+# CIRCUIT BREAKER & LATENCY TRACKING
+# ============================================================================
+class CircuitBreaker:
+    """Opens after consecutive upstream failures; after a cooldown one trial call is let through"""
+
+    def __init__(self, failure_threshold, cooldown_seconds):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return "half_open"
+            return "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go upstream"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown_seconds or self._trial_in_flight:
+                raise CircuitOpenError("The AI service is temporarily unavailable.")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def cancel_trial(self):
+        """Release a half-open trial that ended without an upstream verdict"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Recent call latencies per model, used to pick the hedging delay"""
+
+    def __init__(self, window=200):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, model, seconds):
+        with self._lock:
+            self._samples[model].append(seconds)
+
+    def p95(self, model):
+        with self._lock:
+            samples = sorted(self._samples[model])
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95)]
+
+
+_breaker = CircuitBreaker(LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_COOLDOWN_SECONDS)
+_latencies = LatencyTracker()
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hoops-hedge")
+
+def get_circuit_breaker():
+    """Get the process-wide circuit breaker for the model API"""
+    return _breaker
+
+def is_retryable_error(error):
+    """True for rate limits, server errors, timeouts and connection failures"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUS_CODES or (status is not None and status >= 500)
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+# ============================================================================
+# SYNC PATH
+# ============================================================================
+def chat_completion(client, coach_id=None, deadline=None, hedge=False, telemetry=None, **kwargs):
+    """client.chat.completions.create through the governor and the resilience layer.
+
+    The whole call (queueing, retries, backoff) must finish within deadline
+    seconds; each attempt gets the remaining time as its request timeout.
+    429/5xx/timeouts are retried with jittered exponential backoff. With
+    hedge=True (non-streaming only) a second request is fired if the first
+    hasn't returned after the model's recent p95 latency, and whichever
+    returns first wins. Raises CircuitOpenError without calling upstream while
+    the breaker is open.
+
+    Streaming responses are wrapped so the reservation is settled from the
+    final usage chunk; retries only cover opening the stream.
+
+    Every call is recorded by telemetry.record_llm_call, labelled with the
+    telemetry dict ("purpose", "agent", "rule").
+    """
+    started = time.monotonic()
+    labels = dict(telemetry or {}, coach_id=coach_id)
+    model = kwargs.get("model")
+    try:
+        _breaker.before_call()
+    except CircuitOpenError:
+        record_llm_call(labels, model, started, None, outcome="circuit_open", attempts=0)
+        raise
+    deadline_at = started + (deadline or LLM_DEFAULT_DEADLINE_SECONDS)
+    hedge = hedge and LLM_HEDGING_ENABLED and not kwargs.get("stream")
+
+    attempt = 0
+    while True:
+        try:
+            if hedge:
+                response = _hedged_call(client, coach_id, deadline_at, kwargs)
+            else:
+                response = _single_call(client, coach_id, deadline_at, kwargs)
+            _breaker.record_success()
+            if kwargs.get("stream"):
+                return _recording_stream(response, labels, model, started, attempt + 1)
+            record_llm_call(
+                labels, model, started, time.monotonic() - started,
+                getattr(response, "usage", None), attempts=attempt + 1
+            )
+            return response
+        except Exception as e:
+            if not is_retryable_error(e):
+                _breaker.cancel_trial()
+                record_llm_call(labels, model, started, None, outcome="error", attempts=attempt + 1,
+                                stream=bool(kwargs.get("stream")), error=type(e).__name__)
+                raise
+            delay = backoff_delay(attempt)
+            attempt += 1
+            if attempt >= LLM_MAX_ATTEMPTS or time.monotonic() + delay >= deadline_at:
+                _breaker.record_failure()
+                record_llm_call(labels, model, started, None, outcome="error", attempts=attempt,
+                                stream=bool(kwargs.get("stream")), error=type(e).__name__)
+                raise
+            time.sleep(delay)
+
+def _single_call(client, coach_id, deadline_at, kwargs):
+    remaining = deadline_at - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Model call deadline exceeded")
+    reserved = _governor.acquire(coach_id, estimate_request_tokens(kwargs), timeout=remaining)
+
+    started = time.monotonic()
+    remaining = max(0.1, deadline_at - started)
+    response = client.chat.completions.create(timeout=remaining, **kwargs)
+    if kwargs.get("stream"):
+        return _settling_stream(response, reserved)
+
+    _latencies.record(kwargs.get("model"), time.monotonic() - started)
+    _governor.settle(reserved, _usage_total(getattr(response, "usage", None)))
+    return response
+
+def _hedged_call(client, coach_id, deadline_at, kwargs):
+    delay = _latencies.p95(kwargs.get("model")) or LLM_HEDGE_DEFAULT_DELAY_SECONDS
+    # Each request runs in a copy of the caller's context, so context-scoped state follows it
+    first = _hedge_executor.submit(contextvars.copy_context().run, _single_call, client, coach_id, deadline_at, kwargs)
+    done, _ = wait_futures([first], timeout=delay)
+    if done:
+        return first.result()
+
+    second = _hedge_executor.submit(contextvars.copy_context().run, _single_call, client, coach_id, deadline_at, kwargs)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+def _settling_stream(stream, reserved):
+    try:
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                _governor.settle(reserved, _usage_total(usage))
+            yield chunk
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            close()  # Release the HTTP connection when the consumer stops early
+
+def _recording_stream(stream, labels, model, started, attempts):
+    """Pass chunks through, then record TTFB (first content), latency and usage"""
+    ttfb = None
+    usage = None
+    outcome, error = "ok", None
+    try:
+        for chunk in stream:
+            if ttfb is None and chunk.choices and chunk.choices[0].delta.content:
+                ttfb = time.monotonic() - started
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            yield chunk
+    except GeneratorExit:
+        outcome = "closed"  # Consumer stopped early (e.g. single-shot redirect)
+        raise
+    except Exception as e:
+        outcome, error = "error", type(e).__name__
+        raise
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+        record_llm_call(labels, model, started, ttfb, usage, outcome, attempts, stream=True, error=error)
+
+# ============================================================================
+# ASYNC PATH
+# ============================================================================
+_loop = None
+_loop_lock = threading.Lock()
+
+def get_event_loop():
+    """Get the process-wide event loop (running in a daemon thread) for async model calls"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="hoops-llm-loop", daemon=True).start()
+        return _loop
+
+def submit_async(coro):
+    """Schedule a coroutine on the shared loop; returns a concurrent.futures.Future.
+
+    The coroutine runs in a copy of the caller's context, so context-scoped
+    state (like a fake client's meter) follows it.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+def run_async(coro):
+    """Run a coroutine on the shared loop and wait for its result (callable from any thread)"""
+    return submit_async(coro).result()
+
+async def achat_completion(async_client, coach_id=None, deadline=None, telemetry=None, **kwargs):
+    """AsyncOpenAI chat.completions.create through the governor, with deadline and retries (non-streaming)"""
+    started = time.monotonic()
+    labels = dict(telemetry or {}, coach_id=coach_id)
+    model = kwargs.get("model")
+    try:
+        _breaker.before_call()
+    except CircuitOpenError:
+        record_llm_call(labels, model, started, None, outcome="circuit_open", attempts=0)
+        raise
+    deadline_at = started + (deadline or LLM_DEFAULT_DEADLINE_SECONDS)
+
+    attempt = 0
+    while True:
+        try:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Model call deadline exceeded")
+            reserved = await asyncio.to_thread(
+                _governor.acquire, coach_id, estimate_request_tokens(kwargs), remaining
+            )
+            call_started = time.monotonic()
+            response = await async_client.chat.completions.create(
+                timeout=max(0.1, deadline_at - call_started), **kwargs
+            )
+            _latencies.record(kwargs.get("model"), time.monotonic() - call_started)
+            _governor.settle(reserved, _usage_total(getattr(response, "usage", None)))
+            _breaker.record_success()
+            record_llm_call(
+                labels, model, started, time.monotonic() - started,
+                getattr(response, "usage", None), attempts=attempt + 1
+            )
+            return response
+        except Exception as e:
+            if not is_retryable_error(e):
+                _breaker.cancel_trial()
+                record_llm_call(labels, model, started, None, outcome="error", attempts=attempt + 1,
+                                error=type(e).__name__)
+                raise
+            delay = backoff_delay(attempt)
+            attempt += 1
+            if attempt >= LLM_MAX_ATTEMPTS or time.monotonic() + delay >= deadline_at:
+                _breaker.record_failure()
+                record_llm_call(labels, model, started, None, outcome="error", attempts=attempt,
+                                error=type(e).__name__)
+                raise
+            await asyncio.sleep(delay)
+
+
+class ThreadedAsyncClient:
+    """AsyncOpenAI-shaped wrapper that runs a sync client's calls in worker threads.
+
+    For clients with no async counterpart (the cassette proxies), so their
+    calls still go through achat_completion.
+    """
+
+    def __init__(self, client):
+        self.sync = client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        return await asyncio.to_thread(self.sync.chat.completions.create, **kwargs)
@@ -10,7 +10,8 @@ import calendar
 
 from config import EVENT_TYPES, FACILITY_TYPES, PLAYER_POSITIONS
 from utils import (
-    get_events, get_events_for_month, get_event_by_id, create_event, update_event, delete_event,
+    get_events, get_events_for_month, get_event_by_id, create_event, create_events_bulk, build_weekly_events,
+    update_event, delete_event,
     get_facilities, get_facility_by_id, create_facility, update_facility, delete_facility,
     get_players, get_player_by_id, create_player, update_player, delete_player
 )
@@ -223,7 +224,7 @@ def render_event_form(supabase, coach_id, event_id=None):
             event_date = st.date_input("Start Date", value=default_date)
         
         with col2:
-            facilities = get_facilities(supabase, coach_id)
+            facilities = get_facilities(supabase, coach_id, "facility_options")
             facility_options = ["None"] + [f['name'] for f in facilities]
             facility_ids = [None] + [f['id'] for f in facilities]
             
@@ -306,19 +307,16 @@ def render_event_form(supabase, coach_id, event_id=None):
                 update_event(supabase, event_id, data)
                 st.success("Event updated!")
             else:
-                # Handle recurring events
+                # Handle recurring events (one bulk insert, all-or-nothing)
                 if is_recurring and recurring_end_date:
-                    events_created = 0
-                    current_date = event_date
+                    occurrences = build_weekly_events(data, event_date, recurring_end_date)
+                    with st.spinner(f"Creating {len(occurrences)} events..."):
+                        created, error = create_events_bulk(supabase, coach_id, occurrences)
                     
-                    while current_date <= recurring_end_date:
-                        event_data = data.copy()
-                        event_data["event_date"] = current_date.isoformat()
-                        create_event(supabase, coach_id, event_data)
-                        events_created += 1
-                        current_date += timedelta(weeks=1)
-                    
-                    st.success(f"✅ Created {events_created} recurring events!")
+                    if error:
+                        st.error(f"❌ Could not create the recurring events (none were saved): {error}")
+                        return
+                    st.success(f"✅ Created {len(created)} recurring events!")
                 else:
                     create_event(supabase, coach_id, data)
                     st.success("Event created!")
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Message History
+The loaded window of a conversation's messages, opened at the newest page and paged back on demand
+"""
+
+from config import HISTORY_PAGE_SIZE
+from utils import get_messages_page, count_conversation_messages, message_cursor, message_from_row
+
+# ============================================================================
+# HISTORY
+# ============================================================================
+class MessageHistory(list):
+    """The newest messages of a conversation, oldest first, with a cursor to older pages.
+
+    offset is how many saved messages come before the first loaded one, so
+    positions counted from the start of the conversation (a summary's
+    "covered") can be mapped onto the window. Everywhere else it is the plain
+    chat history list route_question, get_agent_response and the summarizer
+    already take.
+    """
+
+    def __init__(self, messages=(), conversation_id=None, offset=0, has_more=False):
+        super().__init__(messages)
+        self.conversation_id = conversation_id
+        self.offset = offset
+        self.has_more = has_more
+
+    @property
+    def total(self):
+        """Messages in the conversation, loaded or not"""
+        return self.offset + len(self)
+
+    def cursor(self):
+        """Keyset cursor of the oldest loaded saved message"""
+        return next((cursor for cursor in map(message_cursor, self) if cursor), None)
+
+    def load_older(self, supabase, limit=HISTORY_PAGE_SIZE):
+        """Prepend the next older page; returns how many messages were added"""
+        cursor = self.cursor()
+        if not self.has_more or self.conversation_id is None or cursor is None:
+            self.has_more = False
+            return 0
+        rows, self.has_more = get_messages_page(supabase, self.conversation_id, cursor, limit)
+        self[:0] = [message_from_row(row) for row in rows]
+        self.offset = max(self.offset - len(rows), 0)
+        return len(rows)
+
+    def copy(self):
+        return MessageHistory(self, self.conversation_id, self.offset, self.has_more)
+
+    def __add__(self, other):
+        history = self.copy()
+        history.extend(other)
+        return history
+
+
+def open_history(supabase, conversation_id, limit=HISTORY_PAGE_SIZE):
+    """Load the newest page of a conversation (plus messages still queued for saving)"""
+    rows, has_more = get_messages_page(supabase, conversation_id, None, limit)
+    saved = sum(1 for row in rows if row.get("id") is not None)
+    total = count_conversation_messages(supabase, conversation_id) if has_more else saved
+    return MessageHistory(
+        [message_from_row(row) for row in rows], conversation_id,
+        max((total or saved) - saved, 0), has_more
+    )
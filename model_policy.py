@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Model Policy
+Rule-based choice of model, max_tokens and temperature, with fallback chains
+"""
+
+import json
+import os
+import re
+import threading
+
+from config import MODEL_POLICY, MODEL_POLICY_PATH
+from prompt_budget import count_tokens
+from llm import chat_completion, achat_completion, is_retryable_error
+
+# Questions that want a lookup vs. a full write-up
+SHORT_ANSWER_PATTERN = re.compile(
+    r"\b(when|where|who|what time|which day|phone|address|how many)\b|מתי|איפה|מי |באיזה|טלפון|כתובת|כמה",
+    re.IGNORECASE
+)
+LONG_ANSWER_PATTERN = re.compile(
+    r"\b(plan|program|breakdown|break down|explain|analy[sz]e|analysis|step by step|detailed|in depth|full)\b"
+    r"|תוכנית|תכנית|הסבר|תסביר|נתח|ניתוח|מפורט|לעומק|שלב אחר שלב",
+    re.IGNORECASE
+)
+SHORT_QUESTION_TOKENS = 30
+LONG_QUESTION_TOKENS = 150
+
+CONDITION_FEATURES = {"agents": "agent"}
+
+DEFAULT_SETTINGS = {"name": "builtin", "model": "gpt-4o-mini", "max_tokens": 1500, "temperature": 0.7, "fallbacks": []}
+
+_file_rules = {"mtime": None, "rules": None}
+_lock = threading.Lock()
+
+# ============================================================================
+# RULES
+# ============================================================================
+def get_policy_rules():
+    """Get the active rules: MODEL_POLICY_PATH if it exists, else config.MODEL_POLICY"""
+    try:
+        mtime = os.path.getmtime(MODEL_POLICY_PATH)
+    except OSError:
+        return MODEL_POLICY
+
+    with _lock:
+        if _file_rules["mtime"] != mtime:
+            try:
+                with open(MODEL_POLICY_PATH, encoding="utf-8") as f:
+                    rules = json.load(f)
+                if not isinstance(rules, list):
+                    raise ValueError("model policy must be a list of rules")
+                _file_rules["rules"] = rules
+            except (OSError, ValueError) as e:
+                print(f"Error loading model policy: {e}")
+                _file_rules["rules"] = None
+            _file_rules["mtime"] = mtime
+        return _file_rules["rules"] or MODEL_POLICY
+
+def _matches(when, features):
+    """Check a rule's conditions against request features"""
+    for key, expected in when.items():
+        if key == "min_prompt_tokens":
+            if features["prompt_tokens"] < expected:
+                return False
+        elif key == "max_prompt_tokens":
+            if features["prompt_tokens"] > expected:
+                return False
+        elif features.get(CONDITION_FEATURES.get(key, key)) not in expected:
+            return False
+    return True
+
+# ============================================================================
+# SELECTION
+# ============================================================================
+def estimate_answer_length(question, prompt_tokens):
+    """Guess whether a question wants a short, medium or long answer"""
+    if LONG_ANSWER_PATTERN.search(question) or prompt_tokens > LONG_QUESTION_TOKENS:
+        return "long"
+    if prompt_tokens <= SHORT_QUESTION_TOKENS and SHORT_ANSWER_PATTERN.search(question):
+        return "short"
+    return "medium"
+
+def request_features(purpose, agent=None, question="", image_data=None):
+    """Describe a model request for rule matching"""
+    prompt_tokens = count_tokens(question)
+    if image_data:
+        attachment = "image"
+    elif prompt_tokens > LONG_QUESTION_TOKENS and "\n" in question:
+        attachment = "data"  # Uploaded file contents inlined by build_analysis_prompt
+    else:
+        attachment = "none"
+    return {
+        "purpose": purpose,
+        "agent": agent.value if agent is not None else None,
+        "attachment": attachment,
+        "prompt_tokens": prompt_tokens,
+        "answer_length": estimate_answer_length(question, prompt_tokens),
+    }
+
+def select_model_settings(purpose, agent=None, question="", image_data=None):
+    """Return {"name", "model", "max_tokens", "temperature", "fallbacks"} for a request"""
+    features = request_features(purpose, agent, question, image_data)
+    for rule in get_policy_rules():
+        if _matches(rule.get("when", {}), features):
+            settings = dict(DEFAULT_SETTINGS)
+            settings.update({k: v for k, v in rule.items() if k != "when"})
+            return settings
+    return dict(DEFAULT_SETTINGS)
+
+# ============================================================================
+# CALLING
+# ============================================================================
+def policy_completion(client, coach_id, settings, **kwargs):
+    """chat_completion with the policy's model, max_tokens and temperature.
+
+    If the model fails after its retries (or is unknown/unavailable), each of
+    the settings' fallback models is tried in turn. CircuitOpenError and
+    GovernorBusyError are raised straight away.
+    """
+    models = _policy_models(settings, kwargs)
+    for index, model in enumerate(models):
+        try:
+            return chat_completion(client, coach_id, model=model, **kwargs)
+        except Exception as e:
+            _check_fallback(e, models, index)
+
+async def apolicy_completion(async_client, coach_id, settings, **kwargs):
+    """policy_completion on the async path (achat_completion, non-streaming)"""
+    models = _policy_models(settings, kwargs)
+    for index, model in enumerate(models):
+        try:
+            return await achat_completion(async_client, coach_id, model=model, **kwargs)
+        except Exception as e:
+            _check_fallback(e, models, index)
+
+def _policy_models(settings, kwargs):
+    """Apply the settings to kwargs in place; returns the model chain to try"""
+    kwargs["telemetry"] = dict(kwargs.get("telemetry") or {}, rule=settings.get("name"))
+    kwargs.setdefault("max_tokens", settings["max_tokens"])
+    kwargs.setdefault("temperature", settings["temperature"])
+    return [settings["model"]] + list(settings.get("fallbacks") or [])
+
+def _check_fallback(error, models, index):
+    """Re-raise error unless the next model in the chain should be tried"""
+    status = getattr(error, "status_code", None)
+    can_fall_back = is_retryable_error(error) or status in (403, 404)
+    if index == len(models) - 1 or not can_fall_back:
+        raise error
+    print(f"Model {models[index]} failed ({error}), falling back to {models[index + 1]}")
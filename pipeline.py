@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Chat Turn Pipeline
+Runs routing and context assembly concurrently for a chat turn
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from config import (
+    Agent, AGENT_INFO, TURN_PIPELINE_WORKERS, SINGLE_SHOT_REDIRECT_AGENTS, CONSULT_MAX_CONCURRENCY,
+    ANALYST_STATS_ENABLED
+)
+from prompts import CONSULT_FOCUS_TEMPLATE
+from model_policy import policy_completion
+from llm import run_async, submit_async
+from utils import (
+    route_question_with_info, get_coach_memories, get_agent_documents,
+    get_upcoming_events, get_facilities, get_players,
+    build_single_shot_messages, split_single_shot_header,
+    get_agents_with_documents, stream_agent_response, aget_agent_response,
+    record_prompt_cache_usage, format_response, aextract_analyst_stats, get_async_client
+)
+from analytics_viz import text_has_stats
+
+# Shared by all sessions; every task here is a blocking network call
+_executor = ThreadPoolExecutor(max_workers=TURN_PIPELINE_WORKERS, thread_name_prefix="hoops-turn")
+
+# ============================================================================
+# TURN PREPARATION
+# ============================================================================
+def prepare_turn(question, client, chat_history=None, coach_profile=None, supabase=None, allow_llm=True, include_memories=True, multi=False):
+    """Route a question and assemble its agent context with overlapping network calls.
+
+    The router call and the agent-independent fetches (coach memories) start
+    together; the agent-specific fetches (documents, logistics) start as soon
+    as routing finishes. Returns (agent, context) where context is the dict
+    accepted by get_agent_response / stream_agent_response, plus the
+    "routing" info from route_question_with_info.
+
+    With allow_llm=False an ambiguous question comes back as (None, context)
+    carrying only the agent-independent data, ready for open_single_shot_stream.
+    include_memories=False skips the coach memories for generic questions.
+    multi=True lets the router pick several agents (context["routing"]["agents"])
+    for run_consult; the returned context belongs to the first of them.
+    """
+    coach_id = coach_profile.get('id') if coach_profile else None
+
+    route_future = _executor.submit(route_question_with_info, question, client, chat_history, allow_llm, coach_id, multi)
+    memories_future = None
+    if supabase and coach_id and include_memories:
+        memories_future = _executor.submit(get_coach_memories, supabase, coach_id, 10)
+
+    agent, routing = route_future.result()
+
+    context = {"documents": [], "logistics": None}
+    if agent is not None:
+        context = fetch_agent_specific_context(agent, coach_id, supabase)
+    context["memories"] = memories_future.result() if memories_future else []
+    context["routing"] = routing
+    return agent, context
+
+def fetch_agent_specific_context(agent, coach_id, supabase):
+    """Fetch an agent's documents and (Team Manager only) logistics in parallel"""
+    if not supabase:
+        return {"documents": [], "logistics": None}
+
+    documents_future = _executor.submit(get_agent_documents, supabase, agent.value)
+    logistics_futures = None
+    if agent == Agent.TEAM_MANAGER and coach_id:
+        logistics_futures = (
+            _executor.submit(get_upcoming_events, supabase, coach_id),
+            _executor.submit(get_facilities, supabase, coach_id, "facility_context"),
+            _executor.submit(get_players, supabase, coach_id, True, "player_context"),
+        )
+
+    return {
+        "documents": documents_future.result(),
+        "logistics": tuple(f.result() for f in logistics_futures) if logistics_futures else None,
+    }
+
+# ============================================================================
+# CONSULT MODE
+# ============================================================================
+def run_consult(question, agents, chat_history, client, coach_profile=None, supabase=None, image_data=None, context=None):
+    """Ask several agents the same question concurrently.
+
+    Each agent is told which colleagues cover the rest of the question. The
+    agent calls run on llm's shared event loop, at most CONSULT_MAX_CONCURRENCY
+    at once. context is the one prepare_turn built for agents[0]; the others
+    reuse its memories and fetch their own documents/logistics. Returns
+    [(agent, answer)] in agents order.
+    """
+    context = context if context is not None else {"memories": []}
+    coach_id = coach_profile.get('id') if coach_profile else None
+    async_client = get_async_client(client)
+
+    async def consult(agent, slots):
+        async with slots:
+            if agent == agents[0]:
+                agent_context = context
+            else:
+                agent_context = await asyncio.to_thread(fetch_agent_specific_context, agent, coach_id, supabase)
+                agent_context["memories"] = context.get("memories", [])
+                agent_context["summary"] = context.get("summary")
+            others = ", ".join(AGENT_INFO[a]["name"] for a in agents if a != agent)
+            focused = CONSULT_FOCUS_TEMPLATE.format(question=question, others=others)
+            return await aget_agent_response(
+                focused, agent, chat_history, async_client, coach_profile, supabase, image_data, agent_context
+            )
+
+    async def consult_all():
+        slots = asyncio.Semaphore(CONSULT_MAX_CONCURRENCY)
+        return await asyncio.gather(*(consult(agent, slots) for agent in agents))
+
+    return list(zip(agents, run_async(consult_all())))
+
+def merge_consult_answers(answers):
+    """Combine consult answers into (raw_text, formatted) with one badge per agent.
+
+    Failed sections are left out unless every agent failed.
+    """
+    answered = [(agent, text) for agent, text in answers if text and not text.startswith("Error:")]
+    answered = answered or answers
+    raw = "\n\n".join(f"[{AGENT_INFO[agent]['name']}]\n{text}" for agent, text in answered)
+    formatted = "\n\n---\n\n".join(format_response(text, agent) for agent, text in answered)
+    return raw, formatted
+
+# ============================================================================
+# ANALYST STATS
+# ============================================================================
+def start_stats_extraction(question, agents, client, coach_profile=None, image_data=None):
+    """Start extracting structured stats next to the answer when THE ANALYST is answering
+    a question that carries stats (stat names next to numbers, a box score, or an image).
+
+    Returns a future of the stats payload (or None), or None when no
+    extraction was started.
+    """
+    if not ANALYST_STATS_ENABLED or Agent.ANALYST not in agents:
+        return None
+    if image_data is None and not text_has_stats(question):
+        return None
+    return submit_async(aextract_analyst_stats(question, get_async_client(client), coach_profile, image_data))
+
+def resolve_analyst_stats(stats_future):
+    """The stats payload of a turn, or None when no extraction was started"""
+    if stats_future is None:
+        return None
+    return stats_future.result()
+
+# ============================================================================
+# SINGLE-SHOT MODE
+# ============================================================================
+def open_single_shot_stream(question, chat_history, client, coach_profile=None, supabase=None, image_data=None, context=None):
+    """Pick the agent and answer in one completion.
+
+    Reads the stream until the "AGENT: <NAME>" header is complete and returns
+    (agent, deltas) where deltas yields the rest of the answer. Agents whose
+    answers depend on agent-specific data (SINGLE_SHOT_REDIRECT_AGENTS, or any
+    agent with knowledge documents) are redirected to a regular agent call
+    before any text is shown. context["routing"] is updated in place.
+    """
+    context = context if context is not None else {"memories": []}
+    coach_id = coach_profile.get('id') if coach_profile else None
+    routing = context.setdefault("routing", {})
+    routing["path"] = "single_shot"
+
+    documents_future = _executor.submit(get_agents_with_documents, supabase) if supabase else None
+
+    try:
+        messages, model = build_single_shot_messages(question, chat_history, coach_profile, image_data, context)
+        stream = policy_completion(
+            client, coach_id, context["model_settings"],
+            telemetry={"purpose": "single_shot"},
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        chunks = iter(stream)
+
+        buffer = ""
+        parsed = None
+        for chunk in chunks:
+            if getattr(chunk, "usage", None):
+                record_prompt_cache_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                buffer += chunk.choices[0].delta.content
+                parsed = split_single_shot_header(buffer)
+                if parsed:
+                    break
+        agent, first_text = parsed or (Agent.ASSISTANT_COACH, buffer)
+    except Exception:
+        agent, chunks, first_text = Agent.ASSISTANT_COACH, None, None
+        routing["path"] = "fallback"
+
+    agents_with_documents = documents_future.result() if documents_future else set()
+    if chunks is None or agent in SINGLE_SHOT_REDIRECT_AGENTS or agent.value in agents_with_documents:
+        if chunks is not None:
+            routing["path"] = "single_shot_redirect"
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        context.update(fetch_agent_specific_context(agent, coach_id, supabase))
+        return agent, stream_agent_response(
+            question, agent, chat_history, client, coach_profile, supabase, image_data, context
+        )
+
+    def deltas():
+        # Skip the blank line(s) between the header and the answer
+        started = False
+        try:
+            for text in chain([first_text or ""], _content_deltas(chunks)):
+                if not started:
+                    text = text.lstrip("\n")
+                    started = bool(text)
+                if text:
+                    yield text
+        except Exception as e:
+            yield f"Error: {str(e)}"
+
+    return agent, deltas()
+
+def _content_deltas(chunks):
+    """Yield the text content of streamed completion chunks"""
+    for chunk in chunks:
+        if getattr(chunk, "usage", None):
+            record_prompt_cache_usage(chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Column Projections
+Per-view select lists, and a guard that reports reads of columns a view did not select
+"""
+
+import threading
+from functools import lru_cache
+
+from config import PROJECTIONS, PROJECTION_GUARD_ENABLED, PROJECTION_OPTIONAL_COLUMNS
+
+_reported = set()
+_reported_lock = threading.Lock()
+_missing_optional = set()  # Views whose optional columns the database doesn't have
+
+# ============================================================================
+# PROJECTIONS
+# ============================================================================
+def select_columns(view):
+    """The select() list of a view (without its optional columns once the database lacked them)"""
+    if view not in _missing_optional:
+        return PROJECTIONS[view]
+    optional = PROJECTION_OPTIONAL_COLUMNS[view]
+    return ", ".join(c.strip() for c in PROJECTIONS[view].split(",") if c.strip() not in optional)
+
+def is_missing_column_error(error):
+    """PostgREST/Postgres error for a selected column that doesn't exist"""
+    text = str(error)
+    return "42703" in text or "PGRST204" in text or ("column" in text and "does not exist" in text)
+
+def select_projected(view, run):
+    """Return run(columns) for a view's select list.
+
+    If the database lacks one of the view's optional columns, the view is
+    selected without them from then on (reads of them return None).
+    """
+    try:
+        return run(select_columns(view))
+    except Exception as e:
+        if view in _missing_optional or view not in PROJECTION_OPTIONAL_COLUMNS or not is_missing_column_error(e):
+            raise
+        _missing_optional.add(view)
+        print(f"Selecting {view} without {PROJECTION_OPTIONAL_COLUMNS[view]}: {e}")
+        return run(select_columns(view))
+
+@lru_cache(maxsize=None)
+def projected_columns(view):
+    """Top-level column names a view selects (an embed like facilities(name) counts as "facilities")"""
+    columns = set()
+    depth = 0
+    name = ""
+    for char in PROJECTIONS[view] + ",":
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            columns.add(name.strip().split(":")[0].strip())
+            name = ""
+        elif depth == 0:
+            name += char
+    return columns
+
+# ============================================================================
+# GUARD
+# ============================================================================
+class ProjectedRow(dict):
+    """A row selected for a view; reading a column outside the view's projection is reported once"""
+
+    def __init__(self, row, view):
+        super().__init__(row)
+        self.view = view
+        self.columns = projected_columns(view)
+
+    def _check(self, key):
+        if key in self.columns or (self.view, key) in _reported:
+            return
+        with _reported_lock:
+            _reported.add((self.view, key))
+        print(f"Column '{key}' read from a {self.view} row, which only selects: {PROJECTIONS[self.view]}")
+
+    def __getitem__(self, key):
+        self._check(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._check(key)
+        return super().get(key, default)
+
+def project_rows(rows, view):
+    """Wrap a view's rows in the guard (plain rows when it is disabled)"""
+    if not PROJECTION_GUARD_ENABLED:
+        return rows
+    return [ProjectedRow(row, view) for row in rows]
+
+def project_row(row, view):
+    """Wrap one row (or None) in the guard"""
+    if row is None:
+        return None
+    return project_rows([row], view)[0]
+
+def get_projection_warnings():
+    """(view, column) pairs read outside their projection so far"""
+    with _reported_lock:
+        return sorted(_reported)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Prompt Budget
+Token counting and budgeted system prompt assembly with priority trimming
+"""
+
+from config import PROMPT_TOKEN_BUDGETS, DEFAULT_PROMPT_TOKEN_BUDGET
+
+try:
+    import tiktoken
+except ImportError:  # Optional - fall back to a conservative character estimate
+    tiktoken = None
+
+_encodings = {}
+
+# ============================================================================
+# TOKEN COUNTING
+# ============================================================================
+def _get_encoding(model):
+    """Get (and memoize) the tiktoken encoding for a model"""
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """Count tokens in text for a model (estimated when tiktoken is unavailable)"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        # Hebrew and punctuation-heavy text averages well under 4 chars/token
+        return len(text) // 3 + 1
+    return len(_get_encoding(model).encode(text))
+
+def get_prompt_budget(model):
+    """Get the system prompt token budget for a model"""
+    return PROMPT_TOKEN_BUDGETS.get(model, DEFAULT_PROMPT_TOKEN_BUDGET)
+
+# ============================================================================
+# ASSEMBLY
+# ============================================================================
+def assemble_system_prompt(parts, model, budget=None):
+    """Assemble a system prompt within a token budget.
+
+    parts is an ordered list of (name, content) where content is either a
+    fixed string or a trimmable section dict:
+        {"items": [...], "render": fn(items) -> str, "trim_rank": int,
+         "describe": fn(item) -> str}
+    render must accept an empty list. Items are dropped from the END of each
+    section's list. Sections are trimmed in "trim_rank" order (lowest first)
+    until the prompt fits; fixed strings are never trimmed.
+
+    Returns (prompt, report) where report has the token count, the budget and
+    the descriptions of what was dropped per section.
+    """
+    budget = budget or get_prompt_budget(model)
+
+    fixed_tokens = 0
+    sections = {}
+    for name, content in parts:
+        if isinstance(content, dict):
+            items = list(content["items"])
+            sections[name] = {
+                "items": items,
+                "render": content["render"],
+                "trim_rank": content.get("trim_rank", 0),
+                "describe": content.get("describe", str),
+                "dropped": [],
+                "tokens": count_tokens(content["render"](items), model),
+            }
+        else:
+            fixed_tokens += count_tokens(content, model)
+
+    def total():
+        return fixed_tokens + sum(s["tokens"] for s in sections.values())
+
+    for section in sorted(sections.values(), key=lambda s: s["trim_rank"]):
+        while total() > budget and section["items"]:
+            section["dropped"].insert(0, section["describe"](section["items"].pop()))
+            section["tokens"] = count_tokens(section["render"](section["items"]), model)
+
+    prompt = ""
+    for name, content in parts:
+        if name in sections:
+            prompt += sections[name]["render"](sections[name]["items"])
+        else:
+            prompt += content
+
+    report = {
+        "model": model,
+        "budget": budget,
+        "tokens": total(),
+        "over_budget": total() > budget,
+        "dropped": {name: s["dropped"] for name, s in sections.items() if s["dropped"]},
+    }
+    return prompt, report
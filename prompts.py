@@ -4,7 +4,10 @@ HOOPS AI - System Prompts
 All agent system prompts and prompt templates
 """
 
-from config import Agent
+from config import Agent, ROUTER_AGENT_LIST
+
+# Bump whenever any prompt below changes - part of the answer cache key
+PROMPT_TEMPLATE_VERSION = 5
 
 # ============================================================================
 # BASE SYSTEM PROMPTS
@@ -324,11 +327,11 @@ IMPORTANT:
 # ============================================================================
 # PROMPT BUILDER
 # ============================================================================
+# Profile rules depend only on age group and level, so the block can sit in
+# the static (provider-cacheable) prefix; the coach's identity goes at the end
 COACH_PROFILE_TEMPLATE = """
 
 === COACH PROFILE - CRITICAL CONTEXT ===
-Coach: {name}
-Team: {team_name}
 Age Group: {age_group}
 Level: {level}
 
@@ -357,6 +360,13 @@ You MUST adapt ALL your responses to this coach's specific context:
 REMEMBER: Every drill, play, nutrition advice, mental coaching - EVERYTHING must be appropriate for {age_group} {level} players!
 """
 
+COACH_IDENTITY_TEMPLATE = """
+
+=== THIS COACH ===
+Coach: {name}
+Team: {team_name}
+"""
+
 RESPONSE_RULES = """
 
 CRITICAL RULES FOR ALL RESPONSES:
@@ -402,4 +412,114 @@ Extract ALL statistics and data visible in the image, then provide:
 2. Key insights
 3. Strengths identified  
 4. Areas for improvement
-5. Specific actionable recommendations"""
\ No newline at end of file
+5. Specific actionable recommendations"""
+# ============================================================================
+# SINGLE-SHOT PROMPTS (agent selection + answer in one completion)
+# ============================================================================
+SINGLE_SHOT_HEADER = f"""You are the HOOPS AI coaching staff. Each question is answered by exactly ONE specialist.
+
+STEP 1 - Pick the specialist:
+{ROUTER_AGENT_LIST}
+
+IMPORTANT DISTINCTIONS:
+- "How to run a practice" → ASSISTANT_COACH (not TACTICIAN)
+- "How to manage players" → ASSISTANT_COACH (not TACTICIAN)
+- "Season planning" → ASSISTANT_COACH
+- "How to beat zone defense" → TACTICIAN
+- "Pick and roll coverage" → TACTICIAN
+- If the coach is answering a question the previous specialist asked → STAY with that specialist
+
+STEP 2 - Answer AS that specialist, staying within their area above.
+
+OUTPUT FORMAT (mandatory):
+The FIRST line must be exactly "AGENT: <NAME>" using one of the names above.
+Then a blank line, then your answer."""
+
+# ============================================================================
+# CONSULT MODE
+# ============================================================================
+CONSULT_FOCUS_TEMPLATE = """{question}
+
+(You are answering as part of a staff consult. {others} will cover their own specialties. Answer ONLY the part of this question within your specialty, concisely, without repeating what they will cover.)"""
+
+# ============================================================================
+# CONVERSATION SUMMARY
+# ============================================================================
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a basketball coach and their AI coaching staff.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW TURNS:
+{turns}
+
+Rewrite the summary to include the new turns. Keep facts the staff will need later: player names and numbers, ages, measurements, stats, decisions, plans and open questions. Drop greetings and generic advice. Write in the language the coach uses, at most {max_words} words."""
+
+CONVERSATION_SUMMARY_TEMPLATE = """=== EARLIER IN THIS CONVERSATION ===
+{summary}"""
+
+TITLE_BATCH_PROMPT = """Write a short title (at most 6 words, in the language of the question) for each of these basketball coaching conversations.
+
+{items}
+
+Return JSON: {{"titles": ["title for 1", "title for 2", ...]}} with exactly {count} conversation titles, in order."""
+
+# ============================================================================
+# STRUCTURED STATS (THE ANALYST)
+# ============================================================================
+STATS_EXTRACTION_PROMPT = """You extract basketball statistics for charts. Read the coach's message (and any attached box score or stat sheet) and list every player with their stat lines.
+
+Rules:
+- One entry per player; one line per game, in chronological order. Use "Season" or "Average" as the label for season or per-game averages.
+- Copy only numbers that are given or directly implied (e.g. 7/15 FG = 7 made, 15 attempted). Use null for anything missing; never estimate.
+- Use the player's name as written, or "Player" if no name is given.
+- Return {"players": []} if the message contains no player statistics."""
+
+_STAT_FIELDS = (
+    "points", "rebounds", "assists", "steals", "blocks", "turnovers", "minutes",
+    "fg_made", "fg_attempted", "three_made", "three_attempted", "ft_made", "ft_attempted",
+)
+
+STATS_SCHEMA = {
+    "name": "analyst_stats",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "required": ["players"],
+        "properties": {
+            "players": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": ["name", "games"],
+                    "properties": {
+                        "name": {"type": "string"},
+                        "games": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "additionalProperties": False,
+                                "required": ["label"] + list(_STAT_FIELDS),
+                                "properties": dict(
+                                    {"label": {"type": "string"}},
+                                    **{field: {"type": ["number", "null"]} for field in _STAT_FIELDS}
+                                ),
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+# ============================================================================
+# DEGRADED MODE
+# ============================================================================
+DEGRADED_RESPONSE = """⚠️ The coaching staff is temporarily unreachable, so I can't give you a full answer right now.
+
+Please try again in a minute. Your question was saved in this conversation.
+
+⚠️ צוות האימון אינו זמין כרגע. נסה שוב בעוד דקה."""
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Router Training Corpus
+Labeled Hebrew and English questions for the local routing classifier
+"""
+
+from config import Agent
+
+# ============================================================================
+# LABELED QUESTIONS
+# ============================================================================
+ROUTER_CORPUS = {
+    Agent.TACTICIAN: [
+        "How to beat zone defense",
+        "How to attack a 2-3 zone defense?",
+        "How to set up a 2-3 zone defense?",
+        "Pick and roll coverage",
+        "Show me different pick and roll variations.",
+        "Offensive sets",
+        "Explain motion offense basics and give me 3 simple actions.",
+        "Key principles of man-to-man defense.",
+        "How to break full-court press?",
+        "Design an ATO play for the last possession",
+        "Give me a BLOB play against man defense",
+        "SLOB set to get a quick three",
+        "How should we defend a high pick and roll, ice or hedge?",
+        "What is the best spacing for a 5-out offense?",
+        "How do I run a 1-3-1 zone trap?",
+        "Our opponent runs a lot of flex offense, how do we stop it?",
+        "Transition defense principles after a missed shot",
+        "End of game play when we are down by two",
+        "How to run a secondary break",
+        "Match-up zone rotations",
+        "4 out 1 in motion offense actions",
+        "How to attack a box and one",
+        "איך לתקוף הגנת אזור 2-3?",
+        "איך שוברים לחץ על כל המגרש?",
+        "תן לי מהלך לסיום משחק כשאנחנו בפיגור",
+        "איך להגן על פיק אנד רול?",
+        "עקרונות הגנה אישית",
+        "תרגיל התקפה נגד הגנה אזורית",
+        "מערך התקפה 5 בחוץ",
+        "איך לעצור קבוצה שזורקת הרבה לשלוש?",
+        "מהלך חוץ מהצד אחרי פסק זמן",
+        "איך להתמודד עם הגנת לחץ?",
+        "איזו הגנה לשחק נגד קבוצה עם סנטר גבוה?",
+        "מעבר מהגנה להתקפה, מתפרצת מסודרת",
+    ],
+    Agent.SKILLS_COACH: [
+        "How can my player improve his shooting form?",
+        "Drills to improve ball handling",
+        "Best footwork drills for post players",
+        "How to teach a jump stop and pivot",
+        "My point guard needs a better left hand, what drills?",
+        "Free throw routine for teenagers",
+        "How to teach the euro step",
+        "Finishing drills around the rim",
+        "Shooting drills for a 15 year old",
+        "How to fix a player who shoots with his elbow out",
+        "Individual workout for a shooting guard",
+        "Passing drills for high school players",
+        "Drills for catch and shoot",
+        "How to improve a player's crossover",
+        "Layup drills with the weak hand",
+        "תרגילי כדרור לשחקנים בני 15",
+        "איך לשפר את טכניקת הזריקה?",
+        "תרגילי עבודת רגליים לשחקני פנים",
+        "איך ללמד זריקת עונשין נכונה?",
+        "תרגילים לשיפור יד חלשה",
+        "אימון אישי לשחקן קלע",
+        "תרגילי מסירה לנוער",
+        "איך לשפר סיומות ליד הסל?",
+        "השחקן שלי זורק עם מרפק החוצה, איך לתקן?",
+        "תרגילי זריקה אחרי קבלת כדור",
+        "איך ללמד צעד יורו?",
+        "תרגילי כדרור מתקדמים",
+    ],
+    Agent.NUTRITIONIST: [
+        "Create a nutrition plan for my player.",
+        "What to eat before/after games?",
+        "What should players eat on game day?",
+        "Meal plan for a 16 year old athlete",
+        "Are protein supplements safe for teenagers?",
+        "How much water should players drink during practice?",
+        "Healthy snacks for a tournament weekend",
+        "What to eat for breakfast before a morning game",
+        "Diet to gain muscle mass for a skinny player",
+        "My player wants to lose weight, what should she eat?",
+        "Recovery meal after practice",
+        "Is creatine ok for basketball players?",
+        "Hydration and electrolytes during games",
+        "Vegetarian diet for an athlete",
+        "How many calories does a basketball player need?",
+        "תפריט תזונה לשחקן בן 16",
+        "מה לאכול לפני משחק?",
+        "מה לאכול אחרי אימון?",
+        "תוכנית תזונה לשחקנית",
+        "האם תוספי חלבון בטוחים לנוער?",
+        "כמה מים לשתות באימון?",
+        "ארוחת בוקר לפני משחק בבוקר",
+        "דיאטה לעלייה במסת שריר",
+        "חטיפים בריאים לטורניר",
+        "תזונה צמחונית לספורטאי",
+        "כמה קלוריות צריך שחקן כדורסל?",
+        "השחקן שלי רוצה לרדת במשקל, מה לאכול?",
+    ],
+    Agent.STRENGTH_COACH: [
+        "Create a 15-minute pre-game warmup.",
+        "Weekly strength program for players.",
+        "How to improve vertical jump",
+        "Gym workout for basketball players",
+        "Agility drills to improve lateral quickness",
+        "Speed training for guards",
+        "Injury prevention exercises for ankles and knees",
+        "Off-season conditioning program",
+        "Plyometric exercises for teenagers",
+        "Is weight lifting safe for 14 year olds?",
+        "How to build endurance for the fourth quarter",
+        "Core strength workout",
+        "Stretching and mobility routine after practice",
+        "Sprint conditioning drills without a ball",
+        "Strength training during the season",
+        "תוכנית כוח שבועית לשחקנים",
+        "איך לשפר ניתור?",
+        "אימון חדר כושר לשחקני כדורסל",
+        "תרגילי זריזות ומהירות",
+        "חימום לפני משחק",
+        "תרגילים למניעת פציעות ברכיים וקרסוליים",
+        "תוכנית כושר לפגרה",
+        "תרגילי פליאומטריקה לנוער",
+        "האם הרמת משקולות בטוחה לגיל 14?",
+        "איך לשפר סיבולת?",
+        "אימון בטן וליבה",
+        "מתיחות אחרי אימון",
+        "How do I increase my players' speed?",
+        "Exercises to get a quicker first step",
+        "Explosiveness training for forwards",
+        "Weight training session for U16 players",
+        "Conditioning drills to get the team in shape",
+        "How to jump higher",
+        "Resistance band workout for youth players",
+        "Squats and lunges program for basketball",
+        "איך להגביר מהירות של שחקנים?",
+        "אימון משקולות לנוער עד גיל 16",
+        "תרגילי כושר גופני לקבוצה",
+        "איך לקפוץ גבוה יותר?",
+    ],
+    Agent.ANALYST: [
+        "What statistics should I track?",
+        "Help with team performance review.",
+        "Analyze my team's stats from the last game",
+        "Our turnovers are too high, what do the numbers say?",
+        "How to calculate effective field goal percentage",
+        "What is a good assist to turnover ratio?",
+        "Compare the stats of my two point guards",
+        "Points per possession analysis",
+        "Player efficiency rating explained",
+        "Our three point percentage dropped this month",
+        "Shooting percentages by zone for my team",
+        "Analyze these box score numbers: 12 points 5 rebounds 3 assists",
+        "Season statistics overview",
+        "Plus minus analysis for my lineups",
+        "Which advanced metrics matter for youth teams?",
+        "ניתוח סטטיסטיקה של המשחק האחרון",
+        "איזו סטטיסטיקה כדאי לעקוב אחריה?",
+        "יש לנו יותר מדי איבודי כדור, מה המספרים אומרים?",
+        "אחוזי קליעה של הקבוצה",
+        "השווה בין הנתונים של שני השחקנים",
+        "נקודות לפוזשן",
+        "יחס אסיסטים לאיבודים",
+        "ניתוח נתוני עונה",
+        "ניתוח חמישיות פלוס מינוס",
+        "אחוז מהשלוש ירד החודש",
+        "דוח ביצועים של הקבוצה",
+    ],
+    Agent.YOUTH_COACH: [
+        "Fun drills for kids ages 6-10.",
+        "Teaching fundamentals to young kids.",
+        "Games for 7 year olds learning basketball",
+        "How to keep 8 year olds focused in practice",
+        "Mini basketball practice plan",
+        "My U10 kids get bored quickly, ideas?",
+        "How to teach dribbling to 6 year olds",
+        "Should children play zone defense?",
+        "Fun warmup games for young children",
+        "How to handle a crying kid at practice",
+        "Basketball activities for kindergarten",
+        "Teaching shooting to kids with a lower basket",
+        "Kids ages 9-11 team building games",
+        "How long should practice be for 10 year olds?",
+        "משחקים לילדים בני 6 עד 10",
+        "איך ללמד כדרור לילדים קטנים?",
+        "אימון מיני כדורסל",
+        "הילדים בני 8 משתעממים באימון, רעיונות?",
+        "תרגילים מהנים לילדים",
+        "איך לשמור על ריכוז של ילדים באימון?",
+        "ילד בוכה באימון, מה עושים?",
+        "כמה זמן צריך להיות אימון לילדים בני 10?",
+        "לימוד יסודות לילדים צעירים",
+        "משחקי חימום לילדים",
+        "איך ללמד ילדים לזרוק לסל?",
+    ],
+    Agent.TEAM_MANAGER: [
+        "When is the next practice?",
+        "What's the schedule this week?",
+        "Give me the phone number of Daniel's parents",
+        "Where do we play on Friday?",
+        "Who is our next opponent?",
+        "List all the games this month",
+        "What is the address of the gym?",
+        "Which players are on the roster?",
+        "Do we have an away game this weekend?",
+        "What time does Sunday's practice start?",
+        "Send me the contact for the facility manager",
+        "How many practices do we have next week?",
+        "Which hall is booked for Tuesday?",
+        "Remind me the jersey numbers of the guards",
+        "Do we need transportation for the tournament?",
+        "מתי האימון הבא?",
+        "מה הלוח זמנים השבוע?",
+        "תן לי את מספר הטלפון של ההורים של דניאל",
+        "איפה אנחנו משחקים ביום שישי?",
+        "מי היריבה הבאה שלנו?",
+        "מה הכתובת של האולם?",
+        "רשימת השחקנים בקבוצה",
+        "יש לנו משחק חוץ השבוע?",
+        "באיזו שעה מתחיל האימון ביום ראשון?",
+        "כמה אימונים יש בשבוע הבא?",
+        "איזה אולם שמור ליום שלישי?",
+        "מה מספרי החולצות של השחקנים?",
+        "צריך הסעה לטורניר?",
+    ],
+    Agent.ASSISTANT_COACH: [
+        "How to run a practice",
+        "How to manage players",
+        "Team communication",
+        "Season planning",
+        "Help me structure a pre-game team talk.",
+        "How to build player confidence?",
+        "How do I deal with a parent who complains about playing time?",
+        "How to run tryouts",
+        "Set team rules for the season",
+        "Two of my players are in conflict, what should I do?",
+        "How to motivate the team after a losing streak",
+        "How to build a positive team culture",
+        "Plan a 90 minute practice",
+        "How to choose a team captain",
+        "How to communicate with my assistant coaches",
+        "How to handle a player who is always late",
+        "Parent meeting at the start of the season",
+        "How to divide playing time fairly",
+        "איך לבנות אימון?",
+        "איך לנהל שחקנים?",
+        "תכנון עונה",
+        "איך לדבר עם הורה שמתלונן על זמן משחק?",
+        "שני שחקנים רבים, מה לעשות?",
+        "איך להעלות את המוטיבציה אחרי רצף הפסדים?",
+        "חוקי קבוצה לעונה",
+        "איך לבנות תרבות קבוצתית חיובית?",
+        "איך לבחור קפטן?",
+        "שיחה לפני משחק",
+        "איך לחזק ביטחון עצמי של שחקן?",
+        "אסיפת הורים בתחילת העונה",
+        "איך לחלק זמן משחק בצורה הוגנת?",
+        "שחקן שמאחר כל הזמן, מה עושים?",
+    ],
+}
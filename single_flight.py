@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Single Flight
+Coalesces duplicate chat turns (double submits, reruns) onto the run still in flight
+"""
+
+import re
+import threading
+import time
+import uuid
+
+from config import SINGLE_FLIGHT_POLL_SECONDS
+
+# ============================================================================
+# FLIGHT
+# ============================================================================
+class Flight:
+    """One chat turn running in a worker thread, shared by every duplicate submission.
+
+    The worker publishes the chosen agent(s) with route(), answer text with
+    publish() and the finished turn with finish() or fail(). Any number of
+    script runs can follow() it; each of them sees the same answer.
+    """
+
+    def __init__(self, key, prompt):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.prompt = prompt
+        self.agent = None
+        self.agents = []
+        self.result = None
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.routed = threading.Event()
+        self.done = threading.Event()
+        self._chunks = []
+        self._lock = threading.Lock()
+
+    # Worker side
+    def route(self, agent, agents=None):
+        """Publish the answering agent (and the consult agents, if several)"""
+        self.agent = agent
+        self.agents = list(agents or [agent])
+        self.routed.set()
+
+    def publish(self, delta):
+        with self._lock:
+            self._chunks.append(delta)
+
+    def finish(self, result):
+        self.result = result
+        self.finished = time.time()
+        self.routed.set()
+        self.done.set()
+
+    def fail(self, error):
+        self.error = error
+        self.finished = time.time()
+        self.routed.set()
+        self.done.set()
+
+    # Follower side
+    def text(self):
+        """Answer text published so far"""
+        with self._lock:
+            return "".join(self._chunks)
+
+    def follow(self, poll=SINGLE_FLIGHT_POLL_SECONDS):
+        """Yield the growing answer text until the turn is done"""
+        shown = None
+        while not self.done.is_set():
+            text = self.text()
+            if text != shown:
+                shown = text
+                yield text
+            self.done.wait(poll)
+
+# ============================================================================
+# REGISTRY (process-wide, shared by all sessions)
+# ============================================================================
+_flights = {}
+_flights_lock = threading.Lock()
+
+def normalize_prompt(prompt):
+    """Case- and whitespace-insensitive form of a prompt"""
+    return re.sub(r"\s+", " ", prompt or "").strip().lower()
+
+def flight_key(scope, prompt):
+    """Key of a turn: the conversation (or session, before one exists) and its normalized prompt"""
+    return (scope, normalize_prompt(prompt))
+
+def start_flight(scope, prompt, target, *args):
+    """Run target(flight, prompt, *args) in a worker thread unless the same turn is already in flight.
+
+    A submission matching a turn that is still running gets that turn's
+    flight instead; once a turn is done the same prompt starts a new one.
+    Returns (flight, started).
+    """
+    key = flight_key(scope, prompt)
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None and not flight.done.is_set():
+            return flight, False
+        flight = Flight(key, prompt)
+        _flights[key] = flight
+
+    def run():
+        try:
+            target(flight, prompt, *args)
+        except Exception as e:
+            print(f"Error running chat turn: {e}")
+            flight.fail(e)
+        else:
+            if not flight.done.is_set():
+                flight.fail(RuntimeError("Chat turn ended without a result"))
+        finally:
+            with _flights_lock:
+                if _flights.get(key) is flight:
+                    del _flights[key]
+
+    threading.Thread(target=run, name="hoops-turn-flight", daemon=True).start()
+    return flight, True
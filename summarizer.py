@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Conversation Summary
+Folds older turns into a rolling per-conversation summary as a background job
+"""
+
+import threading
+
+from config import SUMMARY_ENABLED, SUMMARY_MAX_TOKENS, SUMMARY_RECENT_MESSAGES
+from prompts import SUMMARY_PROMPT
+from model_policy import select_model_settings, policy_completion
+from utils import update_conversation_summary, record_prompt_cache_usage
+from jobs import enqueue
+
+# Latest summary per conversation id, ahead of the (possibly stale) conversation row
+_summaries = {}
+_lock = threading.Lock()
+
+# ============================================================================
+# READING
+# ============================================================================
+def get_conversation_summary(conversation):
+    """Get {"text", "covered"} for a conversation, or None if nothing is summarized yet"""
+    if not SUMMARY_ENABLED or not conversation:
+        return None
+    with _lock:
+        summary = _summaries.get(conversation.get('id'))
+    if summary is None and conversation.get('summary'):
+        summary = {"text": conversation['summary'], "covered": conversation.get('summary_covered') or 0}
+    return summary
+
+# ============================================================================
+# FOLDING
+# ============================================================================
+def schedule_summary_update(conversation, messages, coach_id=None):
+    """Queue a background fold of every turn older than the latest exchange into the summary.
+
+    One queued fold per conversation: a newer turn just refreshes its messages.
+    """
+    if not SUMMARY_ENABLED or not conversation:
+        return False
+    current = get_conversation_summary(conversation) or {"covered": 0}
+    offset = getattr(messages, "offset", 0)
+    if offset + len(messages) - SUMMARY_RECENT_MESSAGES <= current["covered"]:
+        return False
+
+    snapshot = [
+        {"role": m["role"], "content": m.get("raw_content", m["content"])}
+        for m in messages
+    ]
+    return enqueue(
+        "summary",
+        {"conversation": conversation, "messages": snapshot, "offset": offset, "coach_id": coach_id},
+        dedup_key=f"summary:{conversation.get('id')}"
+    )
+
+def fold_conversation(client, supabase, conversation, messages, coach_id=None, offset=0):
+    """Fold the not-yet-summarized older turns and store the result (runs as a job).
+
+    messages may be the newest part of the conversation, starting offset
+    messages in; unsummarized turns before it are not loaded and are skipped.
+    """
+    conversation_id = conversation.get('id')
+    try:
+        current = get_conversation_summary(conversation) or {"text": "", "covered": 0}
+        end = offset + len(messages) - SUMMARY_RECENT_MESSAGES
+        if end <= current["covered"]:
+            return current
+
+        start = max(current["covered"] - offset, 0)
+        text = fold_turns(client, current["text"], messages[start:end - offset], coach_id)
+        summary = {"text": text, "covered": end}
+        with _lock:
+            _summaries[conversation_id] = summary
+        if supabase:
+            update_conversation_summary(supabase, conversation_id, text, end)
+        return summary
+    except Exception as e:
+        print(f"Error updating conversation summary: {e}")
+        return None
+
+def fold_turns(client, summary, messages, coach_id=None):
+    """Return the summary rewritten to include messages"""
+    turns = "\n\n".join(
+        f"{'COACH' if m['role'] == 'user' else 'STAFF'}: {m['content']}" for m in messages
+    )
+    prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(empty)",
+        turns=turns,
+        max_words=SUMMARY_MAX_TOKENS // 2
+    )
+    response = policy_completion(
+        client, coach_id, select_model_settings("summary"),
+        telemetry={"purpose": "summary"},
+        messages=[{"role": "user", "content": prompt}]
+    )
+    record_prompt_cache_usage(getattr(response, "usage", None))
+    return response.choices[0].message.content.strip()
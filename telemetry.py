@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Telemetry
+Per-call model telemetry in rotated JSONL files, with latency and spend aggregation
+"""
+
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from logging.handlers import RotatingFileHandler
+
+from config import (
+    TELEMETRY_ENABLED, TELEMETRY_PATH, TELEMETRY_MAX_BYTES, TELEMETRY_BACKUP_COUNT,
+    LLM_PRICES_PER_MILLION
+)
+
+_logger = None
+
+# ============================================================================
+# RECORDING
+# ============================================================================
+def _get_logger():
+    """Get the JSONL writer (RotatingFileHandler is thread-safe and rotates by size)"""
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(TELEMETRY_PATH), exist_ok=True)
+        logger = logging.getLogger("hoops.telemetry")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(
+            TELEMETRY_PATH, maxBytes=TELEMETRY_MAX_BYTES, backupCount=TELEMETRY_BACKUP_COUNT, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+def usage_tokens(usage):
+    """Get (prompt, completion, cached) token counts from a usage object"""
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0, cached or 0
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    """Estimate the USD cost of a call, or None for a model without prices"""
+    prices = LLM_PRICES_PER_MILLION.get(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    cost = (
+        (prompt_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + completion_tokens * output_price
+    )
+    return round(cost / 1_000_000, 8)
+
+def record_llm_call(labels, model, started, ttfb, usage=None, outcome="ok", attempts=1, stream=False, error=None):
+    """Append one model call record.
+
+    labels carries "purpose", "agent", "rule" and "coach_id"; started is the
+    time.monotonic() at which the call (including queueing) began and ttfb the
+    seconds until the first response byte/content chunk.
+    """
+    if not TELEMETRY_ENABLED:
+        return
+    try:
+        prompt_tokens, completion_tokens, cached_tokens = usage_tokens(usage)
+        record = {
+            "ts": time.time(),
+            "purpose": labels.get("purpose"),
+            "agent": labels.get("agent"),
+            "rule": labels.get("rule"),
+            "coach_id": labels.get("coach_id"),
+            "model": model,
+            "stream": stream,
+            "attempts": attempts,
+            "outcome": outcome,
+            "error": error,
+            "ttfb_ms": round(ttfb * 1000) if ttfb is not None else None,
+            "latency_ms": round((time.monotonic() - started) * 1000),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+        }
+        _get_logger().info(json.dumps(record, ensure_ascii=False))
+    except Exception as e:
+        print(f"Error recording telemetry: {e}")
+
+# ============================================================================
+# AGGREGATION
+# ============================================================================
+def load_records(since=None, path=TELEMETRY_PATH):
+    """Read records from the current and rotated files, optionally since a unix time"""
+    records = []
+    for file_path in sorted(glob.glob(path + ".*"), reverse=True) + [path]:
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if since is None or record.get("ts", 0) >= since:
+                        records.append(record)
+        except OSError:
+            continue
+    return records
+
+# Outcomes that are failures; "closed" (the consumer stopped a stream early) is counted on its own
+ERROR_OUTCOMES = ("error", "circuit_open")
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, or None if empty"""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+def summarize_calls(group_by="agent", since=None, records=None):
+    """Aggregate calls by a record field: count, errors, closed streams, p50/p95 latency and TTFB, tokens and cost"""
+    records = load_records(since) if records is None else records
+    groups = defaultdict(list)
+    for record in records:
+        groups[record.get(group_by) or "-"].append(record)
+
+    summary = {}
+    for key, rows in groups.items():
+        latencies = [r.get("latency_ms") for r in rows]
+        ttfbs = [r.get("ttfb_ms") for r in rows]
+        summary[key] = {
+            "calls": len(rows),
+            "errors": sum(1 for r in rows if r.get("outcome") in ERROR_OUTCOMES),
+            "closed": sum(1 for r in rows if r.get("outcome") == "closed"),
+            "p50_latency_ms": percentile(latencies, 50),
+            "p95_latency_ms": percentile(latencies, 95),
+            "p50_ttfb_ms": percentile(ttfbs, 50),
+            "p95_ttfb_ms": percentile(ttfbs, 95),
+            "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in rows),
+            "cached_tokens": sum(r.get("cached_tokens") or 0 for r in rows),
+            "completion_tokens": sum(r.get("completion_tokens") or 0 for r in rows),
+            "cost_usd": round(sum(r.get("cost_usd") or 0 for r in rows), 6),
+        }
+    return dict(sorted(summary.items(), key=lambda item: -item[1]["cost_usd"]))
+
+
+if __name__ == "__main__":
+    # python telemetry.py [agent|coach_id|model|purpose|rule] [hours]
+    field = sys.argv[1] if len(sys.argv) > 1 else "agent"
+    since = time.time() - float(sys.argv[2]) * 3600 if len(sys.argv) > 2 else None
+    columns = ["calls", "errors", "closed", "p50_latency_ms", "p95_latency_ms", "p50_ttfb_ms", "p95_ttfb_ms",
+               "prompt_tokens", "cached_tokens", "completion_tokens", "cost_usd"]
+    print("\t".join([field] + columns))
+    for key, row in summarize_calls(field, since).items():
+        print("\t".join([str(key)] + [str(row[c]) for c in columns]))
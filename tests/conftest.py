@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Test configuration
+Makes the app's flat modules importable from the tests directory
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
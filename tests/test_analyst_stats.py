@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Analyst stats tests
+"""
+
+from analytics_viz import text_has_stats
+from config import Agent
+from fake_llm import FakeOpenAI
+from pipeline import start_stats_extraction, resolve_analyst_stats
+
+
+def test_questions_without_stats_start_no_extraction():
+    for question in [
+        "What statistics should I track?",
+        "We lost 3 of our last 5 games",
+        "We have 2 games this weekend and 3 next week",
+        "Plan a 90 minute practice for my U14 team",
+    ]:
+        assert not text_has_stats(question), question
+        assert start_stats_extraction(question, [Agent.ANALYST], FakeOpenAI(ttft=0, tokens_per_second=0)) is None
+
+
+def test_questions_with_stats_are_detected():
+    for question in [
+        "He had 22 points, 7 rebounds and 4 assists",
+        "We shot 12/40 from three",
+        "Our FG% 38 is too low",
+        "קלע 18 נקודות ו-6 ריבאונדים",
+        "Dan 12 4 3\nAvi 8 6 1",
+    ]:
+        assert text_has_stats(question), question
+
+
+def test_no_extraction_means_no_stats():
+    assert resolve_analyst_stats(None) is None
+
+
+def test_extraction_result_is_the_stats():
+    future = start_stats_extraction("He scored 22 points with 7 rebounds", [Agent.ANALYST],
+                                    FakeOpenAI(ttft=0, tokens_per_second=0))
+    assert future is not None
+    stats = resolve_analyst_stats(future)
+    assert stats and stats["players"]
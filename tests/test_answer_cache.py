@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Answer cache tests
+"""
+
+from answer_cache import (
+    make_cache_key, is_cacheable_answer, similarity_bucket, SimilarityCache, MemoryCacheBackend,
+    set_answer_cache, get_cached_answer, store_cached_answer
+)
+from config import Agent, SIMILARITY_CACHE_THRESHOLD, SIMILARITY_CACHE_BANDS, SIMILARITY_CACHE_ROWS
+from prompts import DEGRADED_RESPONSE
+from utils import build_agent_messages
+
+COACH_A = {"name": "Coach A", "team_name": "Hawks", "age_group": "U14", "level": "competitive"}
+COACH_B = {"name": "Coach B", "team_name": "Eagles", "age_group": "U14", "level": "competitive"}
+
+
+COACH_C = {"name": "Coach C", "team_name": "Lions", "age_group": "U10", "level": "recreational"}
+
+
+def test_coaches_in_the_same_bucket_share_cached_answers():
+    question = "Give me a warm-up for practice"
+    set_answer_cache(MemoryCacheBackend(60, 100))
+    try:
+        store_cached_answer(question, Agent.SKILLS_COACH, COACH_A, "Start with a dynamic warm-up.")
+        assert get_cached_answer(question + "?", Agent.SKILLS_COACH, COACH_B) == "Start with a dynamic warm-up."
+        assert make_cache_key(question, Agent.SKILLS_COACH, COACH_A) != make_cache_key(question, Agent.SKILLS_COACH, COACH_C)
+    finally:
+        set_answer_cache(None)
+
+
+def test_cacheable_prompts_leave_out_the_coach_identity():
+    context = {"documents": [], "memories": [], "omit_identity": True}
+    messages, _ = build_agent_messages("Give me a warm-up", Agent.SKILLS_COACH, [], COACH_A, None, None, context)
+    assert "Coach A" not in messages[0]["content"] and "Hawks" not in messages[0]["content"]
+    context = {"documents": [], "memories": []}
+    messages, _ = build_agent_messages("Give me a warm-up", Agent.SKILLS_COACH, [], COACH_A, None, None, context)
+    assert "Coach A" in messages[0]["content"]
+
+
+def test_failed_answers_are_not_cacheable():
+    for answer in ["", "   ", "Error: timeout", DEGRADED_RESPONSE,
+                   "I'm sorry, I can't help with that.", "Unfortunately I cannot answer this.",
+                   "As an AI, I don't have access to your roster.", "מצטער, אין לי מידע על זה"]:
+        assert not is_cacheable_answer(answer), answer
+    assert is_cacheable_answer("Start with a dynamic warm-up: high knees, carioca and defensive slides.")
+
+
+def similarity_cache():
+    return SimilarityCache(SIMILARITY_CACHE_THRESHOLD, 100, 60, SIMILARITY_CACHE_BANDS, SIMILARITY_CACHE_ROWS)
+
+
+def test_near_miss_questions_do_not_share_answers():
+    pairs = [
+        ("Key principles of man-to-man offense.", "Key principles of man-to-man defense."),
+        ("Best drills for beginner guards", "Best drills for advanced guards"),
+        ("How do I teach a full court press?", "How do I break a full court press?"),
+        ("Warm-up before a game", "Cool-down after a game"),
+        ("Drills for a player who can't finish with the left hand", "Drills for a player who can't finish with the right hand"),
+        ("Should kids play zone defense?", "Should kids not play zone defense?"),
+        ("Shooting drills for guards", "Shooting drills for centers"),
+    ]
+    for cached, asked in pairs:
+        cache = similarity_cache()
+        bucket = similarity_bucket(cached, Agent.TACTICIAN, COACH_A)
+        cache.set(bucket, cached, "answer")
+        assert cache.get(bucket, asked)[0] is None, asked
+
+
+def test_rephrased_questions_share_answers():
+    pairs = [
+        ("How do I teach the pick and roll?", "how to teach pick and roll"),
+        ("Shooting drills for guards", "Shooting drill for guards!"),
+        ("Best way to attack the 2-3 zone", "How to attack a 2-3 zone"),
+        ("What should my players eat before a game", "What should players eat before games?"),
+        ("What are good drills to improve ball handling", "Ball handling drills to improve"),
+    ]
+    for cached, asked in pairs:
+        cache = similarity_cache()
+        bucket = similarity_bucket(cached, Agent.SKILLS_COACH, COACH_A)
+        cache.set(bucket, cached, "answer")
+        assert cache.get(bucket, asked)[0] == "answer", asked
+
+
+def test_numbers_keep_questions_apart():
+    cache = similarity_cache()
+    cache.set(similarity_bucket("How to attack a 2-3 zone", Agent.TACTICIAN, COACH_A), "How to attack a 2-3 zone", "answer")
+    asked = "How to attack a 1-3-1 zone"
+    assert cache.get(similarity_bucket(asked, Agent.TACTICIAN, COACH_A), asked)[0] is None
+
+
+def test_similarity_bucket_is_per_profile_bucket():
+    question = "Shooting drills for guards"
+    assert similarity_bucket(question, Agent.SKILLS_COACH, COACH_A) == similarity_bucket(question, Agent.SKILLS_COACH, COACH_B)
+    assert similarity_bucket(question, Agent.SKILLS_COACH, COACH_A) != similarity_bucket(question, Agent.SKILLS_COACH, COACH_C)
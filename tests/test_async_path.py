@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Async model-call path tests
+"""
+
+import time
+
+from config import Agent
+from fake_llm import FakeOpenAI, FakeAsyncOpenAI
+from llm import ThreadedAsyncClient, achat_completion, run_async
+from pipeline import run_consult
+from utils import get_async_client
+
+
+class ProxyClient:
+    """A sync client with no async counterpart, like the cassette proxies"""
+
+    def __init__(self, client):
+        self.chat = client.chat
+
+
+def test_consult_agents_answer_concurrently_on_the_event_loop():
+    client = FakeOpenAI(ttft=0.3, tokens_per_second=0, jitter=0, fault_rates={})
+    client.start_meter()
+    started = time.monotonic()
+    answers = run_consult("Zone offense and a jump program", [Agent.TACTICIAN, Agent.STRENGTH_COACH], [], client)
+    elapsed = time.monotonic() - started
+
+    assert [agent for agent, _ in answers] == [Agent.TACTICIAN, Agent.STRENGTH_COACH]
+    assert all(answer and not answer.startswith("Error:") for _, answer in answers)
+    assert client.calls == 2
+    assert elapsed < 0.55
+    # The turn's meter follows the calls onto the loop
+    assert client.model_seconds() > 0
+
+
+def test_async_client_matches_the_sync_client():
+    fake = FakeOpenAI(ttft=0, tokens_per_second=0)
+    assert isinstance(get_async_client(fake), FakeAsyncOpenAI)
+    assert get_async_client(fake).sync is fake
+
+    proxy = get_async_client(ProxyClient(fake))
+    assert isinstance(proxy, ThreadedAsyncClient)
+    response = run_async(achat_completion(proxy, model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}]))
+    assert response.choices[0].message.content
+    assert fake.calls == 1
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Chat message assembly tests
+"""
+
+from config import HISTORY_RECENT_MESSAGES, SUMMARY_RECENT_MESSAGES
+from utils import build_chat_messages
+
+HISTORY = [
+    {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"}
+    for i in range(8)
+]
+
+
+def replayed(messages):
+    return [m["content"] for m in messages if m["role"] in ("user", "assistant")][:-1]
+
+
+def test_without_a_summary_the_recent_messages_are_replayed():
+    messages, _ = build_chat_messages("system", "next?", HISTORY)
+    assert replayed(messages) == [m["content"] for m in HISTORY[-HISTORY_RECENT_MESSAGES:]]
+
+
+def test_with_a_summary_only_the_latest_exchange_follows_it():
+    summary = {"text": "Talked about zone offense.", "covered": 4}
+    messages, _ = build_chat_messages("system", "next?", HISTORY, summary=summary)
+    assert "Talked about zone offense." in messages[1]["content"]
+    assert replayed(messages) == [m["content"] for m in HISTORY[-SUMMARY_RECENT_MESSAGES:]]
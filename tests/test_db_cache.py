@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Database cache tests
+"""
+
+import db_cache
+from db_cache import cached_read
+
+
+def test_reads_are_cached():
+    loads = []
+    for _ in range(2):
+        cached_read("players", "coach-cached", ("view",), lambda: loads.append(1) or [{"id": 1}])
+    assert len(loads) == 1
+
+
+def test_every_read_reaches_the_database_while_recording(monkeypatch):
+    monkeypatch.setattr(db_cache, "CASSETTE_MODE", "record")
+    loads = []
+    for _ in range(2):
+        cached_read("players", "coach-recorded", ("view",), lambda: loads.append(1) or [{"id": 1}])
+    assert len(loads) == 2
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Routing tests
+"""
+
+from classifier import classify_with_evidence, cross_validate, evaluate_router, is_confident
+from config import (
+    Agent, ROUTER_AGENT_DESCRIPTIONS, ROUTER_PROMPT_NO_CONTEXT, ROUTER_PROMPT_MULTI,
+    ROUTER_LOCAL_THRESHOLD, ROUTER_LOCAL_MIN_MARGIN, ROUTER_LOCAL_MIN_TOKENS, ROUTER_LOCAL_MAX_MISROUTE
+)
+from fake_llm import FakeOpenAI
+from router_corpus import ROUTER_CORPUS
+from prompts import SINGLE_SHOT_HEADER
+from utils import route_question_with_info, is_multi_part_question, build_single_shot_messages
+
+
+def test_routing_prompts_list_every_agent():
+    assert set(ROUTER_AGENT_DESCRIPTIONS) == set(Agent)
+    for prompt in (ROUTER_PROMPT_NO_CONTEXT, ROUTER_PROMPT_MULTI, SINGLE_SHOT_HEADER):
+        for agent in Agent:
+            assert f"- {agent.name}: " in prompt
+
+
+def test_multi_part_questions_skip_the_fast_path_in_consult_mode():
+    question = "Key principles of man-to-man defense? Also how to break a full-court press"
+    assert is_multi_part_question(question)
+    _, single = route_question_with_info(question, FakeOpenAI(ttft=0, tokens_per_second=0))
+    assert single["path"] == "local"
+    _, consult = route_question_with_info(question, FakeOpenAI(ttft=0, tokens_per_second=0), multi=True)
+    assert consult["path"] == "llm"
+    assert consult["agents"]
+
+
+def test_single_part_questions_keep_the_fast_path_in_consult_mode():
+    question = "Key principles of man-to-man defense"
+    assert not is_multi_part_question(question)
+    agent, info = route_question_with_info(question, FakeOpenAI(ttft=0, tokens_per_second=0), multi=True)
+    assert info["path"] == "local"
+    assert agent == Agent.TACTICIAN
+
+
+def test_held_out_accuracy_and_confident_misroutes():
+    accuracy, coverage, misroute = evaluate_router(
+        cross_validate(ROUTER_CORPUS), ROUTER_LOCAL_THRESHOLD, ROUTER_LOCAL_MIN_MARGIN, ROUTER_LOCAL_MIN_TOKENS
+    )
+    assert accuracy >= 0.5
+    assert coverage > 0
+    assert misroute <= ROUTER_LOCAL_MAX_MISROUTE
+
+
+def test_fast_path_does_not_misroute_strength_or_off_topic_questions():
+    gates = (ROUTER_LOCAL_THRESHOLD, ROUTER_LOCAL_MIN_MARGIN, ROUTER_LOCAL_MIN_TOKENS)
+    for question in ("How do I increase my players speed?", "How to improve vertical jump for my guards",
+                     "Weight training session for U16"):
+        evidence = classify_with_evidence(question)
+        assert evidence[0] == Agent.STRENGTH_COACH or not is_confident(evidence, *gates)
+    assert not is_confident(classify_with_evidence("What is the weather tomorrow?"), *gates)
+
+
+def test_single_shot_prompt_stays_within_the_budget():
+    coach = {"name": "Coach A", "team_name": "Hawks", "age_group": "U14", "level": "competitive"}
+    memories = [{"title": f"Memory {i}", "content": "Our center is recovering from an ankle sprain. " * 10}
+                for i in range(10)]
+    context = {"memories": memories}
+    messages, _ = build_single_shot_messages("Help with my team", [], coach, None, context)
+    report = context["prompt_report"]
+    assert report["tokens"] <= report["budget"]
+    assert "Memory 0" in messages[0]["content"]
+    for agent in Agent:
+        assert f"- {agent.name}: " in messages[0]["content"]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Single flight tests
+"""
+
+import threading
+import uuid
+
+import app
+from fake_llm import FakeOpenAI
+from single_flight import start_flight
+
+COACH = {"name": "Test Coach", "team_name": "Test Team"}
+
+
+def test_turn_runs_through_start_flight():
+    scope = f"session:{uuid.uuid4().hex}"
+    prompt = "How do I teach a zone press break?"
+    flight, started = start_flight(
+        scope, prompt, app.run_turn,
+        [], FakeOpenAI(), COACH, None, None, False, None, None
+    )
+    assert started
+    assert flight.done.wait(30)
+    assert flight.error is None
+    user, assistant = flight.result["messages"]
+    assert user == {"role": "user", "content": prompt}
+    assert assistant["role"] == "assistant"
+    assert assistant["raw_content"]
+
+
+def test_duplicate_joins_only_while_running():
+    scope = f"session:{uuid.uuid4().hex}"
+    release = threading.Event()
+
+    def target(flight, prompt):
+        release.wait(5)
+        flight.finish({"prompt": prompt})
+
+    first, started = start_flight(scope, "Next drill", target)
+    duplicate, duplicate_started = start_flight(scope, "  next   DRILL ", target)
+    assert started and not duplicate_started
+    assert duplicate is first
+
+    release.set()
+    assert first.done.wait(5)
+    again, again_started = start_flight(scope, "Next drill", target)
+    assert again_started
+    assert again is not first
+    assert again.done.wait(5)
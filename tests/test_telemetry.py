@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Telemetry tests
+"""
+
+from telemetry import summarize_calls
+
+
+def test_closed_streams_are_not_errors():
+    records = [
+        {"agent": "tactician", "outcome": "ok", "latency_ms": 100},
+        {"agent": "tactician", "outcome": "closed", "latency_ms": 40},
+        {"agent": "tactician", "outcome": "error", "latency_ms": 900},
+        {"agent": "tactician", "outcome": "circuit_open", "latency_ms": 0},
+    ]
+    row = summarize_calls("agent", records=records)["tactician"]
+    assert row["calls"] == 4
+    assert row["errors"] == 2
+    assert row["closed"] == 1
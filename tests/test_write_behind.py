@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Write-behind tests
+"""
+
+from types import SimpleNamespace
+
+import write_behind
+from utils import save_message, get_messages_page
+from write_behind import WriteBehindBuffer
+
+
+class FakeQuery:
+    def __init__(self, table):
+        self.table = table
+        self.rows = None
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def insert(self, rows):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self):
+        if self.rows is not None:
+            self.table.insert(self.rows)
+        return SimpleNamespace(data=list(reversed(self.table.rows)), count=len(self.table.rows))
+
+
+class FakeTable:
+    def __init__(self, missing_columns=()):
+        self.rows = []
+        self.missing_columns = set(missing_columns)
+
+    def insert(self, rows):
+        for row in rows:
+            missing = self.missing_columns & set(row)
+            if missing:
+                raise Exception(f'{{"code": "42703", "message": "column {missing.pop()} does not exist"}}')
+        self.rows.extend(rows)
+
+
+class FakeSupabase:
+    def __init__(self, table):
+        self._table = table
+
+    def table(self, name):
+        return FakeQuery(self._table)
+
+
+def use_buffer(tmp_path, monkeypatch):
+    buffer = WriteBehindBuffer(str(tmp_path / "spill.jsonl"), str(tmp_path / "failed.jsonl"))
+    monkeypatch.setattr(write_behind, "_buffer", buffer)
+    return buffer
+
+
+def test_repeated_messages_survive_a_saved_copy_that_is_still_queued(tmp_path, monkeypatch):
+    buffer = use_buffer(tmp_path, monkeypatch)
+    table = FakeTable()
+    supabase = FakeSupabase(table)
+
+    save_message(supabase, "conv-repeat", "user", "next?")
+    save_message(supabase, "conv-repeat", "user", "next?")
+    # The first row reached the database but is not acknowledged yet
+    table.rows.append(dict(buffer.pending_rows("messages")[0], id=1))
+
+    rows, _ = get_messages_page(supabase, "conv-repeat")
+    assert [row["content"] for row in rows] == ["next?", "next?"]
+    assert rows[0]["id"] == 1 and rows[1].get("id") is None
+
+
+def test_rows_are_written_without_optional_columns_the_database_lacks(tmp_path, monkeypatch):
+    buffer = use_buffer(tmp_path, monkeypatch)
+    table = FakeTable(missing_columns=["client_id"])
+    buffer._client = FakeSupabase(table)
+
+    save_message(None, "conv-missing", "user", "hello")
+    assert buffer.flush()
+    assert buffer.attempts == 0
+    assert table.rows == [{k: v for k, v in table.rows[0].items() if k != "client_id"}]
+    assert table.rows[0]["content"] == "hello"
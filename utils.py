@@ -5,20 +5,41 @@ Database functions, file handling, and helper functions
 """
 
 import streamlit as st
-import base64
+import json
+import asyncio
+import re
+import threading
+from functools import lru_cache
 import pandas as pd
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from supabase import create_client
 
 from config import (
     Agent, AGENT_INFO,
-    ROUTER_PROMPT_WITH_CONTEXT, ROUTER_PROMPT_NO_CONTEXT
+    ROUTER_PROMPT_WITH_CONTEXT, ROUTER_PROMPT_NO_CONTEXT, ROUTER_PROMPT_MULTI, ROUTER_MULTI_CONTEXT, CONSULT_MAX_AGENTS,
+    ROUTER_LOCAL_ENABLED, ROUTER_LOCAL_THRESHOLD, ROUTER_LOCAL_MIN_MARGIN, ROUTER_LOCAL_MIN_TOKENS,
+    PROMPT_PREFIX_CACHE_SIZE,
+    LLM_ROUTER_DEADLINE_SECONDS, HISTORY_TOKEN_CEILING, HISTORY_RECENT_MESSAGES, SUMMARY_RECENT_MESSAGES,
+    LLM_BACKEND, EVENTS_BULK_CHUNK_SIZE,
+    HISTORY_PAGE_SIZE
 )
 from prompts import (
-    SYSTEM_PROMPTS, COACH_PROFILE_TEMPLATE, RESPONSE_RULES,
+    SYSTEM_PROMPTS, COACH_PROFILE_TEMPLATE, COACH_IDENTITY_TEMPLATE, RESPONSE_RULES,
     KNOWLEDGE_BASE_HEADER, KNOWLEDGE_BASE_FOOTER,
-    FILE_ANALYSIS_PROMPT, IMAGE_ANALYSIS_PROMPT
+    FILE_ANALYSIS_PROMPT, IMAGE_ANALYSIS_PROMPT,
+    SINGLE_SHOT_HEADER, DEGRADED_RESPONSE,
+    CONVERSATION_SUMMARY_TEMPLATE, STATS_EXTRACTION_PROMPT, STATS_SCHEMA
 )
+from classifier import classify_with_evidence, is_confident
+from prompt_budget import assemble_system_prompt, count_tokens
+from llm import is_retryable_error, CircuitOpenError, ThreadedAsyncClient
+from model_policy import select_model_settings, policy_completion, apolicy_completion
+from answer_cache import get_cached_answer
+from db_cache import cached_read, invalidate
+from projections import select_columns, select_projected, project_rows, project_row
+from write_behind import queue_insert, pending_rows, now_timestamp
+from image_pipeline import prepare_image
+from fake_llm import FakeOpenAI, FakeAsyncOpenAI
 
 # ============================================================================
 # CLIENT INITIALIZATION
@@ -38,16 +59,52 @@ def get_supabase_client():
 
 @st.cache_resource
 def get_openai_client():
-    """Initialize OpenAI client"""
+    """Initialize OpenAI client (or the offline fake when LLM_BACKEND is "fake")"""
+    if LLM_BACKEND == "fake":
+        return FakeOpenAI()
     try:
         api_key = st.secrets.get("OPENAI_API_KEY")
         if not api_key:
             return None
-        return OpenAI(api_key=api_key)
+        return OpenAI(api_key=api_key, max_retries=0)  # Retries are handled in llm.chat_completion
     except Exception as e:
         st.error(f"Failed to initialize OpenAI: {e}")
         return None
 
+@st.cache_resource
+def get_async_openai_client():
+    """Initialize async OpenAI client (used on llm's shared event loop)"""
+    if LLM_BACKEND == "fake":
+        return FakeAsyncOpenAI()
+    try:
+        api_key = st.secrets.get("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        return AsyncOpenAI(api_key=api_key, max_retries=0)
+    except Exception as e:
+        st.error(f"Failed to initialize async OpenAI: {e}")
+        return None
+
+def get_async_client(client):
+    """The async counterpart of a sync client, for calls on llm's shared event loop"""
+    if isinstance(client, FakeOpenAI):
+        return FakeAsyncOpenAI(sync=client)
+    if isinstance(client, OpenAI):
+        return get_async_openai_client() or ThreadedAsyncClient(client)
+    return ThreadedAsyncClient(client)
+
+# ============================================================================
+# DATABASE CACHE
+# ============================================================================
+def invalidate_rows(table, rows, also=()):
+    """Invalidate cached reads for the coaches owning written rows (the whole table if unknown)"""
+    coach_ids = {row.get("coach_id") for row in rows or []}
+    for name in (table,) + tuple(also):
+        if not coach_ids or None in coach_ids:
+            invalidate(name)
+        for coach_id in coach_ids - {None}:
+            invalidate(name, coach_id)
+
 # ============================================================================
 # DATABASE FUNCTIONS - COACHES
 # ============================================================================
@@ -80,14 +137,24 @@ def create_coach(supabase, name, email, team_name, age_group, level):
 # ============================================================================
 # DATABASE FUNCTIONS - CONVERSATIONS
 # ============================================================================
-def get_coach_conversations(supabase, coach_id):
+def get_coach_conversations(supabase, coach_id, view="conversation_list"):
     """Get coach's conversation history"""
     try:
-        result = supabase.table("conversations").select("*").eq("coach_id", coach_id).order("created_at", desc=True).limit(20).execute()
-        return result.data or []
+        rows = cached_read("conversations", coach_id, (view, 20), lambda: supabase.table("conversations")
+                           .select(select_columns(view)).eq("coach_id", coach_id).order("created_at", desc=True).limit(20).execute().data or [])
+        return project_rows(rows, view)
     except Exception:
         return []
 
+def get_conversation(supabase, conversation_id, view="conversation_state"):
+    """Get a single conversation by ID"""
+    try:
+        result = select_projected(view, lambda columns: supabase.table("conversations")
+                                  .select(columns).eq("id", conversation_id).execute())
+        return project_row(result.data[0], view) if result.data else None
+    except Exception:
+        return None
+
 def create_conversation(supabase, coach_id, title):
     """Create new conversation"""
     try:
@@ -95,41 +162,96 @@ def create_conversation(supabase, coach_id, title):
             "coach_id": coach_id,
             "title": title[:50] if title else "New Chat"
         }).execute()
+        invalidate("conversations", coach_id)
         if result.data:
             return result.data[0]
         return None
     except Exception:
         return None
 
-def save_message(supabase, conversation_id, role, content, agent=None):
-    """Save message to conversation"""
+def save_message(supabase, conversation_id, role, content, agent=None, stats=None):
+    """Queue a message for saving (stats: THE ANALYST's structured stats payload)"""
     try:
         data = {
             "conversation_id": conversation_id,
             "role": role,
-            "content": content
+            "content": content,
+            "created_at": now_timestamp()
         }
         if agent:
             data["agent"] = agent
-        supabase.table("messages").insert(data).execute()
-    except Exception:
-        pass
+        if stats:
+            data["stats"] = stats
+        queue_insert(supabase, "messages", data)
+    except Exception as e:
+        print(f"Error saving message: {e}")
+
+def get_messages_page(supabase, conversation_id, before=None, limit=HISTORY_PAGE_SIZE, view="chat_history"):
+    """Get up to limit messages older than the (created_at, id) cursor before, oldest first.
 
-def get_conversation_messages(supabase, conversation_id):
-    """Get all messages in a conversation"""
+    Pages are keyset-paginated on (created_at, id). The newest page
+    (before=None) also includes messages still queued for saving, which have
+    no id yet. Returns (messages, has_more).
+    """
+    def run(columns):
+        query = supabase.table("messages").select(columns).eq("conversation_id", conversation_id)
+        if before:
+            created_at, message_id = before
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{message_id}")')
+        return query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
+
+    def load():
+        return select_projected(view, run)
+
+    try:
+        rows = cached_read("messages", conversation_id, (view, before, limit), load)
+    except Exception as e:
+        print(f"Error getting messages: {e}")
+        rows = []
+    has_more = len(rows) > limit
+    messages = list(reversed(rows[:limit]))
+    if before is None:
+        # A row written after it was read can be both saved and still queued
+        saved = {m.get("client_id") for m in messages if m.get("client_id")}
+        messages += [
+            m for m in pending_rows("messages", conversation_id=conversation_id)
+            if m.get("client_id") not in saved
+        ]
+    return project_rows(messages, view), has_more
+
+def count_conversation_messages(supabase, conversation_id):
+    """Number of saved messages in a conversation (None if it can't be counted)"""
     try:
-        result = supabase.table("messages").select("*").eq("conversation_id", conversation_id).order("created_at").execute()
-        return result.data or []
+        return cached_read("messages", conversation_id, ("count",), lambda: supabase.table("messages")
+                           .select("id", count="exact", head=True).eq("conversation_id", conversation_id).execute().count)
     except Exception:
-        return []
+        return None
+
+def message_cursor(message):
+    """Keyset cursor (created_at, id) of a saved message; None for one still queued for saving"""
+    if message.get("id") is None:
+        return None
+    return (message.get("created_at"), message["id"])
 
 def update_conversation_title(supabase, conversation_id, title):
     """Update conversation title"""
     try:
-        supabase.table("conversations").update({"title": title}).eq("id", conversation_id).execute()
+        result = supabase.table("conversations").update({"title": title}).eq("id", conversation_id).execute()
+        invalidate_rows("conversations", result.data)
     except Exception:
         pass
 
+def update_conversation_summary(supabase, conversation_id, summary, covered):
+    """Store a conversation's rolling summary and how many messages it covers"""
+    try:
+        result = supabase.table("conversations").update({
+            "summary": summary,
+            "summary_covered": covered
+        }).eq("id", conversation_id).execute()
+        invalidate_rows("conversations", result.data)
+    except Exception as e:
+        print(f"Error saving conversation summary: {e}")
+
 # ============================================================================
 # DATABASE FUNCTIONS - COACH MEMORIES
 # ============================================================================
@@ -159,23 +281,22 @@ MEMORY_TRIGGERS = {
     ]
 }
 
-def get_coach_memories(supabase, coach_id, limit=10):
+def get_coach_memories(supabase, coach_id, limit=10, view="memory_context"):
     """Get recent memories for a coach"""
     try:
-        result = supabase.table("coach_memories")\
-            .select("*")\
+        return project_rows(cached_read("coach_memories", coach_id, (view, "active", limit), lambda: supabase.table("coach_memories")\
+            .select(select_columns(view))\
             .eq("coach_id", coach_id)\
             .eq("status", "active")\
             .order("created_at", desc=True)\
             .limit(limit)\
-            .execute()
-        return result.data or []
+            .execute().data or []), view)
     except Exception as e:
         print(f"Error getting memories: {e}")
         return []
 
 def save_memory(supabase, coach_id, category, title, content, conversation_id=None, importance=1):
-    """Save a new memory for a coach"""
+    """Queue a new memory for a coach; returns the row as queued"""
     try:
         data = {
             "coach_id": coach_id,
@@ -183,13 +304,14 @@ def save_memory(supabase, coach_id, category, title, content, conversation_id=No
             "title": title[:100] if title else "Memory",
             "content": content[:500] if content else "",
             "importance": importance,
-            "status": "active"
+            "status": "active",
+            "created_at": now_timestamp()
         }
         if conversation_id:
             data["conversation_id"] = conversation_id
         
-        result = supabase.table("coach_memories").insert(data).execute()
-        return result.data[0] if result.data else None
+        queue_insert(supabase, "coach_memories", data)
+        return data
     except Exception as e:
         print(f"Error saving memory: {e}")
         return None
@@ -327,15 +449,15 @@ def build_memory_context(memories):
 def get_agent_documents(supabase, agent_name):
     """Get all documents for a specific agent"""
     try:
-        result = supabase.table("documents").select("title, content").eq("agent", agent_name).execute()
-        return result.data or []
+        return cached_read("documents", agent_name, (), lambda: supabase.table("documents")
+                           .select("title, content").eq("agent", agent_name).execute().data or [])
     except Exception:
         return []
 
-def get_agent_knowledge(supabase, agent):
-    """Build knowledge context from agent's documents"""
-    agent_name = agent.value
-    documents = get_agent_documents(supabase, agent_name)
+def get_agent_knowledge(supabase, agent, documents=None):
+    """Build knowledge context from agent's documents (fetched unless provided)"""
+    if documents is None:
+        documents = get_agent_documents(supabase, agent.value)
     
     if not documents:
         return ""
@@ -355,27 +477,98 @@ def get_agent_knowledge(supabase, agent):
 # ============================================================================
 def get_system_prompt(agent, coach_profile=None):
     """Generate complete system prompt for an agent"""
+    profile = coach_profile or {}
+    prompt = get_static_prompt_prefix(agent, profile.get('age_group'), profile.get('level'))
+    return prompt + build_identity_context(coach_profile)
+
+@lru_cache(maxsize=PROMPT_PREFIX_CACHE_SIZE)
+def get_static_prompt_prefix(agent, age_group=None, level=None, documents=()):
+    """Build the static system prompt prefix, memoized per (agent, age_group, level, knowledge).
+
+    Everything here is identical across turns (and across coaches with the same
+    profile), so it goes first where the provider's prefix cache can match it.
+    documents is a tuple of (title, content) pairs.
+    """
     prompt = SYSTEM_PROMPTS[agent]
     
     # Add coach profile context
-    if coach_profile:
+    if age_group or level:
         prompt += COACH_PROFILE_TEMPLATE.format(
-            name=coach_profile.get('name', 'Unknown'),
-            team_name=coach_profile.get('team_name', 'Unknown'),
-            age_group=coach_profile.get('age_group', 'Unknown'),
-            level=coach_profile.get('level', 'Unknown')
+            age_group=age_group or 'Unknown',
+            level=level or 'Unknown'
         )
     
     # Add response rules
     prompt += RESPONSE_RULES
     
+    # Add RAG knowledge
+    if documents:
+        prompt += get_agent_knowledge(None, agent, [
+            {"title": title, "content": content} for title, content in documents
+        ])
+    
     return prompt
 
+def build_identity_context(coach_profile):
+    """Build the per-coach identity block that follows the static prefix"""
+    if not coach_profile:
+        return ""
+    return COACH_IDENTITY_TEMPLATE.format(
+        name=coach_profile.get('name', 'Unknown'),
+        team_name=coach_profile.get('team_name', 'Unknown')
+    )
+
+def documents_key(documents):
+    """Hashable key of knowledge documents for the prefix cache"""
+    return tuple((doc.get('title', 'Document'), doc.get('content', '')) for doc in documents)
+
+# ============================================================================
+# PROMPT CACHE STATS
+# ============================================================================
+_prompt_cache_lock = threading.Lock()
+_prompt_cache_stats = {"calls": 0, "calls_with_hits": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+def record_prompt_cache_usage(usage):
+    """Record prompt and cached-prefix token counts from an API usage object"""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    with _prompt_cache_lock:
+        _prompt_cache_stats["calls"] += 1
+        _prompt_cache_stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        _prompt_cache_stats["cached_tokens"] += cached
+        if cached:
+            _prompt_cache_stats["calls_with_hits"] += 1
+
+def get_prompt_cache_stats():
+    """Get provider prefix-cache hit rates and the local prefix memo stats"""
+    with _prompt_cache_lock:
+        stats = dict(_prompt_cache_stats)
+    stats["token_hit_rate"] = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+    stats["call_hit_rate"] = stats["calls_with_hits"] / stats["calls"] if stats["calls"] else 0.0
+    info = get_static_prompt_prefix.cache_info()
+    stats["prefix_memo"] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
+
 # ============================================================================
 # ROUTING
 # ============================================================================
-def route_question(question, client, chat_history=None):
+def route_question(question, client, chat_history=None, coach_id=None):
     """Route question to appropriate agent with smart context awareness"""
+    agent, _ = route_question_with_info(question, client, chat_history, coach_id=coach_id)
+    return agent
+
+def route_question_with_info(question, client, chat_history=None, allow_llm=True, coach_id=None, multi=False):
+    """Route question and report how: returns (agent, {"path", "confidence", "candidate", "agents"})
+
+    path is "continuation", "local" (classifier fast path), "llm" or "fallback".
+    With allow_llm=False an ambiguous question returns (None, info) with path
+    "deferred" so the caller can pick the agent some other way.
+    With multi=True the LLM router may pick several agents for a consult; they
+    are listed in info["agents"] (most relevant first, agent is the first).
+    """
+    info = {"path": "fallback", "confidence": 0.0, "candidate": None, "agents": []}
     try:
         previous_agent = None
         previous_message = None
@@ -401,10 +594,35 @@ def route_question(question, client, chat_history=None):
             if has_question and is_data_response:
                 for agent in Agent:
                     if agent.value == previous_agent:
-                        return agent
+                        info["path"] = "continuation"
+                        return agent, info
+        
+        # Local classifier fast path (a consult turn leaves multi-part questions to the multi router)
+        if ROUTER_LOCAL_ENABLED:
+            evidence = classify_with_evidence(question)
+            candidate, confidence = evidence[0], evidence[1]
+            info["candidate"] = candidate.value if candidate else None
+            info["confidence"] = confidence
+            consult_check = multi and allow_llm and is_multi_part_question(question)
+            confident = is_confident(evidence, ROUTER_LOCAL_THRESHOLD, ROUTER_LOCAL_MIN_MARGIN, ROUTER_LOCAL_MIN_TOKENS)
+            if confident and not consult_check:
+                info["path"] = "local"
+                return candidate, info
+        
+        if not allow_llm:
+            info["path"] = "deferred"
+            return None, info
         
         # Use Router
-        if previous_agent and previous_message:
+        if multi:
+            context = ""
+            if previous_agent and previous_message:
+                context = ROUTER_MULTI_CONTEXT.format(
+                    previous_agent=previous_agent.upper(),
+                    previous_message=previous_message[:200]
+                )
+            prompt = ROUTER_PROMPT_MULTI.format(context=context, question=question, max_agents=CONSULT_MAX_AGENTS)
+        elif previous_agent and previous_message:
             prompt = ROUTER_PROMPT_WITH_CONTEXT.format(
                 previous_agent=previous_agent.upper().replace("_", " "),
                 previous_message=previous_message[:200],
@@ -413,96 +631,392 @@ def route_question(question, client, chat_history=None):
         else:
             prompt = ROUTER_PROMPT_NO_CONTEXT.format(question=question)
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=20,
-            temperature=0
+        settings = select_model_settings("consult_router" if multi else "router", question=question)
+        response = policy_completion(
+            client, coach_id, settings,
+            deadline=LLM_ROUTER_DEADLINE_SECONDS,
+            hedge=True,
+            telemetry={"purpose": "consult_router" if multi else "router"},
+            messages=[{"role": "user", "content": prompt}]
         )
+        record_prompt_cache_usage(getattr(response, "usage", None))
         result = response.choices[0].message.content.strip().upper()
-        
-        if "TACTICIAN" in result:
-            return Agent.TACTICIAN
-        elif "SKILLS" in result:
-            return Agent.SKILLS_COACH
-        elif "NUTRITION" in result:
-            return Agent.NUTRITIONIST
-        elif "STRENGTH" in result:
-            return Agent.STRENGTH_COACH
-        elif "ANALYST" in result:
-            return Agent.ANALYST
-        elif "YOUTH" in result:
-            return Agent.YOUTH_COACH
-        elif "TEAM_MANAGER" in result or "MANAGER" in result:
-            return Agent.TEAM_MANAGER
-        return Agent.ASSISTANT_COACH
-    except Exception:
-        return Agent.ASSISTANT_COACH
+        info["path"] = "llm"
+        if multi:
+            agents = parse_router_agents(result)[:CONSULT_MAX_AGENTS]
+            info["agents"] = [agent.value for agent in agents]
+            return agents[0], info
+        return parse_router_answer(result), info
+    except Exception as e:
+        # Upstream unhealthy: trust the local classifier's best guess, however unsure
+        if info["candidate"] and (isinstance(e, CircuitOpenError) or is_retryable_error(e)):
+            info["path"] = "degraded"
+            return Agent(info["candidate"]), info
+        info["path"] = "fallback"
+        return Agent.ASSISTANT_COACH, info
+
+# Clause boundaries: punctuation, "then/also/plus", and "and" starting a new question
+CONSULT_CLAUSE_PATTERN = re.compile(
+    r"[,;:?!]|\.\s|\b(?:then|also|plus)\b|\band\s+(?=(?:what|how|which|when|where|who|why)\b)",
+    re.IGNORECASE
+)
+
+def is_multi_part_question(question):
+    """Two or more substantive clauses, so the question may span several specialties"""
+    clauses = [clause for clause in CONSULT_CLAUSE_PATTERN.split(question) if len(clause.split()) >= 3]
+    return len(clauses) >= 2
+
+def parse_router_answer(result):
+    """Map the router's one-word answer to an Agent"""
+    if "TACTICIAN" in result:
+        return Agent.TACTICIAN
+    elif "SKILLS" in result:
+        return Agent.SKILLS_COACH
+    elif "NUTRITION" in result:
+        return Agent.NUTRITIONIST
+    elif "STRENGTH" in result:
+        return Agent.STRENGTH_COACH
+    elif "ANALYST" in result:
+        return Agent.ANALYST
+    elif "YOUTH" in result:
+        return Agent.YOUTH_COACH
+    elif "TEAM_MANAGER" in result or "MANAGER" in result:
+        return Agent.TEAM_MANAGER
+    return Agent.ASSISTANT_COACH
+
+def parse_router_agents(result):
+    """Map the multi-agent router's comma-separated answer to a list of distinct Agents"""
+    agents = []
+    for part in result.replace("\n", ",").split(","):
+        if not part.strip():
+            continue
+        agent = parse_router_answer(part)
+        if agent not in agents:
+            agents.append(agent)
+    return agents or [Agent.ASSISTANT_COACH]
 
 # ============================================================================
 # AGENT RESPONSE
 # ============================================================================
-def get_agent_response(question, agent, chat_history, client, coach_profile=None, supabase=None, image_data=None):
+def load_agent_context(agent, coach_profile=None, supabase=None):
+    """Fetch the database context an agent needs (memories, documents, logistics)"""
+    context = {"memories": [], "documents": [], "logistics": None}
+    if not supabase:
+        return context
+    
+    if coach_profile:
+        context["memories"] = get_coach_memories(supabase, coach_profile.get('id'), limit=10)
+    context["documents"] = get_agent_documents(supabase, agent.value)
+    if agent == Agent.TEAM_MANAGER and coach_profile:
+        context["logistics"] = fetch_logistics_data(supabase, coach_profile.get('id'))
+    return context
+
+def build_agent_messages(question, agent, chat_history, coach_profile=None, supabase=None, image_data=None, context=None):
+    """Build the message list and model for an agent call.
+
+    The model comes from the model policy (stored in context["model_settings"]).
+    The system prompt is assembled within the model's token budget, trimming
+    knowledge documents first, then the oldest memories, then the furthest
+    events. The trim report is stored in context["prompt_report"].
+    """
+    if context is None:
+        context = load_agent_context(agent, coach_profile, supabase)
+    
+    settings = select_model_settings("answer", agent, question, image_data)
+    context["model_settings"] = settings
+    model = settings["model"]
+    
+    profile = coach_profile or {}
+    
+    # Static prefix first (agent prompt, profile rules, response rules, knowledge);
+    # knowledge documents are the first thing trimmed when over budget
+    parts = [("knowledge", {
+        "items": context.get("documents") or [],
+        "render": lambda docs: get_static_prompt_prefix(
+            agent, profile.get('age_group'), profile.get('level'), documents_key(docs)
+        ),
+        "trim_rank": 0,
+        "describe": lambda doc: doc.get('title', 'Document'),
+    })]
+    
+    # Volatile per-coach/per-turn context last (cacheable turns leave out who is asking)
+    if not context.get("omit_identity"):
+        parts.append(("identity", build_identity_context(coach_profile)))
+    
+    # Add coach memories for context (newest first, so trimming drops the oldest)
+    parts.append(("memories", memory_section(context.get("memories"))))
+    
+    # Add logistics context for Team Manager (soonest first, so trimming drops the furthest)
+    if agent == Agent.TEAM_MANAGER and context.get("logistics"):
+        events, facilities, players = context["logistics"]
+        parts.append(("events", {
+            "items": events,
+            "render": lambda evs: format_logistics_context(evs, facilities, players, len(events) - len(evs)),
+            "trim_rank": 2,
+            "describe": lambda e: f"{e.get('event_date')} {e.get('title', '')}".strip(),
+        }))
+    
+    system_prompt, report = assemble_system_prompt(parts, model)
+    context["prompt_report"] = report
+    
+    return build_chat_messages(system_prompt, question, chat_history, image_data, model, context.get("summary"))
+
+def memory_section(memories):
+    """Trimmable assemble_system_prompt section of coach memories (newest first)"""
+    return {
+        "items": memories or [],
+        "render": build_memory_context,
+        "trim_rank": 1,
+        "describe": lambda mem: mem.get('title', 'Memory'),
+    }
+
+def select_model(image_data=None):
+    """Pick the default answering model for a request"""
+    return select_model_settings("answer", image_data=image_data)["model"]
+
+def build_chat_messages(system_prompt, question, chat_history, image_data=None, model=None, summary=None):
+    """Build the message list (system, summary, recent history, question) and pick the model.
+
+    summary is {"text", "covered"} from the conversation summarizer: the
+    first "covered" messages of chat_history are replaced by the summary text
+    and only the latest SUMMARY_RECENT_MESSAGES follow it verbatim (without a
+    summary, the latest HISTORY_RECENT_MESSAGES). Summary and history together
+    stay within HISTORY_TOKEN_CEILING tokens.
+    """
+    model = model or select_model(image_data)
+    messages = [{"role": "system", "content": system_prompt}]
+    
+    budget = HISTORY_TOKEN_CEILING
+    covered = 0
+    recent = HISTORY_RECENT_MESSAGES
+    if summary and summary.get("text"):
+        summary_text = CONVERSATION_SUMMARY_TEMPLATE.format(summary=summary["text"])
+        messages.append({"role": "system", "content": summary_text})
+        budget -= count_tokens(summary_text, model)
+        covered = summary.get("covered", 0)
+        recent = SUMMARY_RECENT_MESSAGES
+    
+    # Add recent history not covered by the summary (covered counts from the
+    # conversation's first message; a paged history starts offset messages later)
+    if chat_history:
+        start = max(covered - getattr(chat_history, "offset", 0), 0)
+        messages.extend(fit_history(chat_history[start:][-recent:], budget, model))
+    
+    # Handle image
+    if image_data:
+        messages.append({
+            "role": "user",
+            "content": [
+                {"type": "text", "text": question},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{image_data['mime_type']};base64,{image_data['data']}",
+                        "detail": image_data.get("detail", "auto")
+                    }
+                }
+            ]
+        })
+    else:
+        messages.append({"role": "user", "content": question})
+    
+    return messages, model
+
+def fit_history(history, budget, model):
+    """Convert history to chat messages, keeping the newest that fit in budget tokens.
+
+    The oldest message kept is cut short rather than dropped when at least a
+    little room is left.
+    """
+    fitted = []
+    for msg in reversed(history):
+        role = "user" if msg["role"] == "user" else "assistant"
+        content = msg.get("raw_content", msg["content"])
+        tokens = count_tokens(content, model)
+        if tokens > budget:
+            if budget >= 50:
+                content = content[:len(content) * budget // tokens] + "…"
+                fitted.insert(0, {"role": role, "content": content})
+            break
+        fitted.insert(0, {"role": role, "content": content})
+        budget -= tokens
+    return fitted
+
+def get_agent_response(question, agent, chat_history, client, coach_profile=None, supabase=None, image_data=None, context=None):
     """Get response from specific agent with RAG knowledge, memories, and optional image"""
     try:
-        system_prompt = get_system_prompt(agent, coach_profile)
-        
-        # Add coach memories for context
-        if supabase and coach_profile:
-            memories = get_coach_memories(supabase, coach_profile.get('id'), limit=10)
-            if memories:
-                memory_context = build_memory_context(memories)
-                system_prompt += memory_context
-        
-        # Add RAG knowledge
-        if supabase:
-            knowledge = get_agent_knowledge(supabase, agent)
-            if knowledge:
-                system_prompt += knowledge
-        
-        # Add logistics context for Team Manager
-        if agent == Agent.TEAM_MANAGER and supabase and coach_profile:
-            logistics_context = get_logistics_context(supabase, coach_profile.get('id'))
-            system_prompt += logistics_context
-        
-        messages = [{"role": "system", "content": system_prompt}]
+        if context is None:
+            context = load_agent_context(agent, coach_profile, supabase)
+        messages, model = build_agent_messages(
+            question, agent, chat_history, coach_profile, supabase, image_data, context
+        )
         
-        # Add recent history
-        if chat_history:
-            for msg in chat_history[-4:]:
-                role = "user" if msg["role"] == "user" else "assistant"
-                content = msg.get("raw_content", msg["content"])
-                messages.append({"role": role, "content": content})
+        response = policy_completion(
+            client, coach_profile.get('id') if coach_profile else None,
+            context["model_settings"],
+            telemetry={"purpose": "answer", "agent": agent.value},
+            messages=messages
+        )
+        record_prompt_cache_usage(getattr(response, "usage", None))
         
-        # Handle image
-        if image_data:
-            messages.append({
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": question},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:{image_data['mime_type']};base64,{image_data['data']}"
-                        }
-                    }
-                ]
-            })
-            model = "gpt-4o"
-        else:
-            messages.append({"role": "user", "content": question})
-            model = "gpt-4o-mini"
+        return response.choices[0].message.content
+    except Exception as e:
+        if isinstance(e, CircuitOpenError) or is_retryable_error(e):
+            return get_degraded_answer(question, agent, coach_profile)
+        return f"Error: {str(e)}"
+
+async def aget_agent_response(question, agent, chat_history, async_client, coach_profile=None, supabase=None, image_data=None, context=None):
+    """get_agent_response on the async path (async_client from get_async_client)"""
+    try:
+        if context is None:
+            context = await asyncio.to_thread(load_agent_context, agent, coach_profile, supabase)
+        messages, model = await asyncio.to_thread(
+            build_agent_messages, question, agent, chat_history, coach_profile, supabase, image_data, context
+        )
+
+        response = await apolicy_completion(
+            async_client, coach_profile.get('id') if coach_profile else None,
+            context["model_settings"],
+            telemetry={"purpose": "answer", "agent": agent.value},
+            messages=messages
+        )
+        record_prompt_cache_usage(getattr(response, "usage", None))
+
+        return response.choices[0].message.content
+    except Exception as e:
+        if isinstance(e, CircuitOpenError) or is_retryable_error(e):
+            return get_degraded_answer(question, agent, coach_profile)
+        return f"Error: {str(e)}"
+
+def stream_agent_response(question, agent, chat_history, client, coach_profile=None, supabase=None, image_data=None, context=None):
+    """Stream response from specific agent, yielding text deltas as they arrive"""
+    try:
+        if context is None:
+            context = load_agent_context(agent, coach_profile, supabase)
+        messages, model = build_agent_messages(
+            question, agent, chat_history, coach_profile, supabase, image_data, context
+        )
         
-        response = client.chat.completions.create(
-            model=model,
+        stream = policy_completion(
+            client, coach_profile.get('id') if coach_profile else None,
+            context["model_settings"],
+            telemetry={"purpose": "answer", "agent": agent.value},
             messages=messages,
-            max_tokens=1500,
-            temperature=0.7
+            stream=True,
+            stream_options={"include_usage": True}
         )
         
-        return response.choices[0].message.content
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                record_prompt_cache_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     except Exception as e:
-        return f"Error: {str(e)}"
+        if isinstance(e, CircuitOpenError) or is_retryable_error(e):
+            yield get_degraded_answer(question, agent, coach_profile)
+        else:
+            yield f"Error: {str(e)}"
+
+def get_degraded_answer(question, agent, coach_profile=None):
+    """Answer served while the model API is unhealthy: a cached answer if any, else a notice"""
+    return get_cached_answer(question, agent, coach_profile) or DEGRADED_RESPONSE
+
+# ============================================================================
+# STRUCTURED STATS (THE ANALYST)
+# ============================================================================
+async def aextract_analyst_stats(question, async_client, coach_profile=None, image_data=None):
+    """Extract {"players": [{"name", "games": [stat line]}]} from a question or stat sheet image.
+
+    Runs as its own JSON-schema call on llm's shared event loop, next to THE
+    ANALYST's answer (async_client from get_async_client). Returns None when
+    the message holds no player stats or the call fails.
+    """
+    try:
+        settings, kwargs = _stats_request(question, image_data)
+        response = await apolicy_completion(
+            async_client, coach_profile.get('id') if coach_profile else None, settings, **kwargs
+        )
+        return _stats_from_response(response)
+    except Exception as e:
+        print(f"Error extracting analyst stats: {e}")
+        return None
+
+def _stats_request(question, image_data):
+    settings = select_model_settings("stats", Agent.ANALYST, question, image_data)
+    messages, _ = build_chat_messages(STATS_EXTRACTION_PROMPT, question, [], image_data, settings["model"])
+    return settings, {
+        "telemetry": {"purpose": "stats", "agent": Agent.ANALYST.value},
+        "response_format": {"type": "json_schema", "json_schema": STATS_SCHEMA},
+        "messages": messages,
+    }
+
+def _stats_from_response(response):
+    payload = json.loads(response.choices[0].message.content)
+    players = [p for p in payload.get("players", []) if p.get("games")]
+    return {"players": players} if players else None
+
+# ============================================================================
+# SINGLE-SHOT (agent selection + answer in one completion)
+# ============================================================================
+@lru_cache(maxsize=PROMPT_PREFIX_CACHE_SIZE)
+def get_single_shot_system_prompt(age_group=None, level=None):
+    """Generate the static single-shot prompt: the specialist list, coach profile and response rules"""
+    prompt = SINGLE_SHOT_HEADER
+    
+    if age_group or level:
+        prompt += COACH_PROFILE_TEMPLATE.format(
+            age_group=age_group or 'Unknown',
+            level=level or 'Unknown'
+        )
+    
+    prompt += RESPONSE_RULES
+    return prompt
+
+def build_single_shot_messages(question, chat_history, coach_profile=None, image_data=None, context=None):
+    """Build the message list and model for a single-shot call (settings in context["model_settings"]).
+
+    The system prompt is assembled within the model's token budget like an
+    agent's, trimming the oldest memories first (report in context["prompt_report"]).
+    """
+    settings = select_model_settings("single_shot", question=question, image_data=image_data)
+    profile = coach_profile or {}
+    parts = [
+        ("static", get_single_shot_system_prompt(profile.get('age_group'), profile.get('level'))),
+        ("identity", build_identity_context(coach_profile)),
+        ("memories", memory_section(context.get("memories") if context else None)),
+    ]
+    system_prompt, report = assemble_system_prompt(parts, settings["model"])
+    if context is not None:
+        context["model_settings"] = settings
+        context["prompt_report"] = report
+    summary = context.get("summary") if context else None
+    return build_chat_messages(system_prompt, question, chat_history, image_data, settings["model"], summary)
+
+def split_single_shot_header(text):
+    """Parse the leading "AGENT: <NAME>" line.
+
+    Returns (agent, answer_text) once the header line is complete, or None
+    while more text is needed. Output without a header goes to the
+    Assistant Coach unchanged.
+    """
+    stripped = text.lstrip()
+    if not stripped.upper().startswith("AGENT"):
+        if len(stripped) >= len("AGENT"):
+            return Agent.ASSISTANT_COACH, text
+        return None
+    if "\n" not in stripped:
+        return None
+    header, answer = stripped.split("\n", 1)
+    return parse_router_answer(header.split(":", 1)[-1].strip().upper()), answer.lstrip("\n")
+
+def get_agents_with_documents(supabase):
+    """Get the set of agent values that have knowledge documents"""
+    try:
+        rows = cached_read("documents", None, ("agents",), lambda: supabase.table("documents")
+                           .select("agent").execute().data or [])
+        return {row.get("agent") for row in rows}
+    except Exception:
+        return set()
 
 # ============================================================================
 # RESPONSE FORMATTING
@@ -513,6 +1027,21 @@ def format_response(response, agent):
     badge = f'<div class="response-badge"><span>{info["icon"]}</span><span>{info["name"]}</span></div>'
     return badge + "\n\n" + response
 
+BADGE_PATTERN = re.compile(r'^<div class="response-badge">.*?</div>\n\n', re.DOTALL)
+
+def message_from_row(row):
+    """Session message from a messages row; raw_content is the answer without its agent badge"""
+    content = row.get("content") or ""
+    return {
+        "id": row.get("id"),
+        "created_at": row.get("created_at"),
+        "role": row.get("role"),
+        "content": content,
+        "raw_content": BADGE_PATTERN.sub("", content, count=1),
+        "agent": row.get("agent"),
+        "stats": row.get("stats")
+    }
+
 def get_agent_from_value(value):
     """Convert string value to Agent enum"""
     if isinstance(value, Agent):
@@ -532,7 +1061,6 @@ def read_uploaded_file(uploaded_file):
     # Image files
     if file_name.endswith(('.png', '.jpg', '.jpeg', '.webp')):
         file_bytes = uploaded_file.getvalue()
-        image_data = base64.b64encode(file_bytes).decode('utf-8')
         
         if file_name.endswith('.png'):
             mime_type = "image/png"
@@ -541,11 +1069,8 @@ def read_uploaded_file(uploaded_file):
         else:
             mime_type = "image/jpeg"
         
-        return {
-            "type": "image",
-            "data": image_data,
-            "mime_type": mime_type
-        }
+        # Downscaled, re-encoded and cached by content hash
+        return prepare_image(file_bytes, mime_type)
     
     # CSV files
     elif file_name.endswith('.csv'):
@@ -584,11 +1109,11 @@ def build_analysis_prompt(file_result, analysis_type):
 # ============================================================================
 # LOGISTICS - FACILITIES
 # ============================================================================
-def get_facilities(supabase, coach_id):
+def get_facilities(supabase, coach_id, view="facility_list"):
     """Get all facilities for a coach"""
     try:
-        result = supabase.table("facilities").select("*").eq("coach_id", coach_id).order("name").execute()
-        return result.data or []
+        return project_rows(cached_read("facilities", coach_id, (view,), lambda: supabase.table("facilities")
+                            .select(select_columns(view)).eq("coach_id", coach_id).order("name").execute().data or []), view)
     except Exception:
         return []
 
@@ -605,6 +1130,7 @@ def create_facility(supabase, coach_id, data):
     try:
         data["coach_id"] = coach_id
         result = supabase.table("facilities").insert(data).execute()
+        invalidate("facilities", coach_id)
         return result.data[0] if result.data else None
     except Exception:
         return None
@@ -613,6 +1139,7 @@ def update_facility(supabase, facility_id, data):
     """Update a facility"""
     try:
         result = supabase.table("facilities").update(data).eq("id", facility_id).execute()
+        invalidate_rows("facilities", result.data, also=("events",))  # Events embed facility names
         return result.data[0] if result.data else None
     except Exception:
         return None
@@ -620,7 +1147,8 @@ def update_facility(supabase, facility_id, data):
 def delete_facility(supabase, facility_id):
     """Delete a facility"""
     try:
-        supabase.table("facilities").delete().eq("id", facility_id).execute()
+        result = supabase.table("facilities").delete().eq("id", facility_id).execute()
+        invalidate_rows("facilities", result.data, also=("events",))
         return True
     except Exception:
         return False
@@ -628,20 +1156,21 @@ def delete_facility(supabase, facility_id):
 # ============================================================================
 # LOGISTICS - EVENTS
 # ============================================================================
-def get_events(supabase, coach_id, start_date=None, end_date=None):
+def get_events(supabase, coach_id, start_date=None, end_date=None, view="day_events"):
     """Get events for a coach, optionally filtered by date range"""
     try:
-        query = supabase.table("events").select("*, facilities(name, address)").eq("coach_id", coach_id)
-        if start_date:
-            query = query.gte("event_date", start_date)
-        if end_date:
-            query = query.lte("event_date", end_date)
-        result = query.order("event_date").order("time_start").execute()
-        return result.data or []
+        def load():
+            query = supabase.table("events").select(select_columns(view)).eq("coach_id", coach_id)
+            if start_date:
+                query = query.gte("event_date", start_date)
+            if end_date:
+                query = query.lte("event_date", end_date)
+            return query.order("event_date").order("time_start").execute().data or []
+        return project_rows(cached_read("events", coach_id, (view, start_date, end_date), load), view)
     except Exception:
         return []
 
-def get_events_for_month(supabase, coach_id, year, month):
+def get_events_for_month(supabase, coach_id, year, month, view="month_grid"):
     """Get all events for a specific month"""
     from datetime import date
     import calendar
@@ -649,7 +1178,7 @@ def get_events_for_month(supabase, coach_id, year, month):
     first_day = date(year, month, 1)
     last_day = date(year, month, calendar.monthrange(year, month)[1])
     
-    return get_events(supabase, coach_id, first_day.isoformat(), last_day.isoformat())
+    return get_events(supabase, coach_id, first_day.isoformat(), last_day.isoformat(), view)
 
 def get_event_by_id(supabase, event_id):
     """Get a single event by ID"""
@@ -664,14 +1193,52 @@ def create_event(supabase, coach_id, data):
     try:
         data["coach_id"] = coach_id
         result = supabase.table("events").insert(data).execute()
+        invalidate("events", coach_id)
         return result.data[0] if result.data else None
     except Exception:
         return None
 
+def create_events_bulk(supabase, coach_id, events):
+    """Create several events all-or-nothing; returns (created events, error message or None).
+
+    Events are inserted EVENTS_BULK_CHUNK_SIZE per request (a single request
+    is atomic); if a later chunk fails, the chunks already inserted are
+    deleted again so no partial series is left behind.
+    """
+    rows = [dict(event, coach_id=coach_id) for event in events]
+    created = []
+    try:
+        for start in range(0, len(rows), EVENTS_BULK_CHUNK_SIZE):
+            result = supabase.table("events").insert(rows[start:start + EVENTS_BULK_CHUNK_SIZE]).execute()
+            created.extend(result.data or [])
+        return created, None
+    except Exception as e:
+        created_ids = [event["id"] for event in created if event.get("id")]
+        if created_ids:
+            try:
+                supabase.table("events").delete().in_("id", created_ids).execute()
+            except Exception as cleanup_error:
+                print(f"Error removing partially created events {created_ids}: {cleanup_error}")
+        return [], str(e)
+    finally:
+        invalidate("events", coach_id)
+
+def build_weekly_events(data, start_date, end_date):
+    """Copies of an event's data for every week from start_date through end_date"""
+    from datetime import timedelta
+    
+    events = []
+    current_date = start_date
+    while current_date <= end_date:
+        events.append(dict(data, event_date=current_date.isoformat()))
+        current_date += timedelta(weeks=1)
+    return events
+
 def update_event(supabase, event_id, data):
     """Update an event"""
     try:
         result = supabase.table("events").update(data).eq("id", event_id).execute()
+        invalidate_rows("events", result.data)
         return result.data[0] if result.data else None
     except Exception:
         return None
@@ -679,7 +1246,8 @@ def update_event(supabase, event_id, data):
 def delete_event(supabase, event_id):
     """Delete an event"""
     try:
-        supabase.table("events").delete().eq("id", event_id).execute()
+        result = supabase.table("events").delete().eq("id", event_id).execute()
+        invalidate_rows("events", result.data)
         return True
     except Exception:
         return False
@@ -687,14 +1255,15 @@ def delete_event(supabase, event_id):
 # ============================================================================
 # LOGISTICS - PLAYERS
 # ============================================================================
-def get_players(supabase, coach_id, active_only=True):
+def get_players(supabase, coach_id, active_only=True, view="player_roster"):
     """Get all players for a coach"""
     try:
-        query = supabase.table("players").select("*").eq("coach_id", coach_id)
-        if active_only:
-            query = query.eq("is_active", True)
-        result = query.order("jersey_number").order("last_name").execute()
-        return result.data or []
+        def load():
+            query = supabase.table("players").select(select_columns(view)).eq("coach_id", coach_id)
+            if active_only:
+                query = query.eq("is_active", True)
+            return query.order("jersey_number").order("last_name").execute().data or []
+        return project_rows(cached_read("players", coach_id, (view, active_only), load), view)
     except Exception:
         return []
 
@@ -711,6 +1280,7 @@ def create_player(supabase, coach_id, data):
     try:
         data["coach_id"] = coach_id
         result = supabase.table("players").insert(data).execute()
+        invalidate("players", coach_id)
         return result.data[0] if result.data else None
     except Exception:
         return None
@@ -719,6 +1289,7 @@ def update_player(supabase, player_id, data):
     """Update a player"""
     try:
         result = supabase.table("players").update(data).eq("id", player_id).execute()
+        invalidate_rows("players", result.data)
         return result.data[0] if result.data else None
     except Exception:
         return None
@@ -726,7 +1297,8 @@ def update_player(supabase, player_id, data):
 def delete_player(supabase, player_id):
     """Delete (deactivate) a player"""
     try:
-        supabase.table("players").update({"is_active": False}).eq("id", player_id).execute()
+        result = supabase.table("players").update({"is_active": False}).eq("id", player_id).execute()
+        invalidate_rows("players", result.data)
         return True
     except Exception:
         return False
@@ -734,22 +1306,27 @@ def delete_player(supabase, player_id):
 # ============================================================================
 # LOGISTICS - DATA FOR TEAM MANAGER AGENT
 # ============================================================================
-def get_logistics_context(supabase, coach_id):
-    """Get all logistics data formatted for the Team Manager agent"""
+def get_upcoming_events(supabase, coach_id, days=30, view="event_context"):
+    """Get events from today through the next N days"""
     from datetime import date, timedelta
     
-    # Get upcoming events (next 30 days)
     today = date.today()
-    end_date = today + timedelta(days=30)
-    events = get_events(supabase, coach_id, today.isoformat(), end_date.isoformat())
-    
-    # Get all facilities
-    facilities = get_facilities(supabase, coach_id)
-    
-    # Get all active players
-    players = get_players(supabase, coach_id, active_only=True)
-    
-    # Format context
+    end_date = today + timedelta(days=days)
+    return get_events(supabase, coach_id, today.isoformat(), end_date.isoformat(), view)
+
+def fetch_logistics_data(supabase, coach_id):
+    """Fetch upcoming events, facilities and active players for the Team Manager"""
+    events = get_upcoming_events(supabase, coach_id)
+    facilities = get_facilities(supabase, coach_id, "facility_context")
+    players = get_players(supabase, coach_id, True, "player_context")
+    return events, facilities, players
+
+def get_logistics_context(supabase, coach_id):
+    """Get all logistics data formatted for the Team Manager agent"""
+    return format_logistics_context(*fetch_logistics_data(supabase, coach_id))
+
+def format_logistics_context(events, facilities, players, omitted_events=0):
+    """Format logistics data as context for the Team Manager agent"""
     context = "\n\n=== TEAM LOGISTICS DATA ===\n"
     
     # Events
@@ -763,6 +1340,8 @@ def get_logistics_context(supabase, coach_id):
             context += f" @ {facility_name}\n"
     else:
         context += "No upcoming events scheduled.\n"
+    if omitted_events:
+        context += f"(+{omitted_events} later events not listed)\n"
     
     # Facilities
     context += "\n🏟️ FACILITIES:\n"
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+HOOPS AI - Write-Behind
+Buffers message and memory inserts and writes them in ordered, batched, retried multi-row inserts
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from config import (
+    WRITE_BEHIND_ENABLED, WRITE_BEHIND_FLUSH_SECONDS, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_MAX_ATTEMPTS,
+    WRITE_BEHIND_RETRY_BASE_SECONDS, WRITE_BEHIND_RETRY_MAX_SECONDS, WRITE_BEHIND_OPTIONAL_COLUMNS,
+    WRITE_BEHIND_SPILL_PATH, WRITE_BEHIND_FAILED_PATH, WRITE_BEHIND_CLIENT_ID_COLUMNS
+)
+from db_cache import invalidate
+from projections import is_missing_column_error
+
+# Cached reads each table's rows belong to, refreshed once they are written
+INVALIDATION_SCOPES = {"messages": "conversation_id", "coach_memories": "coach_id"}
+
+def now_timestamp():
+    """Client-side created_at, so batched rows keep the order they were queued in"""
+    return datetime.now(timezone.utc).isoformat()
+
+# ============================================================================
+# BUFFER
+# ============================================================================
+class WriteBehindBuffer:
+    """Per-process queue of rows waiting to be inserted.
+
+    A single writer thread inserts them in queue order, consecutive rows of
+    the same table in one request, so a conversation's messages land in the
+    order they were saved. A failed batch is retried with exponential backoff
+    before anything behind it; after max_attempts its rows are tried one by
+    one and any the database keeps rejecting are set aside in failed_path.
+
+    Every queued row is appended to a journal at spill_path and acknowledged
+    once written, so rows still queued when the process dies are inserted on
+    the next start.
+
+    Rows are written through the one raw client bound by attach(), never a
+    session's (possibly recording) client. Once the database reports a
+    missing column, a table's WRITE_BEHIND_OPTIONAL_COLUMNS are left out of
+    its inserts for the rest of the process.
+    """
+
+    def __init__(self, spill_path, failed_path, batch_size=WRITE_BEHIND_BATCH_SIZE,
+                 flush_seconds=WRITE_BEHIND_FLUSH_SECONDS, max_attempts=WRITE_BEHIND_MAX_ATTEMPTS):
+        self.spill_path = spill_path
+        self.failed_path = failed_path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        self.attempts = 0
+        self._queue = []  # [(seq, table, row)]
+        self._seq = 0
+        self._client = None
+        self._missing_optional = set()  # Tables whose optional columns the database doesn't have
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+        self._recover()
+
+    # Journal
+    def _recover(self):
+        """Requeue rows the journal has no acknowledgement for, then compact it"""
+        unwritten = {}
+        try:
+            with open(self.spill_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line of a crashed write
+                    if "ack" in record:
+                        for seq in record["ack"]:
+                            unwritten.pop(seq, None)
+                    else:
+                        unwritten[record["seq"]] = (record["table"], record["row"])
+        except OSError:
+            pass
+
+        for seq in sorted(unwritten):
+            self._seq += 1
+            self._queue.append((self._seq, unwritten[seq][0], unwritten[seq][1]))
+        if self._queue:
+            print(f"Recovered {len(self._queue)} unwritten rows from {self.spill_path}")
+
+        temp_path = self.spill_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for seq, table, row in self._queue:
+                f.write(json.dumps({"seq": seq, "table": table, "row": row}, ensure_ascii=False, default=str) + "\n")
+        os.replace(temp_path, self.spill_path)
+        self._journal = open(self.spill_path, "a", encoding="utf-8")
+
+    def _append_journal(self, record):
+        self._journal.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._journal.flush()
+
+    # Producing
+    def add(self, table, row):
+        """Queue a row for insertion; returns immediately"""
+        with self._lock:
+            self._seq += 1
+            self._queue.append((self._seq, table, row))
+            self._append_journal({"seq": self._seq, "table": table, "row": row})
+            full = len(self._queue) >= self.batch_size
+        self._start()
+        if full:
+            self._wakeup.set()
+
+    def pending_rows(self, table, **match):
+        """Rows of a table still waiting to be written, optionally only those matching column values"""
+        with self._lock:
+            return [
+                dict(row) for _, queued_table, row in self._queue
+                if queued_table == table and all(row.get(k) == v for k, v in match.items())
+            ]
+
+    def attach(self, client):
+        """Bind the client used for writing (the first one attached) and start the writer thread"""
+        with self._lock:
+            if self._client is None:
+                self._client = client
+        self._start()
+        self._wakeup.set()
+
+    # Writing
+    def flush(self):
+        """Write queued rows in order; returns False if a batch failed and rows remain"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    client = self._client
+                    batch = self._queue[:self.batch_size]
+                if not batch:
+                    return True
+                if client is None:
+                    return False  # Rows wait until a client is attached
+
+                # Consecutive rows of the same table go in one insert
+                table = batch[0][1]
+                batch = batch[:next((i for i, entry in enumerate(batch) if entry[1] != table), len(batch))]
+                rows = [self._writable(table, row) for _, _, row in batch]
+                try:
+                    client.table(table).insert(uniform_rows(rows)).execute()
+                    self.attempts = 0
+                except Exception as e:
+                    if self._drop_optional_columns(table, e):
+                        continue
+                    self.attempts += 1
+                    print(f"Error writing {len(rows)} {table} rows (attempt {self.attempts}): {e}")
+                    if self.attempts < self.max_attempts:
+                        return False
+                    self._write_one_by_one(client, table, rows)
+                    self.attempts = 0
+                self._acknowledge(batch)
+
+    def _writable(self, table, row):
+        if table not in self._missing_optional:
+            return row
+        optional = WRITE_BEHIND_OPTIONAL_COLUMNS[table]
+        return {k: v for k, v in row.items() if k not in optional}
+
+    def _drop_optional_columns(self, table, error):
+        """Stop writing a table's optional columns if error says one is missing; True to retry now"""
+        if table in self._missing_optional or table not in WRITE_BEHIND_OPTIONAL_COLUMNS:
+            return False
+        if not is_missing_column_error(error):
+            return False
+        self._missing_optional.add(table)
+        print(f"Writing {table} without {WRITE_BEHIND_OPTIONAL_COLUMNS[table]}: {error}")
+        return True
+
+    def _write_one_by_one(self, client, table, rows):
+        """Isolate rows the database rejects: retry each alone, then without optional columns"""
+        optional = WRITE_BEHIND_OPTIONAL_COLUMNS.get(table, [])
+        for row in rows:
+            candidates = [row]
+            if any(column in row for column in optional):
+                candidates.append({k: v for k, v in row.items() if k not in optional})
+            for index, candidate in enumerate(candidates):
+                try:
+                    client.table(table).insert(candidate).execute()
+                    break
+                except Exception as e:
+                    if index == len(candidates) - 1:
+                        print(f"Setting aside {table} row rejected by the database: {e}")
+                        with open(self.failed_path, "a", encoding="utf-8") as f:
+                            f.write(json.dumps({"table": table, "row": row, "error": str(e)},
+                                               ensure_ascii=False, default=str) + "\n")
+
+    def _acknowledge(self, batch):
+        written = {seq for seq, _, _ in batch}
+        with self._lock:
+            self._queue = [entry for entry in self._queue if entry[0] not in written]
+            if self._queue:
+                self._append_journal({"ack": sorted(written)})
+            else:
+                self._journal.seek(0)
+                self._journal.truncate()
+        for _, table, row in batch:
+            column = INVALIDATION_SCOPES.get(table)
+            invalidate(table, row.get(column) if column else None)
+
+    # Writer thread
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="hoops-write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                if not self.flush() and self.attempts:
+                    delay = WRITE_BEHIND_RETRY_BASE_SECONDS * 2 ** (self.attempts - 1)
+                    time.sleep(min(delay, WRITE_BEHIND_RETRY_MAX_SECONDS))
+            except Exception as e:
+                print(f"Error in write-behind writer: {e}")
+                time.sleep(self.flush_seconds)
+
+def uniform_rows(rows):
+    """Give every row the same columns (a multi-row insert requires it), missing ones as null"""
+    columns = []
+    for row in rows:
+        columns.extend(column for column in row if column not in columns)
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_write_buffer():
+    """Get the process-wide write-behind buffer"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer(WRITE_BEHIND_SPILL_PATH, WRITE_BEHIND_FAILED_PATH)
+            atexit.register(flush_writes)
+        return _buffer
+
+# ============================================================================
+# MODULE API
+# ============================================================================
+def queue_insert(client, table, row):
+    """Insert a row in the background (directly through client when write-behind is disabled)"""
+    if not WRITE_BEHIND_ENABLED:
+        client.table(table).insert(row).execute()
+        column = INVALIDATION_SCOPES.get(table)
+        invalidate(table, row.get(column) if column else None)
+        return
+    # Readers match a queued row with its saved copy by this id (pending_rows)
+    column = WRITE_BEHIND_CLIENT_ID_COLUMNS.get(table)
+    if column and column not in row:
+        row = dict(row, **{column: uuid.uuid4().hex})
+    # A session's recording client logs the insert now; the buffer writes it through its own client
+    record_insert = getattr(client, "record_insert", None)
+    if record_insert:
+        record_insert(table, row)
+    get_write_buffer().add(table, row)
+
+def start_write_behind(client):
+    """Start the writer with the process-wide raw client (also writes rows recovered from the journal)"""
+    if WRITE_BEHIND_ENABLED:
+        get_write_buffer().attach(client)
+
+def pending_rows(table, **match):
+    """Rows queued for a table that are not in the database yet (for read-your-writes)"""
+    if not WRITE_BEHIND_ENABLED or _buffer is None:
+        return []
+    return _buffer.pending_rows(table, **match)
+
+def flush_writes():
+    """Write everything queued now; whatever still fails stays in the journal for the next start"""
+    if _buffer is not None:
+        return _buffer.flush()
+    return True